@@ -17,9 +17,12 @@
 
 import os
 import socket
+import time
 import uuid
+import weakref
 
 import eventlet
+from eventlet import semaphore
 import netaddr
 from oslo.config import cfg
 
@@ -40,6 +43,7 @@ from neutron.openstack.common import importutils
 from neutron.openstack.common import jsonutils
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import loopingcall
+from neutron.openstack.common.rpc import common as rpc_common
 from neutron.openstack.common.rpc import proxy
 from neutron.openstack.common import service
 from neutron.openstack.common import uuidutils
@@ -69,6 +73,13 @@ class DhcpAgent(manager.Manager):
                            "enable_isolated_metadata = True")),
         cfg.IntOpt('num_sync_threads', default=4,
                    help=_('Number of threads to use during sync process.')),
+        cfg.IntOpt('sync_networks_per_request', default=100,
+                   help=_('Number of networks retrieved by each request of '
+                          'the sync process.')),
+        cfg.FloatOpt('reload_allocations_delay', default=1.0,
+                     help=_("Seconds during which the port notifications of "
+                            "a network are batched into a single reload of "
+                            "its DHCP allocations.")),
     ]
 
     def __init__(self, host=None):
@@ -82,6 +93,12 @@ class DhcpAgent(manager.Manager):
         self.plugin_rpc = DhcpPluginApi(topics.PLUGIN, ctx)
         self.device_manager = DeviceManager(self.conf, self.plugin_rpc)
         self.lease_relay = DhcpLeaseRelay(self.update_lease)
+        # Ids of the networks whose allocations will be reloaded
+        self.pending_reloads = set()
+        self.reload_pool = eventlet.GreenPool(self.conf.num_sync_threads)
+        # Serialize the driver calls of each network, the reloads being run
+        # outside of the 'dhcp-agent' lock taken by the notifications
+        self._network_locks = weakref.WeakValueDictionary()
 
         self.dhcp_version = self.dhcp_driver_cls.check_version()
         self._populate_networks_cache()
@@ -116,6 +133,13 @@ class DhcpAgent(manager.Manager):
         self.periodic_resync()
         self.lease_relay.start()
 
+    def _network_lock(self, network_id):
+        lock = self._network_locks.get(network_id)
+        if lock is None:
+            lock = semaphore.Semaphore()
+            self._network_locks[network_id] = lock
+        return lock
+
     def _ns_name(self, network):
         if self.conf.use_namespaces:
             return NS_PREFIX + network.id
@@ -147,24 +171,55 @@ class DhcpAgent(manager.Manager):
             LOG.exception(_('Unable to update lease'))
 
     def sync_state(self):
-        """Sync the local DHCP state with Neutron."""
+        """Sync the local DHCP state with Neutron.
+
+        The networks are retrieved a page at a time, and the networks of a
+        page are configured by the sync threads while the next one is
+        retrieved.
+        """
         LOG.info(_('Synchronizing state'))
         pool = eventlet.GreenPool(cfg.CONF.num_sync_threads)
         known_network_ids = set(self.cache.get_network_ids())
+        start = time.time()
+        progress = {'total': 0, 'configured': 0}
+
+        def configure_dhcp_for_network(network):
+            self.configure_dhcp_for_network(network)
+            progress['configured'] += 1
 
         try:
-            active_networks = self.plugin_rpc.get_active_networks_info()
-            active_network_ids = set(network.id for network in active_networks)
-            for deleted_id in known_network_ids - active_network_ids:
+            active_network_ids = self.plugin_rpc.get_active_networks()
+            progress['total'] = len(active_network_ids)
+            for deleted_id in known_network_ids - set(active_network_ids):
                 self.disable_dhcp_helper(deleted_id)
 
-            for network in active_networks:
-                pool.spawn_n(self.configure_dhcp_for_network, network)
+            for networks in self._active_networks_info(active_network_ids):
+                for network in networks:
+                    pool.spawn_n(configure_dhcp_for_network, network)
+                LOG.debug(_('Configured %(configured)d of %(total)d '
+                            'networks'), progress)
+            pool.waitall()
+            LOG.info(_('Synchronized %(total)d networks in %(time).2f '
+                       'seconds'),
+                     {'total': progress['total'],
+                      'time': time.time() - start})
 
         except Exception:
             self.needs_resync = True
             LOG.exception(_('Unable to sync network state.'))
 
+    def _active_networks_info(self, network_ids):
+        """Yield the info of the given networks a page at a time."""
+        page_size = self.conf.sync_networks_per_request
+        for index in range(0, len(network_ids), page_size):
+            networks = self.plugin_rpc.get_active_networks_info(
+                network_ids[index:index + page_size])
+            if networks is None:
+                # The plugin cannot page the networks info
+                yield self.plugin_rpc.get_active_networks_info()
+                return
+            yield networks
+
     def _periodic_resync_helper(self):
         """Resync the dhcp state at the configured interval."""
         while True:
@@ -193,22 +248,24 @@ class DhcpAgent(manager.Manager):
 
         for subnet in network.subnets:
             if subnet.enable_dhcp:
-                if self.call_driver('enable', network):
-                    if (self.conf.use_namespaces and
-                        self.conf.enable_isolated_metadata):
-                        self.enable_isolated_metadata_proxy(network)
-                    self.cache.put(network)
+                with self._network_lock(network.id):
+                    if self.call_driver('enable', network):
+                        if (self.conf.use_namespaces and
+                            self.conf.enable_isolated_metadata):
+                            self.enable_isolated_metadata_proxy(network)
+                        self.cache.put(network)
                 break
 
     def disable_dhcp_helper(self, network_id):
         """Disable DHCP for a network known to the agent."""
-        network = self.cache.get_network_by_id(network_id)
-        if network:
-            if (self.conf.use_namespaces and
-                self.conf.enable_isolated_metadata):
-                self.disable_isolated_metadata_proxy(network)
-            if self.call_driver('disable', network):
-                self.cache.remove(network)
+        with self._network_lock(network_id):
+            network = self.cache.get_network_by_id(network_id)
+            if network:
+                if (self.conf.use_namespaces and
+                    self.conf.enable_isolated_metadata):
+                    self.disable_isolated_metadata_proxy(network)
+                if self.call_driver('disable', network):
+                    self.cache.remove(network)
 
     def refresh_dhcp_helper(self, network_id):
         """Refresh or disable DHCP for a network depending on the current state
@@ -229,16 +286,16 @@ class DhcpAgent(manager.Manager):
         old_cidrs = set(s.cidr for s in old_network.subnets if s.enable_dhcp)
         new_cidrs = set(s.cidr for s in network.subnets if s.enable_dhcp)
 
-        if new_cidrs and old_cidrs == new_cidrs:
-            self.call_driver('reload_allocations', network)
-            self.cache.put(network)
-        elif new_cidrs:
-            if self.call_driver('restart', network):
-                self.cache.put(network)
-        else:
+        if not new_cidrs:
             self.disable_dhcp_helper(network.id)
+            return
 
-        if new_cidrs:
+        with self._network_lock(network.id):
+            if old_cidrs == new_cidrs:
+                self.call_driver('reload_allocations', network)
+                self.cache.put(network)
+            elif self.call_driver('restart', network):
+                self.cache.put(network)
             self.device_manager.update(network)
 
     @utils.synchronized('dhcp-agent')
@@ -285,7 +342,7 @@ class DhcpAgent(manager.Manager):
         network = self.cache.get_network_by_id(port.network_id)
         if network:
             self.cache.put_port(port)
-            self.call_driver('reload_allocations', network)
+            self.schedule_reload_allocations(network.id)
 
     # Use the update handler for the port create event.
     port_create_end = port_update_end
@@ -297,7 +354,31 @@ class DhcpAgent(manager.Manager):
         if port:
             network = self.cache.get_network_by_id(port.network_id)
             self.cache.remove_port(port)
-            self.call_driver('reload_allocations', network)
+            self.schedule_reload_allocations(network.id)
+
+    def schedule_reload_allocations(self, network_id):
+        """Reload the allocations of a network once the batching delay
+        has elapsed.
+
+        The port notifications received for the network until then are
+        coalesced into that reload, and the reloads of different networks
+        are run in parallel by the reload pool.
+        """
+        if network_id in self.pending_reloads:
+            return
+        self.pending_reloads.add(network_id)
+        eventlet.spawn_after(self.conf.reload_allocations_delay,
+                             self.reload_pool.spawn_n,
+                             self._reload_allocations, network_id)
+
+    def _reload_allocations(self, network_id):
+        # The notifications received from now on need another reload
+        self.pending_reloads.discard(network_id)
+        # The network may have been disabled while waiting for the lock
+        with self._network_lock(network_id):
+            network = self.cache.get_network_by_id(network_id)
+            if network:
+                self.call_driver('reload_allocations', network)
 
     def enable_isolated_metadata_proxy(self, network):
 
@@ -358,6 +439,7 @@ class DhcpPluginApi(proxy.RpcProxy):
         1.0 - Initial version.
         1.1 - Added get_active_networks_info, create_dhcp_port,
               and update_dhcp_port methods.
+        1.5 - Added network_ids argument to get_active_networks_info.
 
     """
 
@@ -368,13 +450,45 @@ class DhcpPluginApi(proxy.RpcProxy):
             topic=topic, default_version=self.BASE_RPC_API_VERSION)
         self.context = context
         self.host = cfg.CONF.host
+        self.networks_info_by_ids_supported = True
 
-    def get_active_networks_info(self):
-        """Make a remote process call to retrieve all network info."""
-        networks = self.call(self.context,
-                             self.make_msg('get_active_networks_info',
-                                           host=self.host),
-                             topic=self.topic)
+    def get_active_networks(self):
+        """Make a remote process call to retrieve the active network ids."""
+        return self.call(self.context,
+                         self.make_msg('get_active_networks',
+                                       host=self.host),
+                         topic=self.topic)
+
+    def get_active_networks_info(self, network_ids=None):
+        """Make a remote process call to retrieve all network info.
+
+        The info of the given networks only is retrieved when network_ids
+        is not None. None is then returned when the plugin does not support
+        the network_ids argument, the info of all the networks must be
+        retrieved at once instead.
+        """
+        if network_ids is None:
+            networks = self.call(self.context,
+                                 self.make_msg('get_active_networks_info',
+                                               host=self.host),
+                                 topic=self.topic)
+            return [DictModel(n) for n in networks]
+        if not self.networks_info_by_ids_supported:
+            return
+        try:
+            networks = self.call(self.context,
+                                 self.make_msg('get_active_networks_info',
+                                               network_ids=network_ids,
+                                               host=self.host),
+                                 topic=self.topic, version='1.5')
+        except rpc_common.RemoteError as e:
+            if e.exc_type != 'UnsupportedRpcVersion':
+                raise
+            LOG.warning(_("The plugin does not support retrieving the info "
+                          "of given networks, falling back to retrieving "
+                          "all the networks at once"))
+            self.networks_info_by_ids_supported = False
+            return
         return [DictModel(n) for n in networks]
 
     def get_network_info(self, network_id):
@@ -447,6 +561,10 @@ class NetworkCache(object):
         self.cache = {}
         self.subnet_lookup = {}
         self.port_lookup = {}
+        # Map the id of each network to the index of its ports in the
+        # network's port list, and to its ports by MAC address
+        self.port_indexes = {}
+        self.mac_lookup = {}
 
     def get_network_ids(self):
         return self.cache.keys()
@@ -472,6 +590,11 @@ class NetworkCache(object):
         for port in network.ports:
             self.port_lookup[port.id] = network.id
 
+        self.port_indexes[network.id] = dict(
+            (port.id, index) for index, port in enumerate(network.ports))
+        self.mac_lookup[network.id] = dict(
+            (port.mac_address, port) for port in network.ports)
+
     def remove(self, network):
         del self.cache[network.id]
 
@@ -481,32 +604,53 @@ class NetworkCache(object):
         for port in network.ports:
             del self.port_lookup[port.id]
 
+        self.port_indexes.pop(network.id, None)
+        self.mac_lookup.pop(network.id, None)
+
     def put_port(self, port):
         network = self.get_network_by_id(port.network_id)
-        for index in range(len(network.ports)):
-            if network.ports[index].id == port.id:
-                network.ports[index] = port
-                break
-        else:
+        port_indexes = self.port_indexes[network.id]
+        mac_lookup = self.mac_lookup[network.id]
+
+        stale_port = mac_lookup.get(port.mac_address)
+        if stale_port and stale_port.id != port.id:
+            # The MAC address was given to the port after the deletion of
+            # a port whose notification has not been received yet. The
+            # DHCP server must not be given two hosts with the same MAC.
+            self.remove_port(stale_port)
+
+        index = port_indexes.get(port.id)
+        if index is None:
+            port_indexes[port.id] = len(network.ports)
             network.ports.append(port)
+        else:
+            old_port = network.ports[index]
+            if mac_lookup.get(old_port.mac_address) is old_port:
+                del mac_lookup[old_port.mac_address]
+            network.ports[index] = port
+        mac_lookup[port.mac_address] = port
 
         self.port_lookup[port.id] = network.id
 
     def remove_port(self, port):
         network = self.get_network_by_port_id(port.id)
-
-        for index in range(len(network.ports)):
-            if network.ports[index] == port:
-                del network.ports[index]
-                del self.port_lookup[port.id]
-                break
+        port_indexes = self.port_indexes[network.id]
+        mac_lookup = self.mac_lookup[network.id]
+
+        index = port_indexes.pop(port.id)
+        # Move the last port to the freed index of the list
+        last_port = network.ports.pop()
+        if index < len(network.ports):
+            network.ports[index] = last_port
+            port_indexes[last_port.id] = index
+        if mac_lookup.get(port.mac_address) is port:
+            del mac_lookup[port.mac_address]
+        del self.port_lookup[port.id]
 
     def get_port_by_id(self, port_id):
         network = self.get_network_by_port_id(port_id)
         if network:
-            for port in network.ports:
-                if port.id == port_id:
-                    return port
+            return network.ports[self.port_indexes[network.id][port_id]]
 
     def get_state(self):
         net_ids = self.get_network_ids()
@@ -84,6 +84,15 @@ class FirewallDriver(object):
         """Stop filtering port."""
         raise NotImplementedError()
 
+    def update_security_group_members(self, sg_id, sg_members):
+        """Update the member ips of a remote security group.
+
+        sg_members maps each ethertype to the list of member ips. This is
+        only used for the rules whose remote_group_id has not been
+        converted to ip prefixes.
+        """
+        pass
+
     def filter_defer_apply_on(self):
         """Defer application of filtering rule."""
         pass
@@ -17,7 +17,12 @@
 # @author: Dan Wendlandt, Nicira, Inc
 #
 
+import heapq
+import itertools
+import time
+
 import eventlet
+from eventlet import semaphore
 import netaddr
 from oslo.config import cfg
 
@@ -35,7 +40,6 @@ from neutron.common import utils as common_utils
 from neutron import context
 from neutron import manager
 from neutron.openstack.common import importutils
-from neutron.openstack.common import lockutils
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import loopingcall
 from neutron.openstack.common import periodic_task
@@ -49,7 +53,18 @@ LOG = logging.getLogger(__name__)
 NS_PREFIX = 'qrouter-'
 INTERNAL_DEV_PREFIX = 'qr-'
 EXTERNAL_DEV_PREFIX = 'qg-'
-RPC_LOOP_INTERVAL = 1
+
+# Priorities of the router updates, the lowest value is processed first
+PRIORITY_RPC = 0
+PRIORITY_SYNC_ROUTERS_TASK = 1
+
+# Actions of the router updates
+UPDATE_ROUTER = 'update'
+DELETE_ROUTER = 'delete'
+
+# Seconds during which the timestamp of a removed router is kept, so that
+# data fetched before the removal is not processed after it
+REMOVED_ROUTER_TIMESTAMP_AGE = 3600
 
 
 class L3PluginApi(proxy.RpcProxy):
@@ -57,6 +72,7 @@ class L3PluginApi(proxy.RpcProxy):
 
     API version history:
         1.0 - Initial version.
+        1.4 - get_router_ids.
 
     """
 
@@ -66,6 +82,7 @@ class L3PluginApi(proxy.RpcProxy):
         super(L3PluginApi, self).__init__(
             topic=topic, default_version=self.BASE_RPC_API_VERSION)
         self.host = host
+        self.router_ids_supported = True
 
     def get_routers(self, context, router_ids=None):
         """Make a remote process call to retrieve the sync data for routers."""
@@ -74,6 +91,25 @@ class L3PluginApi(proxy.RpcProxy):
                                        router_ids=router_ids),
                          topic=self.topic)
 
+    def get_router_ids(self, context):
+        """Make a remote process call to retrieve the ids of the routers.
+
+        Return None when the plugin does not support the call, the routers
+        must then be fetched all at once with get_routers.
+        """
+        if not self.router_ids_supported:
+            return
+        try:
+            return self.call(context,
+                             self.make_msg('get_router_ids', host=self.host),
+                             topic=self.topic, version='1.4')
+        except rpc_common.RemoteError as e:
+            if e.exc_type not in ('UnsupportedRpcVersion', 'AttributeError'):
+                raise
+            LOG.warning(_("The plugin does not support get_router_ids, "
+                          "falling back to a single sync_routers call"))
+            self.router_ids_supported = False
+
     def get_external_network_id(self, context):
         """Make a remote process call to retrieve the external network id.
 
@@ -88,54 +124,142 @@ class L3PluginApi(proxy.RpcProxy):
 
 
 class RouterInfo(object):
+    """State of a router implemented by the agent.
+
+    Besides the router data last received from the server, it keeps a
+    snapshot of what was applied to the router's namespace: the internal
+    ports, the gateway port, the floating IPs, the extra routes and the
+    SNAT rules. process_router compares the router data with it to only
+    touch the devices and rules that changed.
+    """
 
-    def __init__(self, router_id, root_helper, use_namespaces, router):
+    def __init__(self, router_id, root_helper, use_namespaces, router,
+                 incremental_apply=False):
         self.router_id = router_id
         self.ex_gw_port = None
-        self._snat_enabled = None
-        self._snat_action = None
         self.internal_ports = []
         self.floating_ips = []
+        self.snat_rules = []
         self.root_helper = root_helper
         self.use_namespaces = use_namespaces
-        # Invoke the setter for establishing initial SNAT action
         self.router = router
         self.iptables_manager = iptables_manager.IptablesManager(
             root_helper=root_helper,
             #FIXME(danwent): use_ipv6=True,
-            namespace=self.ns_name())
+            namespace=self.ns_name(),
+            incremental_apply=incremental_apply)
 
         self.routes = []
 
-    @property
-    def router(self):
-        return self._router
-
-    @router.setter
-    def router(self, value):
-        self._router = value
-        if not self._router:
-            return
-        # Set a SNAT action for the router
-        if self._router.get('gw_port'):
-            self._snat_action = (
-                'add_rules' if self._router.get('enable_snat')
-                else 'remove_rules')
-        elif self.ex_gw_port:
-            # Gateway port was removed, remove rules
-            self._snat_action = 'remove_rules'
-        self._snat_enabled = self._router.get('enable_snat')
-
     def ns_name(self):
         if self.use_namespaces:
             return NS_PREFIX + self.router_id
 
-    def perform_snat_action(self, snat_callback, *args):
-        # Process SNAT rules for attached subnets
-        if self._snat_action:
-            snat_callback(self, self._router.get('gw_port'),
-                          *args, action=self._snat_action)
-        self._snat_action = None
+
+class RouterUpdate(object):
+    """An update of a router to be processed by the agent.
+
+    The router is given when it was fetched along with the other routers
+    of a full sync, else it is fetched when the update is processed.
+    """
+
+    def __init__(self, router_id, priority, action=UPDATE_ROUTER,
+                 router=None, timestamp=None):
+        self.router_id = router_id
+        self.priority = priority
+        self.action = action
+        self.router = router
+        self.timestamp = timestamp or time.time()
+
+
+class RouterUpdateQueue(object):
+    """Queue of the router updates, in order of priority.
+
+    A router is queued at most once: a new update of a queued router
+    replaces the queued one and keeps the highest of their priorities. A
+    router is only handed to one worker at a time, its updates received in
+    the meantime are held back until the worker calls task_done().
+    """
+
+    def __init__(self):
+        # Heap of (priority, sequence, router_id), the entries whose
+        # sequence is not the one of the router's update are stale.
+        self._heap = []
+        self._updates = {}
+        self._sequences = {}
+        self._in_progress = set()
+        self._counter = itertools.count()
+        self._ready = semaphore.Semaphore(0)
+
+    def __len__(self):
+        return len(self._updates)
+
+    def _push(self, router_id, priority):
+        sequence = next(self._counter)
+        self._sequences[router_id] = sequence
+        heapq.heappush(self._heap, (priority, sequence, router_id))
+
+    def add(self, update):
+        router_id = update.router_id
+        queued = self._updates.get(router_id)
+        if queued:
+            if queued.router is None:
+                # The router will be fetched anyway, and data fetched by a
+                # full sync could be older than the queued notification:
+                # let the fetched router decide whether it is removed.
+                update.router = None
+                update.action = UPDATE_ROUTER
+            priority = min(update.priority, queued.priority)
+            update.priority = priority
+            self._updates[router_id] = update
+            if (router_id not in self._in_progress and
+                    priority < queued.priority):
+                self._push(router_id, priority)
+            return
+        self._updates[router_id] = update
+        if router_id not in self._in_progress:
+            self._push(router_id, update.priority)
+            self._ready.release()
+
+    def get(self):
+        """Wait for and return the update of a router not in progress."""
+        self._ready.acquire()
+        while True:
+            priority, sequence, router_id = heapq.heappop(self._heap)
+            if self._sequences.get(router_id) == sequence:
+                break
+        del self._sequences[router_id]
+        self._in_progress.add(router_id)
+        return self._updates.pop(router_id)
+
+    def get_to_fetch(self, limit):
+        """Return up to limit updates of routers which must be fetched.
+
+        Only the routers not in progress are returned, without waiting, and
+        they are then in progress as if returned by get().
+        """
+        updates = []
+        for router_id, update in self._updates.items():
+            if len(updates) >= limit:
+                break
+            if (router_id in self._in_progress or
+                    update.action != UPDATE_ROUTER or
+                    update.router is not None):
+                continue
+            # The heap entry of the router becomes stale
+            self._ready.acquire()
+            del self._sequences[router_id]
+            self._in_progress.add(router_id)
+            updates.append(self._updates.pop(router_id))
+        return updates
+
+    def task_done(self, router_id):
+        """Mark a router returned by get() as processed."""
+        self._in_progress.discard(router_id)
+        update = self._updates.get(router_id)
+        if update:
+            self._push(router_id, update.priority)
+            self._ready.release()
 
 
 class L3NATAgent(manager.Manager):
@@ -181,6 +305,17 @@ class L3NATAgent(manager.Manager):
                           "by the agents.")),
         cfg.BoolOpt('enable_metadata_proxy', default=True,
                     help=_("Allow running metadata proxy.")),
+        cfg.BoolOpt('iptables_incremental_apply', default=False,
+                    help=_("Only reload the iptables chains changed since "
+                           "the last update of a router instead of the "
+                           "whole tables.")),
+        cfg.IntOpt('num_router_workers', default=8,
+                   help=_("Number of routers the agent processes "
+                          "concurrently.")),
+        cfg.IntOpt('sync_routers_per_request', default=100,
+                   help=_("Number of routers fetched by each request "
+                          "made to the server during a full sync, or for "
+                          "the routers notified meanwhile.")),
     ]
 
     def __init__(self, host, conf=None):
@@ -206,15 +341,16 @@ class L3NATAgent(manager.Manager):
         self.context = context.get_admin_context_without_session()
         self.plugin_rpc = L3PluginApi(topics.PLUGIN, host)
         self.fullsync = True
-        self.updated_routers = set()
-        self.removed_routers = set()
-        self.sync_progress = False
+        self.target_ex_net_id = None
+        self._queue = RouterUpdateQueue()
+        # Time at which the data of each router processed was fetched
+        self._router_timestamps = {}
+        # Time at which each router was removed, to expire its timestamp
+        self._removed_routers = {}
+        self._worker_pool = eventlet.GreenPool(self.conf.num_router_workers)
         if self.conf.use_namespaces:
             self._destroy_router_namespaces(self.conf.router_id)
 
-        self.rpc_loop = loopingcall.FixedIntervalLoopingCall(
-            self._rpc_loop)
-        self.rpc_loop.start(interval=RPC_LOOP_INTERVAL)
         super(L3NATAgent, self).__init__(host=self.conf.host)
 
     def _destroy_router_namespaces(self, only_router_id=None):
@@ -255,12 +391,16 @@ class L3NATAgent(manager.Manager):
             ip_wrapper = ip_wrapper_root.ensure_namespace(ri.ns_name())
             ip_wrapper.netns.execute(['sysctl', '-w', 'net.ipv4.ip_forward=1'])
 
-    def _fetch_external_net_id(self):
+    def _fetch_external_net_id(self, force=False):
         """Find UUID of single external network for this agent."""
         if self.conf.gateway_external_network_id:
             return self.conf.gateway_external_network_id
+        if self.target_ex_net_id and not force:
+            return self.target_ex_net_id
         try:
-            return self.plugin_rpc.get_external_network_id(self.context)
+            self.target_ex_net_id = self.plugin_rpc.get_external_network_id(
+                self.context)
+            return self.target_ex_net_id
         except rpc_common.RemoteError as e:
             if e.exc_type == 'TooManyExternalNetworks':
                 msg = _(
@@ -273,7 +413,8 @@ class L3NATAgent(manager.Manager):
 
     def _router_added(self, router_id, router):
         ri = RouterInfo(router_id, self.root_helper,
-                        self.conf.use_namespaces, router)
+                        self.conf.use_namespaces, router,
+                        self.conf.iptables_incremental_apply)
         self.router_info[router_id] = ri
         if self.conf.use_namespaces:
             self._create_router_namespace(ri)
@@ -378,57 +519,68 @@ class L3NATAgent(manager.Manager):
                                           interface_name, internal_cidrs)
 
         # Process SNAT rules for external gateway
-        ri.perform_snat_action(self._handle_router_snat_rules,
-                               internal_cidrs, interface_name)
+        self._update_router_snat_rules(ri, ex_gw_port, internal_cidrs,
+                                       interface_name)
 
         # Process DNAT rules for floating IPs
         if ex_gw_port or ri.ex_gw_port:
             self.process_router_floating_ips(ri, ex_gw_port)
 
         ri.ex_gw_port = ex_gw_port
-        ri.enable_snat = ri.router.get('enable_snat')
         self.routes_updated(ri)
         ri.iptables_manager.defer_apply_off()
 
-    def _handle_router_snat_rules(self, ri, ex_gw_port, internal_cidrs,
-                                  interface_name, action):
-        # Remove all the rules
-        # This is safe because if use_namespaces is set as False
-        # then the agent can only configure one router, otherwise
-        # each router's SNAT rules will be in their own namespace
-        ri.iptables_manager.ipv4['nat'].empty_chain('POSTROUTING')
-        ri.iptables_manager.ipv4['nat'].empty_chain('snat')
-        # And add them back if the action if add_rules
-        if action == 'add_rules' and ex_gw_port:
-            # ex_gw_port should not be None in this case
+    def _update_router_snat_rules(self, ri, ex_gw_port, internal_cidrs,
+                                  interface_name):
+        rules = []
+        if ex_gw_port and ri.router.get('enable_snat'):
             ex_gw_ip = ex_gw_port['fixed_ips'][0]['ip_address']
-            for rule in self.external_gateway_nat_rules(ex_gw_ip,
-                                                        internal_cidrs,
-                                                        interface_name):
-                ri.iptables_manager.ipv4['nat'].add_rule(*rule)
+            rules = self.external_gateway_nat_rules(ex_gw_ip,
+                                                    internal_cidrs,
+                                                    interface_name)
+        new_rules = set(rules)
+        old_rules = set(ri.snat_rules)
+        if new_rules == old_rules:
+            return
+        nat = ri.iptables_manager.ipv4['nat']
+        for rule in ri.snat_rules:
+            if rule not in new_rules:
+                nat.remove_rule(*rule)
+        for rule in rules:
+            if rule not in old_rules:
+                nat.add_rule(*rule)
+        ri.snat_rules = rules
         ri.iptables_manager.apply()
 
     def process_router_floating_ips(self, ri, ex_gw_port):
         floating_ips = ri.router.get(l3_constants.FLOATINGIP_KEY, [])
         existing_floating_ip_ids = set([fip['id'] for fip in ri.floating_ips])
-        cur_floating_ip_ids = set([fip['id'] for fip in floating_ips])
+        cur_floating_ip_ids = set([fip['id'] for fip in floating_ips
+                                   if fip['port_id']])
 
         id_to_fip_map = {}
+        # Addresses of the gateway device, listed once for all the floating
+        # IPs added
+        device_cidrs = None
 
         for fip in floating_ips:
             if fip['port_id']:
                 if fip['id'] not in existing_floating_ip_ids:
+                    if device_cidrs is None:
+                        device_cidrs = self._get_gateway_cidrs(ri,
+                                                               ex_gw_port)
                     ri.floating_ips.append(fip)
                     self.floating_ip_added(ri, ex_gw_port,
                                            fip['floating_ip_address'],
-                                           fip['fixed_ip_address'])
+                                           fip['fixed_ip_address'],
+                                           device_cidrs=device_cidrs)
 
                 # store to see if floatingip was remapped
                 id_to_fip_map[fip['id']] = fip
 
         floating_ip_ids_to_remove = (existing_floating_ip_ids -
                                      cur_floating_ip_ids)
-        for fip in ri.floating_ips:
+        for fip in ri.floating_ips[:]:
             if fip['id'] in floating_ip_ids_to_remove:
                 ri.floating_ips.remove(fip)
                 self.floating_ip_removed(ri, ri.ex_gw_port,
@@ -449,6 +601,12 @@ class L3NATAgent(manager.Manager):
                     ri.floating_ips.remove(fip)
                     ri.floating_ips.append(new_fip)
 
+    def _get_gateway_cidrs(self, ri, ex_gw_port):
+        interface_name = self.get_external_device_name(ex_gw_port['id'])
+        device = ip_lib.IPDevice(interface_name, self.root_helper,
+                                 namespace=ri.ns_name())
+        return set(addr['cidr'] for addr in device.addr.list())
+
     def _get_ex_gw_port(self, ri):
         return ri.router.get('gw_port')
 
@@ -566,13 +724,16 @@ class L3NATAgent(manager.Manager):
                  (internal_cidr, ex_gw_ip))]
         return rules
 
-    def floating_ip_added(self, ri, ex_gw_port, floating_ip, fixed_ip):
+    def floating_ip_added(self, ri, ex_gw_port, floating_ip, fixed_ip,
+                          device_cidrs=None):
         ip_cidr = str(floating_ip) + '/32'
         interface_name = self.get_external_device_name(ex_gw_port['id'])
         device = ip_lib.IPDevice(interface_name, self.root_helper,
                                  namespace=ri.ns_name())
 
-        if ip_cidr not in [addr['cidr'] for addr in device.addr.list()]:
+        if device_cidrs is None:
+            device_cidrs = [addr['cidr'] for addr in device.addr.list()]
+        if ip_cidr not in device_cidrs:
             net = netaddr.IPNetwork(ip_cidr)
             device.addr.add(net.version, ip_cidr, str(net.broadcast))
             self._send_gratuitous_arp_packet(ri, interface_name, floating_ip)
@@ -605,7 +766,8 @@ class L3NATAgent(manager.Manager):
     def router_deleted(self, context, router_id):
         """Deal with router deletion RPC message."""
         LOG.debug(_('Got router deleted notification for %s'), router_id)
-        self.removed_routers.add(router_id)
+        self._queue.add(RouterUpdate(router_id, PRIORITY_RPC,
+                                     action=DELETE_ROUTER))
 
     def routers_updated(self, context, routers):
         """Deal with routers modification and creation RPC message."""
@@ -614,109 +776,175 @@ class L3NATAgent(manager.Manager):
             # This is needed for backward compatiblity
             if isinstance(routers[0], dict):
                 routers = [router['id'] for router in routers]
-            self.updated_routers.update(routers)
+            for router_id in routers:
+                self._queue.add(RouterUpdate(router_id, PRIORITY_RPC))
 
     def router_removed_from_agent(self, context, payload):
         LOG.debug(_('Got router removed from agent :%r'), payload)
-        self.removed_routers.add(payload['router_id'])
+        self._queue.add(RouterUpdate(payload['router_id'], PRIORITY_RPC,
+                                     action=DELETE_ROUTER))
 
     def router_added_to_agent(self, context, payload):
         LOG.debug(_('Got router added to agent :%r'), payload)
         self.routers_updated(context, payload)
 
-    def _process_routers(self, routers, all_routers=False):
-        pool = eventlet.GreenPool()
-        if (self.conf.external_network_bridge and
-            not ip_lib.device_exists(self.conf.external_network_bridge)):
-            LOG.error(_("The external network bridge '%s' does not exist"),
-                      self.conf.external_network_bridge)
+    def _is_router_hosted(self, router):
+        """Check whether the agent implements the router."""
+        if not router['admin_state_up']:
+            return False
+        # If namespaces are disabled, only process the router associated
+        # with the configured agent id.
+        if (not self.conf.use_namespaces and
+                router['id'] != self.conf.router_id):
+            return False
+        ex_net_id = (router['external_gateway_info'] or {}).get('network_id')
+        if not ex_net_id:
+            return self.conf.handle_internal_only_routers
+        if ex_net_id == self._fetch_external_net_id():
+            return True
+        # The external network may have been replaced since it was fetched
+        return ex_net_id == self._fetch_external_net_id(force=True)
+
+    def _is_outdated(self, update):
+        return update.timestamp < self._router_timestamps.get(
+            update.router_id, update.timestamp)
+
+    def _fetch_routers(self, updates):
+        """Fetch the routers of the updates with a single call."""
+        updates = [update for update in updates
+                   if not self._is_outdated(update)]
+        if not updates:
             return
-
-        target_ex_net_id = self._fetch_external_net_id()
-        # if routers are all the routers we have (They are from router sync on
-        # starting or when error occurs during running), we seek the
-        # routers which should be removed.
-        # If routers are from server side notification, we seek them
-        # from subset of incoming routers and ones we have now.
-        if all_routers:
-            prev_router_ids = set(self.router_info)
+        timestamp = time.time()
+        routers = self.plugin_rpc.get_routers(
+            self.context, [update.router_id for update in updates])
+        # The routers not returned were removed or disabled
+        routers = dict((router['id'], router) for router in routers)
+        for update in updates:
+            update.router = routers.get(update.router_id)
+            if update.router is None:
+                update.action = DELETE_ROUTER
+            update.timestamp = timestamp
+
+    def _process_router_update(self, update):
+        router_id = update.router_id
+        if self._is_outdated(update):
+            LOG.debug(_('Skipping outdated update of router %s'), router_id)
+            return
+        if update.action == UPDATE_ROUTER and update.router is None:
+            self._fetch_routers([update])
+        router = update.router if update.action == UPDATE_ROUTER else None
+        if router and self._is_router_hosted(router):
+            if (self.conf.external_network_bridge and
+                not ip_lib.device_exists(self.conf.external_network_bridge)):
+                LOG.error(_("The external network bridge '%s' does not "
+                            "exist"), self.conf.external_network_bridge)
+                return
+            if router_id not in self.router_info:
+                self._router_added(router_id, router)
+            ri = self.router_info[router_id]
+            ri.router = router
+            self.process_router(ri)
+            self._removed_routers.pop(router_id, None)
         else:
-            prev_router_ids = set(self.router_info) & set(
-                [router['id'] for router in routers])
-        cur_router_ids = set()
-        for r in routers:
-            if not r['admin_state_up']:
-                continue
-
-            # If namespaces are disabled, only process the router associated
-            # with the configured agent id.
-            if (not self.conf.use_namespaces and
-                r['id'] != self.conf.router_id):
-                continue
-            ex_net_id = (r['external_gateway_info'] or {}).get('network_id')
-            if not ex_net_id and not self.conf.handle_internal_only_routers:
-                continue
-            if ex_net_id and ex_net_id != target_ex_net_id:
+            if router_id in self.router_info:
+                self._router_removed(router_id)
+            self._removed_routers[router_id] = time.time()
+        self._router_timestamps[router_id] = update.timestamp
+
+    def _expire_removed_routers(self):
+        """Forget the timestamps of the routers removed long ago."""
+        expiry = time.time() - REMOVED_ROUTER_TIMESTAMP_AGE
+        for router_id, removed in self._removed_routers.items():
+            if removed < expiry:
+                del self._removed_routers[router_id]
+                self._router_timestamps.pop(router_id, None)
+
+    def _process_router_updates(self):
+        """Process the queued router updates, one router at a time."""
+        while True:
+            updates = [self._queue.get()]
+            try:
+                if (updates[0].action == UPDATE_ROUTER and
+                        updates[0].router is None):
+                    # Fetch the other routers notified meanwhile along
+                    updates.extend(self._queue.get_to_fetch(
+                        max(self.conf.sync_routers_per_request, 1) - 1))
+                    self._fetch_routers(updates)
+            except Exception:
+                LOG.exception(_("Failed fetching routers %s"),
+                              [update.router_id for update in updates])
+                self.fullsync = True
+                for update in updates:
+                    self._queue.task_done(update.router_id)
                 continue
-            cur_router_ids.add(r['id'])
-            if r['id'] not in self.router_info:
-                self._router_added(r['id'], r)
-            ri = self.router_info[r['id']]
-            ri.router = r
-            pool.spawn_n(self.process_router, ri)
-        # identify and remove routers that no longer exist
-        for router_id in prev_router_ids - cur_router_ids:
-            pool.spawn_n(self._router_removed, router_id)
-        pool.waitall()
-
-    @lockutils.synchronized('l3-agent', 'neutron-')
-    def _rpc_loop(self):
-        # _rpc_loop and _sync_routers_task will not be
-        # executed in the same time because of lock.
-        # so we can clear the value of updated_routers
-        # and removed_routers
-        try:
-            if self.updated_routers:
-                router_ids = list(self.updated_routers)
-                self.updated_routers.clear()
-                routers = self.plugin_rpc.get_routers(
-                    self.context, router_ids)
-                self._process_routers(routers)
-            self._process_router_delete()
-        except Exception:
-            LOG.exception(_("Failed synchronizing routers"))
-            self.fullsync = True
-
-    def _process_router_delete(self):
-        current_removed_routers = list(self.removed_routers)
-        for router_id in current_removed_routers:
-            self._router_removed(router_id)
-            self.removed_routers.remove(router_id)
+            for update in updates:
+                try:
+                    self._process_router_update(update)
+                except Exception:
+                    LOG.exception(_("Failed processing router %s"),
+                                  update.router_id)
+                    self.fullsync = True
+                finally:
+                    self._queue.task_done(update.router_id)
 
     def _router_ids(self):
         if not self.conf.use_namespaces:
             return [self.conf.router_id]
+        return self.plugin_rpc.get_router_ids(self.context)
+
+    def _queue_removed_routers(self, router_ids):
+        """Remove the routers which are no longer hosted by the agent."""
+        for router_id in set(self.router_info) - set(router_ids):
+            self._queue.add(RouterUpdate(router_id,
+                                         PRIORITY_SYNC_ROUTERS_TASK,
+                                         action=DELETE_ROUTER))
 
     @periodic_task.periodic_task
-    @lockutils.synchronized('l3-agent', 'neutron-')
     def _sync_routers_task(self, context):
+        self._expire_removed_routers()
         if not self.fullsync:
             return
+        self.fullsync = False
         try:
+            self._fetch_external_net_id(force=True)
             router_ids = self._router_ids()
-            self.updated_routers.clear()
-            self.removed_routers.clear()
-            routers = self.plugin_rpc.get_routers(
-                context, router_ids)
-
-            LOG.debug(_('Processing :%r'), routers)
-            self._process_routers(routers, all_routers=True)
-            self.fullsync = False
+            if router_ids is None:
+                # The plugin cannot list the router ids, fetch all the
+                # routers at once
+                timestamp = time.time()
+                routers = self.plugin_rpc.get_routers(context)
+                router_ids = [router['id'] for router in routers]
+                self._queue_removed_routers(router_ids)
+                for router in routers:
+                    self._queue.add(RouterUpdate(
+                        router['id'], PRIORITY_SYNC_ROUTERS_TASK,
+                        router=router, timestamp=timestamp))
+                return
+            self._queue_removed_routers(router_ids)
+            chunk_size = max(self.conf.sync_routers_per_request, 1)
+            for i in range(0, len(router_ids), chunk_size):
+                chunk = router_ids[i:i + chunk_size]
+                timestamp = time.time()
+                routers = self.plugin_rpc.get_routers(context, chunk)
+                LOG.debug(_('Processing :%r'), routers)
+                # The routers not returned were removed or disabled
+                routers = dict((router['id'], router) for router in routers)
+                for router_id in chunk:
+                    router = routers.get(router_id)
+                    self._queue.add(RouterUpdate(
+                        router_id, PRIORITY_SYNC_ROUTERS_TASK,
+                        action=UPDATE_ROUTER if router else DELETE_ROUTER,
+                        router=router, timestamp=timestamp))
+                # Let the workers start on the routers fetched
+                eventlet.sleep(0)
         except Exception:
             LOG.exception(_("Failed synchronizing routers"))
             self.fullsync = True
 
     def after_start(self):
+        for i in range(self.conf.num_router_workers):
+            self._worker_pool.spawn_n(self._process_router_updates)
         LOG.info(_("L3 agent started"))
 
     def _update_routing_table(self, ri, operation, route):
@@ -16,11 +16,11 @@
 #    under the License.
 
 import abc
+import hashlib
 import os
 import re
 import shutil
 import socket
-import StringIO
 import sys
 
 import netaddr
@@ -47,6 +47,12 @@ OPTS = [
     cfg.StrOpt('dnsmasq_dns_server',
                help=_('Use another DNS server before any in '
                       '/etc/resolv.conf.')),
+    cfg.BoolOpt('dnsmasq_use_hostsdir',
+                default=False,
+                help=_('Write the host entries of each port to its own file '
+                       'of a directory read by dnsmasq with '
+                       '--dhcp-hostsdir, instead of a single hosts file. '
+                       'Requires dnsmasq 2.73 or above.')),
 ]
 
 IPV4 = 4
@@ -120,7 +126,13 @@ class DhcpLocalProcess(DhcpBase):
         interface_name = self.device_delegate.setup(self.network,
                                                     reuse_existing=True)
         if self.active:
-            self.restart()
+            if (interface_name == self.interface_name and
+                    self._is_config_current()):
+                LOG.debug(_('DHCP for %s is already running with its '
+                            'current configuration'), self.network.id)
+                self.reload_allocations()
+            else:
+                self.restart()
         elif self._enable_dhcp():
             self.interface_name = interface_name
             self.spawn_process()
@@ -202,6 +214,13 @@ class DhcpLocalProcess(DhcpBase):
                                                       ensure_conf_dir=True)
         utils.replace_file(interface_file_path, value)
 
+    def _is_config_current(self):
+        """Whether the running process has the current configuration.
+
+        The process is restarted when it has not.
+        """
+        return False
+
     @abc.abstractmethod
     def spawn_process(self):
         pass
@@ -217,9 +236,16 @@ class Dnsmasq(DhcpLocalProcess):
 
     _TAG_PREFIX = 'tag%d'
 
+    # The host entries last written for each network, mapping the port ids
+    # to the port and its rendered entries. The driver is instantiated for
+    # each action, so they are kept by the class.
+    _host_entries = {}
+
     NEUTRON_NETWORK_ID_KEY = 'NEUTRON_NETWORK_ID'
     NEUTRON_RELAY_SOCKET_PATH_KEY = 'NEUTRON_RELAY_SOCKET_PATH'
     MINIMUM_VERSION = 2.59
+    # --dhcp-hostsdir is only supported from dnsmasq 2.73
+    HOSTSDIR_MINIMUM_VERSION = 2.73
 
     @classmethod
     def check_version(cls):
@@ -238,6 +264,13 @@ class Dnsmasq(DhcpLocalProcess):
             LOG.warning(_('Unable to determine dnsmasq version. '
                           'Please ensure that its version is %s '
                           'or above!'), cls.MINIMUM_VERSION)
+        if (cfg.CONF.dnsmasq_use_hostsdir and
+                0 < float(ver) < cls.HOSTSDIR_MINIMUM_VERSION):
+            raise SystemExit(_('dnsmasq_use_hostsdir requires dnsmasq '
+                               '%(required)s or above, found version '
+                               '%(version)s') %
+                             {'required': cls.HOSTSDIR_MINIMUM_VERSION,
+                              'version': ver})
         return float(ver)
 
     @classmethod
@@ -256,14 +289,14 @@ class Dnsmasq(DhcpLocalProcess):
                 cls(conf, FakeNetwork(c), root_helper).active)
         ]
 
-    def spawn_process(self):
-        """Spawns a Dnsmasq process for the network."""
-        env = {
-            self.NEUTRON_NETWORK_ID_KEY: self.network.id,
-            self.NEUTRON_RELAY_SOCKET_PATH_KEY:
-            self.conf.dhcp_lease_relay_socket
-        }
-
+    def _build_cmdline(self):
+        """Return the dnsmasq command line of the network."""
+        if self.conf.dnsmasq_use_hostsdir:
+            hosts_option = '--dhcp-hostsdir=%s' % self.get_conf_file_name(
+                'hosts')
+        else:
+            hosts_option = '--dhcp-hostsfile=%s' % self.get_conf_file_name(
+                'host')
         cmd = [
             'dnsmasq',
             '--no-hosts',
@@ -276,8 +309,8 @@ class Dnsmasq(DhcpLocalProcess):
                 'pid', ensure_conf_dir=True),
             #TODO (mark): calculate value from cidr (defaults to 150)
             #'--dhcp-lease-max=%s' % ?,
-            '--dhcp-hostsfile=%s' % self._output_hosts_file(),
-            '--dhcp-optsfile=%s' % self._output_opts_file(),
+            hosts_option,
+            '--dhcp-optsfile=%s' % self.get_conf_file_name('opts'),
             '--dhcp-script=%s' % self._lease_relay_script_path(),
             '--leasefile-ro',
         ]
@@ -308,6 +341,38 @@ class Dnsmasq(DhcpLocalProcess):
 
         if self.conf.dhcp_domain:
             cmd.append('--domain=%s' % self.conf.dhcp_domain)
+        return cmd
+
+    def _build_env(self):
+        return {
+            self.NEUTRON_NETWORK_ID_KEY: self.network.id,
+            self.NEUTRON_RELAY_SOCKET_PATH_KEY:
+            self.conf.dhcp_lease_relay_socket
+        }
+
+    def _get_config_hash(self, cmd, env):
+        config = cmd + ['%s=%s' % pair for pair in sorted(env.items())]
+        return hashlib.sha1('\0'.join(config)).hexdigest()
+
+    def _is_config_current(self):
+        """Whether dnsmasq was spawned with the current command line.
+
+        The hash of the command line is saved when dnsmasq is spawned, so
+        that a dnsmasq left running by a previous run of the agent only
+        reloads its allocations when its configuration did not change.
+        """
+        return (self._get_value_from_conf_file('config_hash') ==
+                self._get_config_hash(self._build_cmdline(),
+                                      self._build_env()))
+
+    def spawn_process(self):
+        """Spawns a Dnsmasq process for the network."""
+        env = self._build_env()
+        cmd = self._build_cmdline()
+        self._output_hosts_file()
+        self._output_opts_file()
+        utils.replace_file(self.get_conf_file_name('config_hash'),
+                           self._get_config_hash(cmd, env))
 
         if self.namespace:
             ip_wrapper = ip_lib.IPWrapper(self.root_helper, self.namespace)
@@ -327,8 +392,17 @@ class Dnsmasq(DhcpLocalProcess):
                         'turned off DHCP: %s'), self.network.id)
             return
 
+        if self.conf.dnsmasq_use_hostsdir:
+            old_opts = self._get_value_from_conf_file('opts')
         self._output_hosts_file()
         self._output_opts_file()
+        if (self.conf.dnsmasq_use_hostsdir and
+                not self._host_entries_replaced and
+                old_opts == self._get_value_from_conf_file('opts')):
+            # dnsmasq reads the files added to its hosts directory by itself
+            LOG.debug(_('Added host entries for network: %s'),
+                      self.network.id)
+            return
         if self.active:
             cmd = ['kill', '-HUP', self.pid]
             utils.execute(cmd, self.root_helper)
@@ -336,20 +410,69 @@ class Dnsmasq(DhcpLocalProcess):
             LOG.debug(_('Pid %d is stale, relaunching dnsmasq'), self.pid)
         LOG.debug(_('Reloading allocations for network: %s'), self.network.id)
 
-    def _output_hosts_file(self):
-        """Writes a dnsmasq compatible hosts file."""
-        r = re.compile('[:.]')
-        buf = StringIO.StringIO()
+    def _remove_config_files(self):
+        super(Dnsmasq, self)._remove_config_files()
+        self._host_entries.pop(self.network.id, None)
+
+    def _render_host_entries(self, old_entries):
+        """Return the host entries of the ports of the network.
 
+        The entries of the ports which are the same objects as when the
+        entries were last rendered are not regenerated.
+        """
+        r = re.compile('[:.]')
+        entries = {}
         for port in self.network.ports:
+            old_entry = old_entries.get(port.id)
+            if old_entry and old_entry[0] is port:
+                entries[port.id] = old_entry
+                continue
+            lines = []
             for alloc in port.fixed_ips:
                 name = '%s.%s' % (r.sub('-', alloc.ip_address),
                                   self.conf.dhcp_domain)
-                buf.write('%s,%s,%s\n' %
-                          (port.mac_address, name, alloc.ip_address))
+                lines.append('%s,%s,%s\n' %
+                             (port.mac_address, name, alloc.ip_address))
+            entries[port.id] = (port, ''.join(lines))
+        return entries
+
+    def _output_hosts_file(self):
+        """Writes a dnsmasq compatible hosts file, or hosts directory."""
+        old_entries = self._host_entries.get(self.network.id)
+        entries = self._render_host_entries(old_entries or {})
+        if self.conf.dnsmasq_use_hostsdir:
+            name = self._output_hosts_dir(old_entries, entries)
+        else:
+            name = self.get_conf_file_name('host')
+            utils.replace_file(name, ''.join(entries[port.id][1]
+                                             for port in self.network.ports))
+        self._host_entries[self.network.id] = entries
+        return name
 
-        name = self.get_conf_file_name('host')
-        utils.replace_file(name, buf.getvalue())
+    def _output_hosts_dir(self, old_entries, entries):
+        """Writes the host entries of each port to its own file.
+
+        Only the files of the changed ports are written. dnsmasq does not
+        forget the entries of the changed or removed files until it is
+        signaled, which _host_entries_replaced tells.
+        """
+        name = self.get_conf_file_name('hosts', ensure_conf_dir=True)
+        if not os.path.isdir(name):
+            os.makedirs(name, 0o755)
+        if old_entries is None:
+            # The files may be left over from a previous run of the agent
+            old_entries = dict((port_id, None) for port_id in os.listdir(name))
+        self._host_entries_replaced = False
+        for port_id, (port, lines) in entries.iteritems():
+            if port_id not in old_entries:
+                utils.replace_file(os.path.join(name, port_id), lines)
+            elif (old_entries[port_id] is None or
+                  old_entries[port_id][1] != lines):
+                utils.replace_file(os.path.join(name, port_id), lines)
+                self._host_entries_replaced = True
+        for port_id in set(old_entries) - set(entries):
+            os.remove(os.path.join(name, port_id))
+            self._host_entries_replaced = True
         return name
 
     def _output_opts_file(self):
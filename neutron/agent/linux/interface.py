@@ -75,27 +75,30 @@ class LinuxInterfaceDriver(object):
 
         ip_cidrs: list of 'X.X.X.X/YY' strings
         """
-        device = ip_lib.IPDevice(device_name,
-                                 self.root_helper,
-                                 namespace=namespace)
+        with ip_lib.IPBatch() as batch:
+            device = ip_lib.IPDevice(device_name,
+                                     self.root_helper,
+                                     namespace=namespace,
+                                     batch=batch)
 
-        previous = {}
-        for address in device.addr.list(scope='global', filters=['permanent']):
-            previous[address['cidr']] = address['ip_version']
+            previous = {}
+            for address in device.addr.list(scope='global',
+                                            filters=['permanent']):
+                previous[address['cidr']] = address['ip_version']
 
-        # add new addresses
-        for ip_cidr in ip_cidrs:
+            # add new addresses
+            for ip_cidr in ip_cidrs:
 
-            net = netaddr.IPNetwork(ip_cidr)
-            if ip_cidr in previous:
-                del previous[ip_cidr]
-                continue
+                net = netaddr.IPNetwork(ip_cidr)
+                if ip_cidr in previous:
+                    del previous[ip_cidr]
+                    continue
 
-            device.addr.add(net.version, ip_cidr, str(net.broadcast))
+                device.addr.add(net.version, ip_cidr, str(net.broadcast))
 
-        # clean up any old addresses
-        for ip_cidr, ip_version in previous.items():
-            device.addr.delete(ip_version, ip_cidr)
+            # clean up any old addresses
+            for ip_cidr, ip_version in previous.items():
+                device.addr.delete(ip_version, ip_cidr)
 
     def check_bridge_exists(self, bridge):
         if not ip_lib.device_exists(bridge):
@@ -164,36 +167,40 @@ class OVSInterfaceDriver(LinuxInterfaceDriver):
                                     self.root_helper,
                                     namespace=namespace):
 
-            ip = ip_lib.IPWrapper(self.root_helper)
-            tap_name = self._get_tap_name(device_name, prefix)
+            # The commands configuring each device are grouped to be
+            # submitted together.
+            with ip_lib.IPBatch() as batch:
+                ip = ip_lib.IPWrapper(self.root_helper, batch=batch)
+                tap_name = self._get_tap_name(device_name, prefix)
 
-            if self.conf.ovs_use_veth:
-                # Create ns_dev in a namespace if one is configured.
-                root_dev, ns_dev = ip.add_veth(tap_name,
-                                               device_name,
-                                               namespace2=namespace)
-            else:
-                ns_dev = ip.device(device_name)
+                if self.conf.ovs_use_veth:
+                    # Create ns_dev in a namespace if one is configured.
+                    root_dev, ns_dev = ip.add_veth(tap_name,
+                                                   device_name,
+                                                   namespace2=namespace)
+                else:
+                    ns_dev = ip.device(device_name)
+                    if namespace:
+                        namespace_obj = ip.ensure_namespace(namespace)
 
-            internal = not self.conf.ovs_use_veth
-            self._ovs_add_port(bridge, tap_name, port_id, mac_address,
-                               internal=internal)
+                internal = not self.conf.ovs_use_veth
+                self._ovs_add_port(bridge, tap_name, port_id, mac_address,
+                                   internal=internal)
 
-            ns_dev.link.set_address(mac_address)
+                ns_dev.link.set_address(mac_address)
 
-            if self.conf.network_device_mtu:
-                ns_dev.link.set_mtu(self.conf.network_device_mtu)
-                if self.conf.ovs_use_veth:
-                    root_dev.link.set_mtu(self.conf.network_device_mtu)
+                if self.conf.network_device_mtu:
+                    ns_dev.link.set_mtu(self.conf.network_device_mtu)
 
-            # Add an interface created by ovs to the namespace.
-            if not self.conf.ovs_use_veth and namespace:
-                namespace_obj = ip.ensure_namespace(namespace)
-                namespace_obj.add_device_to_namespace(ns_dev)
+                # Add an interface created by ovs to the namespace.
+                if not self.conf.ovs_use_veth and namespace:
+                    namespace_obj.add_device_to_namespace(ns_dev)
 
-            ns_dev.link.set_up()
-            if self.conf.ovs_use_veth:
-                root_dev.link.set_up()
+                ns_dev.link.set_up()
+                if self.conf.ovs_use_veth:
+                    if self.conf.network_device_mtu:
+                        root_dev.link.set_mtu(self.conf.network_device_mtu)
+                    root_dev.link.set_up()
         else:
             LOG.warn(_("Device %s already exists"), device_name)
 
@@ -243,26 +250,30 @@ class IVSInterfaceDriver(LinuxInterfaceDriver):
                                     self.root_helper,
                                     namespace=namespace):
 
-            ip = ip_lib.IPWrapper(self.root_helper)
-            tap_name = self._get_tap_name(device_name, prefix)
+            with ip_lib.IPBatch() as batch:
+                ip = ip_lib.IPWrapper(self.root_helper, batch=batch)
+                tap_name = self._get_tap_name(device_name, prefix)
 
-            root_dev, ns_dev = ip.add_veth(tap_name, device_name)
+                root_dev, ns_dev = ip.add_veth(tap_name, device_name)
 
-            self._ivs_add_port(tap_name, port_id, mac_address)
+                self._ivs_add_port(tap_name, port_id, mac_address)
 
-            ns_dev = ip.device(device_name)
-            ns_dev.link.set_address(mac_address)
+                if namespace:
+                    namespace_obj = ip.ensure_namespace(namespace)
+
+                ns_dev = ip.device(device_name)
+                ns_dev.link.set_address(mac_address)
 
-            if self.conf.network_device_mtu:
-                ns_dev.link.set_mtu(self.conf.network_device_mtu)
-                root_dev.link.set_mtu(self.conf.network_device_mtu)
+                if self.conf.network_device_mtu:
+                    ns_dev.link.set_mtu(self.conf.network_device_mtu)
+                    root_dev.link.set_mtu(self.conf.network_device_mtu)
+
+                root_dev.link.set_up()
 
-            if namespace:
-                namespace_obj = ip.ensure_namespace(namespace)
-                namespace_obj.add_device_to_namespace(ns_dev)
+                if namespace:
+                    namespace_obj.add_device_to_namespace(ns_dev)
 
-            ns_dev.link.set_up()
-            root_dev.link.set_up()
+                ns_dev.link.set_up()
         else:
             LOG.warn(_("Device %s already exists"), device_name)
 
@@ -293,24 +304,27 @@ class BridgeInterfaceDriver(LinuxInterfaceDriver):
         if not ip_lib.device_exists(device_name,
                                     self.root_helper,
                                     namespace=namespace):
-            ip = ip_lib.IPWrapper(self.root_helper)
-
-            # Enable agent to define the prefix
-            if prefix:
-                tap_name = device_name.replace(prefix, 'tap')
-            else:
-                tap_name = device_name.replace(self.DEV_NAME_PREFIX, 'tap')
-            # Create ns_veth in a namespace if one is configured.
-            root_veth, ns_veth = ip.add_veth(tap_name, device_name,
-                                             namespace2=namespace)
-            ns_veth.link.set_address(mac_address)
-
-            if self.conf.network_device_mtu:
-                root_veth.link.set_mtu(self.conf.network_device_mtu)
-                ns_veth.link.set_mtu(self.conf.network_device_mtu)
-
-            root_veth.link.set_up()
-            ns_veth.link.set_up()
+            with ip_lib.IPBatch() as batch:
+                ip = ip_lib.IPWrapper(self.root_helper, batch=batch)
+
+                # Enable agent to define the prefix
+                if prefix:
+                    tap_name = device_name.replace(prefix, 'tap')
+                else:
+                    tap_name = device_name.replace(self.DEV_NAME_PREFIX,
+                                                   'tap')
+                # Create ns_veth in a namespace if one is configured.
+                root_veth, ns_veth = ip.add_veth(tap_name, device_name,
+                                                 namespace2=namespace)
+
+                if self.conf.network_device_mtu:
+                    root_veth.link.set_mtu(self.conf.network_device_mtu)
+                root_veth.link.set_up()
+
+                ns_veth.link.set_address(mac_address)
+                if self.conf.network_device_mtu:
+                    ns_veth.link.set_mtu(self.conf.network_device_mtu)
+                ns_veth.link.set_up()
 
         else:
             LOG.warn(_("Device %s already exists"), device_name)
@@ -31,10 +31,68 @@ OPTS = [
 LOOPBACK_DEVNAME = 'lo'
 
 
+class IPBatch(object):
+    """Commands submitted to ip together, in one privileged invocation.
+
+    The IPWrapper and IPDevice objects created with a batch queue the
+    commands which change the state of the devices, and submit them
+    through 'ip -batch -' once the batch is submitted or when they need to
+    run a command whose output is needed, which keeps the commands in
+    order. Consecutive commands run in the same namespace and with the same
+    options share an invocation.
+
+    Commands run by objects created without the batch are not ordered
+    with the queued ones.
+
+    with ip_lib.IPBatch() as batch:
+        device = ip_lib.IPDevice(name, root_helper, namespace, batch=batch)
+        device.link.set_address(mac_address)
+        device.link.set_up()
+    """
+
+    def __init__(self):
+        self._key = None
+        self._lines = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type:
+            # The commands queued relied on the ones which failed
+            self._lines = []
+        else:
+            self.submit()
+
+    def add(self, options, command, args, root_helper, namespace=None):
+        key = (tuple(options), root_helper, namespace)
+        if self._lines and key != self._key:
+            self.submit()
+        self._key = key
+        self._lines.append(' '.join(str(a) for a in [command] + list(args)))
+
+    def submit(self):
+        """Run the queued commands."""
+        if not self._lines:
+            return
+        options, root_helper, namespace = self._key
+        lines = self._lines
+        self._lines = []
+        opt_list = ['-%s' % o for o in options]
+        if namespace:
+            ip_cmd = ['ip', 'netns', 'exec', namespace, 'ip']
+        else:
+            ip_cmd = ['ip']
+        return utils.execute(ip_cmd + opt_list + ['-batch', '-'],
+                             process_input='\n'.join(lines) + '\n',
+                             root_helper=root_helper)
+
+
 class SubProcessBase(object):
-    def __init__(self, root_helper=None, namespace=None):
+    def __init__(self, root_helper=None, namespace=None, batch=None):
         self.root_helper = root_helper
         self.namespace = namespace
+        self.batch = batch
         try:
             self.force_root = cfg.CONF.ip_lib_force_root
         except cfg.NoSuchOptError:
@@ -42,7 +100,12 @@ class SubProcessBase(object):
             # need to register the option.
             self.force_root = False
 
+    def _submit_batch(self):
+        if self.batch:
+            self.batch.submit()
+
     def _run(self, options, command, args):
+        self._submit_batch()
         if self.namespace:
             return self._as_root(options, command, args)
         elif self.force_root:
@@ -58,12 +121,20 @@ class SubProcessBase(object):
 
         namespace = self.namespace if not use_root_namespace else None
 
+        self._submit_batch()
         return self._execute(options,
                              command,
                              args,
                              self.root_helper,
                              namespace)
 
+    def _queue(self, options, command, args):
+        """Queue a command to be run as root in the batch."""
+        if not self.root_helper:
+            raise exceptions.SudoRequired()
+        self.batch.add(options, command, args, self.root_helper,
+                       self.namespace)
+
     @classmethod
     def _execute(cls, options, command, args, root_helper=None,
                  namespace=None):
@@ -77,16 +148,18 @@ class SubProcessBase(object):
 
 
 class IPWrapper(SubProcessBase):
-    def __init__(self, root_helper=None, namespace=None):
+    def __init__(self, root_helper=None, namespace=None, batch=None):
         super(IPWrapper, self).__init__(root_helper=root_helper,
-                                        namespace=namespace)
+                                        namespace=namespace,
+                                        batch=batch)
         self.netns = IpNetnsCommand(self)
 
     def device(self, name):
-        return IPDevice(name, self.root_helper, self.namespace)
+        return IPDevice(name, self.root_helper, self.namespace, self.batch)
 
     def get_devices(self, exclude_loopback=False):
         retval = []
+        self._submit_batch()
         output = self._execute('o', 'link', ('list',),
                                self.root_helper, self.namespace)
         for line in output.split('\n'):
@@ -101,12 +174,13 @@ class IPWrapper(SubProcessBase):
 
                 retval.append(IPDevice(name,
                                        self.root_helper,
-                                       self.namespace))
+                                       self.namespace,
+                                       self.batch))
         return retval
 
     def add_tuntap(self, name, mode='tap'):
         self._as_root('', 'tuntap', ('add', name, 'mode', mode))
-        return IPDevice(name, self.root_helper, self.namespace)
+        return IPDevice(name, self.root_helper, self.namespace, self.batch)
 
     def add_veth(self, name1, name2, namespace2=None):
         args = ['add', name1, 'type', 'veth', 'peer', 'name', name2]
@@ -119,8 +193,9 @@ class IPWrapper(SubProcessBase):
 
         self._as_root('', 'link', tuple(args))
 
-        return (IPDevice(name1, self.root_helper, self.namespace),
-                IPDevice(name2, self.root_helper, namespace2))
+        return (IPDevice(name1, self.root_helper, self.namespace,
+                         self.batch),
+                IPDevice(name2, self.root_helper, namespace2, self.batch))
 
     def ensure_namespace(self, name):
         if not self.netns.exists(name):
@@ -128,7 +203,7 @@ class IPWrapper(SubProcessBase):
             lo = ip.device(LOOPBACK_DEVNAME)
             lo.link.set_up()
         else:
-            ip = IPWrapper(self.root_helper, name)
+            ip = IPWrapper(self.root_helper, name, self.batch)
         return ip
 
     def namespace_is_empty(self):
@@ -153,9 +228,10 @@ class IPWrapper(SubProcessBase):
 
 
 class IPDevice(SubProcessBase):
-    def __init__(self, name, root_helper=None, namespace=None):
+    def __init__(self, name, root_helper=None, namespace=None, batch=None):
         super(IPDevice, self).__init__(root_helper=root_helper,
-                                       namespace=namespace)
+                                       namespace=namespace,
+                                       batch=batch)
         self.name = name
         self.link = IpLinkCommand(self)
         self.addr = IpAddrCommand(self)
@@ -179,6 +255,12 @@ class IpCommandBase(object):
         return self._parent._run(kwargs.get('options', []), self.COMMAND, args)
 
     def _as_root(self, *args, **kwargs):
+        if self._parent.batch and not kwargs.get('use_root_namespace'):
+            # Only the commands changing the state of devices run as root
+            # without being asked to run in the root namespace.
+            return self._parent._queue(kwargs.get('options', []),
+                                       self.COMMAND,
+                                       args)
         return self._parent._as_root(kwargs.get('options', []),
                                      self.COMMAND,
                                      args,
@@ -413,7 +495,7 @@ class IpNetnsCommand(IpCommandBase):
 
     def add(self, name):
         self._as_root('add', name, use_root_namespace=True)
-        return IPWrapper(self._parent.root_helper, name)
+        return IPWrapper(self._parent.root_helper, name, self._parent.batch)
 
     def delete(self, name):
         self._as_root('delete', name, use_root_namespace=True)
@@ -424,6 +506,7 @@ class IpNetnsCommand(IpCommandBase):
         elif not self._parent.namespace:
             raise Exception(_('No namespace defined for parent'))
         else:
+            self._parent._submit_batch()
             env_params = []
             if addl_env:
                 env_params = (['env'] +
@@ -0,0 +1,95 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright 2013 OpenStack Foundation.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Implements ip sets of security group members using ipset."""
+
+from neutron.agent.linux import utils as linux_utils
+from neutron.common import constants
+from neutron.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# ipset limits set names to 31 characters
+MAX_SET_NAME_LEN = 31
+SET_NAME_PREFIX = 'N'
+SET_FAMILY = {constants.IPv4: 'inet',
+              constants.IPv6: 'inet6'}
+
+
+def get_set_name(security_group_id, ethertype):
+    """Return the name of the ipset of a security group's members."""
+    name = '%s%s%s' % (SET_NAME_PREFIX, ethertype, security_group_id)
+    return name[:MAX_SET_NAME_LEN]
+
+
+class IpsetManager(object):
+    """Wrapper for ipset.
+
+    Keeps one hash:ip set per security group and ethertype, holding the
+    addresses of the members of the group. Member updates only send the
+    addresses added to or removed from a set, in a single 'ipset restore'
+    invocation.
+    """
+
+    def __init__(self, _execute=None, root_helper=None):
+        if _execute:
+            self.execute = _execute
+        else:
+            self.execute = linux_utils.execute
+        self.root_helper = root_helper
+        # Maps the (security group id, ethertype) of each set we created
+        # to its members
+        self.sets = {}
+
+    def set_members(self, security_group_id, ethertype, member_ips):
+        """Create or update the ipset of a security group's members."""
+        key = (security_group_id, ethertype)
+        set_name = get_set_name(security_group_id, ethertype)
+        member_ips = set(member_ips)
+        lines = []
+        if key in self.sets:
+            old_member_ips = self.sets[key]
+        else:
+            old_member_ips = set()
+            # The set may be left over from a previous run of the agent
+            lines.append('create %s hash:ip family %s' %
+                         (set_name, SET_FAMILY[ethertype]))
+            lines.append('flush %s' % set_name)
+        lines += ['add %s %s' % (set_name, ip)
+                  for ip in sorted(member_ips - old_member_ips)]
+        lines += ['del %s %s' % (set_name, ip)
+                  for ip in sorted(old_member_ips - member_ips)]
+        if lines:
+            LOG.debug(_('Updating ipset %(set)s with %(count)d changes'),
+                      {'set': set_name, 'count': len(lines)})
+            self.execute(['ipset', 'restore', '-exist'],
+                         process_input='\n'.join(lines) + '\n',
+                         root_helper=self.root_helper)
+        self.sets[key] = member_ips
+        return set_name
+
+    def destroy(self, security_group_id, ethertype):
+        """Destroy the ipset of a security group's members.
+
+        No iptables rule may reference the set anymore.
+        """
+        key = (security_group_id, ethertype)
+        if key not in self.sets:
+            return
+        self.execute(['ipset', 'destroy',
+                      get_set_name(security_group_id, ethertype)],
+                     root_helper=self.root_helper)
+        del self.sets[key]
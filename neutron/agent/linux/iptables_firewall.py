@@ -19,12 +19,15 @@ import netaddr
 from oslo.config import cfg
 
 from neutron.agent import firewall
+from neutron.agent.linux import ipset_manager
 from neutron.agent.linux import iptables_manager
 from neutron.common import constants
 from neutron.openstack.common import log as logging
 
 
 LOG = logging.getLogger(__name__)
+cfg.CONF.import_opt('iptables_incremental_apply',
+                    'neutron.agent.securitygroups_rpc', 'SECURITYGROUP')
 SG_CHAIN = 'sg-chain'
 INGRESS_DIRECTION = 'ingress'
 EGRESS_DIRECTION = 'egress'
@@ -33,6 +36,8 @@ CHAIN_NAME_PREFIX = {INGRESS_DIRECTION: 'i',
                      EGRESS_DIRECTION: 'o',
                      IP_SPOOF_FILTER: 's'}
 LINUX_DEV_LEN = 14
+IPSET_DIRECTION = {INGRESS_DIRECTION: 'src',
+                   EGRESS_DIRECTION: 'dst'}
 
 
 class IptablesFirewallDriver(firewall.FirewallDriver):
@@ -41,11 +46,17 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                           EGRESS_DIRECTION: 'physdev-in'}
 
     def __init__(self):
+        incremental_apply = cfg.CONF.SECURITYGROUP.iptables_incremental_apply
         self.iptables = iptables_manager.IptablesManager(
             root_helper=cfg.CONF.AGENT.root_helper,
-            use_ipv6=True)
+            use_ipv6=True,
+            incremental_apply=incremental_apply)
+        self.ipset = ipset_manager.IpsetManager(
+            root_helper=cfg.CONF.AGENT.root_helper)
         # list of port which has security group
         self.filtered_ports = {}
+        # member ips of remote security groups, by ethertype
+        self.sg_members = {}
         self._add_fallback_chain_v4v6()
 
     @property
@@ -82,6 +93,31 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self._setup_chains()
         self.iptables.apply()
 
+    def update_security_group_members(self, sg_id, sg_members):
+        LOG.debug(_("Updating security group (%s) members"), sg_id)
+        self.sg_members[sg_id] = sg_members
+        for ethertype, member_ips in sg_members.iteritems():
+            # Sets are only created once a rule references them
+            if (sg_id, ethertype) in self.ipset.sets:
+                self.ipset.set_members(sg_id, ethertype, member_ips)
+
+    def _remove_unused_ipsets(self):
+        used_sets = set()
+        for port in self.filtered_ports.values():
+            for rule in port.get('security_group_rules', []):
+                if (rule.get('remote_group_id') and
+                        not rule.get('source_ip_prefix') and
+                        not rule.get('dest_ip_prefix')):
+                    used_sets.add((rule['remote_group_id'],
+                                   rule['ethertype']))
+        used_groups = set(sg_id for sg_id, ethertype in used_sets)
+        for sg_id in self.sg_members.keys():
+            if sg_id not in used_groups:
+                del self.sg_members[sg_id]
+        for sg_id, ethertype in self.ipset.sets.keys():
+            if (sg_id, ethertype) not in used_sets:
+                self.ipset.destroy(sg_id, ethertype)
+
     def _setup_chains(self):
         """Setup ingress and egress chain for a port."""
         self._add_chain_by_name_v4v6(SG_CHAIN)
@@ -257,6 +293,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                                    rule.get('protocol'),
                                    rule.get('port_range_min'),
                                    rule.get('port_range_max'))
+            args += self._remote_group_arg(rule)
             args += ['-j RETURN']
             iptables_rules += [' '.join(args)]
 
@@ -302,6 +339,24 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             return ['-%s' % direction, ip_prefix]
         return []
 
+    def _remote_group_arg(self, rule):
+        # NOTE: rules are only left unexpanded by the server when the
+        # members of the remote group are requested separately, i.e. when
+        # enable_ipset is set. Expanded rules carry the member ip prefix.
+        remote_group_id = rule.get('remote_group_id')
+        if (not remote_group_id or rule.get('source_ip_prefix') or
+                rule.get('dest_ip_prefix')):
+            return []
+        ethertype = rule['ethertype']
+        if (remote_group_id, ethertype) in self.ipset.sets:
+            set_name = ipset_manager.get_set_name(remote_group_id, ethertype)
+        else:
+            members = self.sg_members.get(remote_group_id, {})
+            set_name = self.ipset.set_members(remote_group_id, ethertype,
+                                              members.get(ethertype, []))
+        return ['-m set', '--match-set', set_name,
+                IPSET_DIRECTION[rule['direction']]]
+
     def _port_chain_name(self, port, direction):
         return iptables_manager.get_chain_name(
             '%s%s' % (CHAIN_NAME_PREFIX[direction], port['device'][3:]))
@@ -311,6 +366,9 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
 
     def filter_defer_apply_off(self):
         self.iptables.defer_apply_off()
+        if self.ipset.sets:
+            # Sets can only be destroyed once no rule references them
+            self._remove_unused_ipsets()
 
 
 class OVSHybridIptablesFirewallDriver(IptablesFirewallDriver):
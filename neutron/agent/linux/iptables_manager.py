@@ -94,6 +94,25 @@ class IptablesTable(object):
         self.chains = set()
         self.unwrapped_chains = set()
         self.remove_chains = set()
+        # Wrapped chains whose rules changed since the last apply, and
+        # the wrapped chains known to exist as of the last apply.
+        self.dirty_chains = set()
+        self.applied_chains = set()
+        # Changes to unwrapped chains and rules can only be applied by
+        # reloading the whole table.
+        self.full_sync_needed = True
+
+    def _mark_dirty(self, chain, wrap=True):
+        if wrap:
+            self.dirty_chains.add(chain)
+        else:
+            self.full_sync_needed = True
+
+    def mark_applied(self):
+        """Record that the in-memory table has been applied."""
+        self.dirty_chains.clear()
+        self.applied_chains = set(self.chains)
+        self.full_sync_needed = False
 
     def add_chain(self, name, wrap=True):
         """Adds a named chain to the table.
@@ -108,10 +127,10 @@ class IptablesTable(object):
 
         """
         name = get_chain_name(name, wrap)
-        if wrap:
-            self.chains.add(name)
-        else:
-            self.unwrapped_chains.add(name)
+        chain_set = self._select_chain_set(wrap)
+        if name not in chain_set:
+            chain_set.add(name)
+            self._mark_dirty(name, wrap)
 
     def _select_chain_set(self, wrap):
         if wrap:
@@ -150,6 +169,7 @@ class IptablesTable(object):
             return
 
         chain_set.remove(name)
+        self._mark_dirty(name, wrap)
 
         if not wrap:
             # non-wrapped chains and rules need to be dealt with specially,
@@ -170,6 +190,10 @@ class IptablesTable(object):
         else:
             jump_snippet = '-j %s-%s' % (binary_name, name)
 
+        for r in self.rules:
+            if jump_snippet in r.rule:
+                self._mark_dirty(r.chain, r.wrap)
+
         # finally, remove rules from list that have a matching jump chain
         self.rules = [r for r in self.rules
                       if jump_snippet not in r.rule]
@@ -193,6 +217,7 @@ class IptablesTable(object):
             rule = ' '.join(map(self._wrap_target_chain, rule.split(' ')))
 
         self.rules.append(IptablesRule(chain, rule, wrap, top))
+        self._mark_dirty(chain, wrap)
 
     def _wrap_target_chain(self, s):
         if s.startswith('$'):
@@ -210,6 +235,7 @@ class IptablesTable(object):
         chain = get_chain_name(chain, wrap)
         try:
             self.rules.remove(IptablesRule(chain, rule, wrap, top))
+            self._mark_dirty(chain, wrap)
             if not wrap:
                 self.remove_rules.append(IptablesRule(chain, rule, wrap, top))
         except ValueError:
@@ -221,10 +247,11 @@ class IptablesTable(object):
     def empty_chain(self, chain, wrap=True):
         """Remove all rules from a chain."""
         chain = get_chain_name(chain, wrap)
-        chained_rules = [rule for rule in self.rules
-                         if rule.chain == chain and rule.wrap == wrap]
-        for rule in chained_rules:
-            self.rules.remove(rule)
+        rules = [rule for rule in self.rules
+                 if rule.chain != chain or rule.wrap != wrap]
+        if len(rules) != len(self.rules):
+            self.rules = rules
+            self._mark_dirty(chain, wrap)
 
 
 class IptablesManager(object):
@@ -248,10 +275,16 @@ class IptablesManager(object):
     wrapped in the same was as the built-in filter chains. Additionally,
     there's a snat chain that is applied after the POSTROUTING chain.
 
+    With incremental_apply set, only the wrapped chains modified since the
+    previous apply are flushed and refilled through 'iptables-restore
+    --noflush', and nothing is executed at all when no table changed. Any
+    change to an unwrapped chain or rule still reloads the whole table.
+
     """
 
     def __init__(self, _execute=None, state_less=False,
-                 root_helper=None, use_ipv6=False, namespace=None):
+                 root_helper=None, use_ipv6=False, namespace=None,
+                 incremental_apply=False):
         if _execute:
             self.execute = _execute
         else:
@@ -260,6 +293,7 @@ class IptablesManager(object):
         self.use_ipv6 = use_ipv6
         self.root_helper = root_helper
         self.namespace = namespace
+        self.incremental_apply = incremental_apply
         self.iptables_apply_deferred = False
 
         self.ipv4 = {'filter': IptablesTable()}
@@ -348,22 +382,87 @@ class IptablesManager(object):
             s += [('ip6tables', self.ipv6)]
 
         for cmd, tables in s:
-            args = ['%s-save' % (cmd,), '-c']
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
-            all_tables = self.execute(args, root_helper=self.root_helper)
-            all_lines = all_tables.split('\n')
-            for table_name, table in tables.iteritems():
-                start, end = self._find_table(all_lines, table_name)
-                all_lines[start:end] = self._modify_rules(
-                    all_lines[start:end], table, table_name)
-
-            args = ['%s-restore' % (cmd,), '-c']
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
+            if (not self.incremental_apply or
+                    any(t.full_sync_needed for t in tables.itervalues())):
+                self._apply_full(cmd, tables)
+            elif any(t.dirty_chains for t in tables.itervalues()):
+                self._apply_incremental(cmd, tables)
+            else:
+                LOG.debug(_('No %s changes to apply'), cmd)
+        LOG.debug(_("IPTablesManager.apply completed with success"))
+
+    def _wrap_netns(self, args):
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        return args
+
+    def _apply_full(self, cmd, tables):
+        args = self._wrap_netns(['%s-save' % (cmd,), '-c'])
+        all_tables = self.execute(args, root_helper=self.root_helper)
+        all_lines = all_tables.split('\n')
+        for table_name, table in tables.iteritems():
+            start, end = self._find_table(all_lines, table_name)
+            all_lines[start:end] = self._modify_rules(
+                all_lines[start:end], table, table_name)
+
+        args = self._wrap_netns(['%s-restore' % (cmd,), '-c'])
+        self.execute(args, process_input='\n'.join(all_lines),
+                     root_helper=self.root_helper)
+        for table in tables.itervalues():
+            table.mark_applied()
+
+    def _apply_incremental(self, cmd, tables):
+        all_lines = []
+        for table_name, table in tables.iteritems():
+            if table.dirty_chains:
+                all_lines += self._modify_dirty_chains(table, table_name)
+
+        args = self._wrap_netns(['%s-restore' % (cmd,), '--noflush'])
+        try:
             self.execute(args, process_input='\n'.join(all_lines),
                          root_helper=self.root_helper)
-        LOG.debug(_("IPTablesManager.apply completed with success"))
+        except RuntimeError:
+            # The chains on the host may have diverged from the ones we
+            # believe were applied, so fall back to reloading everything.
+            LOG.warn(_('Incremental %s-restore failed, reloading the '
+                       'full tables'), cmd)
+            self._apply_full(cmd, tables)
+            return
+        for table in tables.itervalues():
+            table.mark_applied()
+
+    def _modify_dirty_chains(self, table, table_name):
+        """Build the iptables-restore --noflush input for a table.
+
+        Dirty chains that exist on the host are flushed, new ones are
+        declared, and removed ones are deleted once nothing jumps to them
+        anymore. Packet and byte counters of refilled chains are reset.
+        """
+        def _wrap(name):
+            return '%s-%s' % (binary_name, name)
+
+        dirty_chains = table.dirty_chains
+        new_chains = (dirty_chains & table.chains) - table.applied_chains
+        old_chains = dirty_chains & table.applied_chains
+        gone_chains = old_chains - table.chains
+
+        lines = ['*%s' % table_name]
+        lines += [':%s - [0:0]' % _wrap(name) for name in sorted(new_chains)]
+        lines += ['-F %s' % _wrap(name) for name in sorted(old_chains)]
+
+        rules = [rule for rule in table.rules
+                 if rule.wrap and rule.chain in dirty_chains]
+        seen_rules = set()
+        for rule in ([r for r in rules if r.top] +
+                     [r for r in rules if not r.top]):
+            rule_str = str(rule)
+            if rule_str not in seen_rules:
+                seen_rules.add(rule_str)
+                lines.append(rule_str)
+
+        lines += ['-X %s' % _wrap(name) for name in sorted(gone_chains)]
+        lines.append('COMMIT')
+        return lines
 
     def _find_table(self, lines, table_name):
         if len(lines) < 3:
@@ -407,6 +506,17 @@ class IptablesManager(object):
                           '# Completed by iptables_manager']
             current_lines = fake_table
 
+        def _strip_packets_bytes(line):
+            # strip any [packet:byte] counts at start or end of lines
+            if line.startswith(':'):
+                # it's a chain, for example, ":neutron-billing - [0:0]"
+                line = line.split(' - [', 1)[0]
+            elif line.startswith('['):
+                # it's a rule, for example, "[0:0] -A neutron-billing..."
+                line = line.split('] ', 1)[1]
+            line = line.strip()
+            return line
+
         # Fill old_filter with any chains or rules we might have added,
         # they could have a [packet:byte] count we want to preserve.
         # Fill new_filter with any chains or rules without our name in them.
@@ -415,147 +525,75 @@ class IptablesManager(object):
             (old_filter if binary_name in line else
              new_filter).append(line.strip())
 
-        rules_index = self._find_rules_index(new_filter)
+        # Index the existing chains and rules by their definition without
+        # [packet:byte] counts. The last occurrence of a definition wins
+        # since it could have a non-zero count we want to preserve.
+        old_lines = dict((_strip_packets_bytes(line), line)
+                         for line in old_filter)
+        dup_lines = dict((_strip_packets_bytes(line), line)
+                         for line in new_filter)
 
         all_chains = [':%s' % name for name in unwrapped_chains]
         all_chains += [':%s-%s' % (binary_name, name) for name in chains]
 
-        # Iterate through all the chains, trying to find an existing
-        # match.
+        # Look up an existing match for each of our chains, falling back
+        # to a duplicate without our name, then to a new chain.
         our_chains = []
-        for chain in all_chains:
-            chain_str = str(chain).strip()
-
-            orig_filter = [s for s in old_filter if chain_str in s.strip()]
-            dup_filter = [s for s in new_filter if chain_str in s.strip()]
-            new_filter = [s for s in new_filter if chain_str not in s.strip()]
-
-            # if no old or duplicates, use original chain
-            if orig_filter:
-                # grab the last entry, if there is one
-                old = orig_filter[-1]
-                chain_str = str(old).strip()
-            elif dup_filter:
-                # grab the last entry, if there is one
-                dup = dup_filter[-1]
-                chain_str = str(dup).strip()
-            else:
-                # add-on the [packet:bytes]
-                chain_str += ' - [0:0]'
-
-            our_chains += [chain_str]
-
-        # Iterate through all the rules, trying to find an existing
-        # match.
+        for chain_str in all_chains:
+            chain_str = (old_lines.get(chain_str) or
+                         dup_lines.get(chain_str) or
+                         chain_str + ' - [0:0]')
+            our_chains.append(chain_str)
+
+        # Same for our rules, keeping the rules meant to be at the top of
+        # their chain ahead of the others.
         our_rules = []
         bot_rules = []
+        our_keys = set(all_chains)
         for rule in rules:
-            rule_str = str(rule).strip()
-            # Further down, we weed out duplicates from the bottom of the
-            # list, so here we remove the dupes ahead of time.
-
-            orig_filter = [s for s in old_filter if rule_str in s.strip()]
-            dup_filter = [s for s in new_filter if rule_str in s.strip()]
-            new_filter = [s for s in new_filter if rule_str not in s.strip()]
-
-            # if no old or duplicates, use original rule
-            if orig_filter:
-                # grab the last entry, if there is one
-                old = orig_filter[-1]
-                rule_str = str(old).strip()
-            elif dup_filter:
-                # grab the last entry, if there is one
-                dup = dup_filter[-1]
-                rule_str = str(dup).strip()
-                # backup one index so we write the array correctly
-                rules_index -= 1
-            else:
-                # add-on the [packet:bytes]
-                rule_str = '[0:0] ' + rule_str
+            rule_key = str(rule).strip()
+            our_keys.add(rule_key)
+            rule_str = (old_lines.get(rule_key) or
+                        dup_lines.get(rule_key) or
+                        '[0:0] ' + rule_key)
 
             if rule.top:
                 # rule.top == True means we want this rule to be at the top.
-                our_rules += [rule_str]
+                our_rules.append(rule_str)
             else:
-                bot_rules += [rule_str]
+                bot_rules.append(rule_str)
 
         our_rules += bot_rules
 
+        # Our chains and rules replace their duplicates, and are inserted
+        # right after the remaining chain definitions.
+        new_filter = [line for line in new_filter
+                      if _strip_packets_bytes(line) not in our_keys]
+        rules_index = self._find_rules_index(new_filter)
         new_filter[rules_index:rules_index] = our_rules
         new_filter[rules_index:rules_index] = our_chains
 
-        def _strip_packets_bytes(line):
-            # strip any [packet:byte] counts at start or end of lines
-            if line.startswith(':'):
-                # it's a chain, for example, ":neutron-billing - [0:0]"
-                line = line.split(':')[1]
-                line = line.split(' - [', 1)[0]
-            elif line.startswith('['):
-                # it's a rule, for example, "[0:0] -A neutron-billing..."
-                line = line.split('] ', 1)[1]
-            line = line.strip()
-            return line
-
-        seen_chains = set()
-
-        def _weed_out_duplicate_chains(line):
-            # ignore [packet:byte] counts at end of lines
-            if line.startswith(':'):
-                line = _strip_packets_bytes(line)
-                if line in seen_chains:
-                    return False
-                else:
-                    seen_chains.add(line)
-
-            # Leave it alone
-            return True
-
-        seen_rules = set()
-
-        def _weed_out_duplicate_rules(line):
-            if line.startswith('['):
-                line = _strip_packets_bytes(line)
-                if line in seen_rules:
-                    return False
-                else:
-                    seen_rules.add(line)
-
-            # Leave it alone
-            return True
-
-        def _weed_out_removes(line):
-            # We need to find exact matches here
-            if line.startswith(':'):
-                line = _strip_packets_bytes(line)
-                for chain in remove_chains:
-                    if chain == line:
-                        remove_chains.remove(chain)
-                        return False
-            elif line.startswith('['):
-                line = _strip_packets_bytes(line)
-                for rule in remove_rules:
-                    rule_str = _strip_packets_bytes(str(rule))
-                    if rule_str == line:
-                        remove_rules.remove(rule)
-                        return False
-
-            # Leave it alone
-            return True
+        remove_keys = set(':%s' % name for name in remove_chains)
+        remove_keys.update(_strip_packets_bytes(str(rule))
+                           for rule in remove_rules)
 
         # We filter duplicates.  Go throught the chains and rules, letting
         # the *last* occurrence take precendence since it could have a
         # non-zero [packet:byte] count we want to preserve.  We also filter
         # out anything in the "remove" list.
-        new_filter.reverse()
-        new_filter = [line for line in new_filter
-                      if _weed_out_duplicate_chains(line) and
-                      _weed_out_duplicate_rules(line) and
-                      _weed_out_removes(line)]
-        new_filter.reverse()
+        seen_lines = set()
+        filtered = []
+        for line in reversed(new_filter):
+            if line.startswith(':') or line.startswith('['):
+                line_key = _strip_packets_bytes(line)
+                if line_key in seen_lines or line_key in remove_keys:
+                    continue
+                seen_lines.add(line_key)
+            filtered.append(line)
+        filtered.reverse()
 
         # flush lists, just in case we didn't find something
         remove_chains.clear()
-        for rule in remove_rules:
-            remove_rules.remove(rule)
+        del remove_rules[:]
 
-        return new_filter
+        return filtered
@@ -230,51 +230,62 @@ class OVSBridge:
             LOG.error(_("Unable to execute %(cmd)s. Exception: %(exception)s"),
                       {'cmd': args, 'exception': e})
 
-    # returns a VIF object for each VIF port
-    def get_vif_ports(self):
-        edge_ports = []
-        port_names = self.get_port_name_list()
-        for name in port_names:
-            external_ids = self.db_get_map("Interface", name, "external_ids")
-            ofport = self.db_get_val("Interface", name, "ofport")
-            if "iface-id" in external_ids and "attached-mac" in external_ids:
-                p = VifPort(name, ofport, external_ids["iface-id"],
-                            external_ids["attached-mac"], self)
-                edge_ports.append(p)
-            elif ("xs-vif-uuid" in external_ids and
-                  "attached-mac" in external_ids):
-                # if this is a xenserver and iface-id is not automatically
-                # synced to OVS from XAPI, we grab it from XAPI directly
-                iface_id = self.get_xapi_iface_id(external_ids["xs-vif-uuid"])
-                p = VifPort(name, ofport, iface_id,
-                            external_ids["attached-mac"], self)
-                edge_ports.append(p)
-
-        return edge_ports
-
-    def get_vif_port_set(self):
-        port_names = self.get_port_name_list()
-        edge_ports = set()
-        args = ['--format=json', '--', '--columns=name,external_ids',
+    def _get_vif_port_rows(self, columns):
+        """Return the Interface rows of the vif ports of this bridge.
+
+        The requested columns of every interface are fetched with a single
+        ovs-vsctl invocation rather than with one query per port, so the
+        cost of a scan does not grow with the number of ports.
+
+        :param columns: the Interface columns to retrieve, which must
+                        include 'name' and 'external_ids'.
+        :returns: a list of (row, vif_id, vif_mac) tuples where row maps
+                  each requested column to its value.
+        """
+        port_names = set(self.get_port_name_list())
+        args = ['--format=json', '--', '--columns=%s' % ','.join(columns),
                 'list', 'Interface']
         result = self.run_vsctl(args)
         if not result:
-            return edge_ports
-        for row in jsonutils.loads(result)['data']:
-            name = row[0]
-            if name not in port_names:
+            return []
+        result = jsonutils.loads(result)
+        vif_port_rows = []
+        for row in result['data']:
+            row = dict(zip(result['headings'], row))
+            if row['name'] not in port_names:
                 continue
-            external_ids = dict(row[1][1])
-            if "iface-id" in external_ids and "attached-mac" in external_ids:
-                edge_ports.add(external_ids['iface-id'])
-            elif ("xs-vif-uuid" in external_ids and
-                  "attached-mac" in external_ids):
+            external_ids = dict(row['external_ids'][1])
+            if "attached-mac" not in external_ids:
+                continue
+            if "iface-id" in external_ids:
+                vif_id = external_ids["iface-id"]
+            elif "xs-vif-uuid" in external_ids:
                 # if this is a xenserver and iface-id is not automatically
                 # synced to OVS from XAPI, we grab it from XAPI directly
-                iface_id = self.get_xapi_iface_id(external_ids["xs-vif-uuid"])
-                edge_ports.add(iface_id)
+                vif_id = self.get_xapi_iface_id(external_ids["xs-vif-uuid"])
+            else:
+                continue
+            vif_port_rows.append((row, vif_id, external_ids["attached-mac"]))
+        return vif_port_rows
+
+    # returns a VIF object for each VIF port
+    def get_vif_ports(self):
+        edge_ports = []
+        for row, vif_id, vif_mac in self._get_vif_port_rows(
+                ['name', 'ofport', 'external_ids']):
+            # An interface which has not been assigned an OpenFlow port
+            # number yet reports an empty set instead of an integer.
+            ofport = row['ofport']
+            if not isinstance(ofport, int):
+                ofport = -1
+            edge_ports.append(VifPort(row['name'], ofport, vif_id, vif_mac,
+                                      self))
         return edge_ports
 
+    def get_vif_port_set(self):
+        return set(vif_id for row, vif_id, vif_mac in
+                   self._get_vif_port_rows(['name', 'external_ids']))
+
     def get_vif_port_by_id(self, port_id):
         args = ['--', '--columns=external_ids,name,ofport',
                 'find', 'Interface',
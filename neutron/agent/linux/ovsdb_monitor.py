@@ -0,0 +1,151 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright 2013 OpenStack Foundation.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from neutron.agent.linux import async_process
+from neutron.openstack.common import jsonutils
+from neutron.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+
+class OvsdbMonitor(async_process.AsyncProcess):
+    """Manages an invocation of 'ovsdb-client monitor'."""
+
+    def __init__(self, table_name, columns=None, format=None,
+                 root_helper=None, respawn_interval=None):
+
+        cmd = ['ovsdb-client', 'monitor', table_name]
+        if columns:
+            cmd.append(','.join(columns))
+        if format:
+            cmd.append('--format=%s' % format)
+        super(OvsdbMonitor, self).__init__(cmd,
+                                           root_helper=root_helper,
+                                           respawn_interval=respawn_interval)
+
+    def _read_stderr(self):
+        data = super(OvsdbMonitor, self)._read_stderr()
+        if data:
+            for line in self.iter_stderr():
+                LOG.error(_('Error received from ovsdb monitor: %s'), line)
+        return data
+
+
+class SimpleInterfaceMonitor(OvsdbMonitor):
+    """Monitors the Interface table of the local host's ovsdb for changes.
+
+    The output of 'ovsdb-client monitor' is parsed into the sets of vif
+    ids (i.e. the 'iface-id' external id) that have been added or
+    removed since the last call to get_events().  A full scan is
+    requested from the caller whenever the monitor output cannot be
+    reliably translated into deltas, e.g. after the monitor process
+    has been (re)spawned.
+    """
+
+    def __init__(self, root_helper=None, respawn_interval=None):
+        super(SimpleInterfaceMonitor, self).__init__(
+            'Interface',
+            columns=['name', 'external_ids'],
+            format='json',
+            root_helper=root_helper,
+            respawn_interval=respawn_interval,
+        )
+        # Maps the uuid of each known Interface row to its vif id
+        self._vif_ids = {}
+        self._resync_needed = True
+
+    def _spawn(self):
+        # A new monitor process reports the whole table again, so any
+        # output left over from a previous process must not be mixed
+        # with it and the caller has to rescan the bridge.
+        self._reset_queues()
+        self._vif_ids = {}
+        self._resync_needed = True
+        super(SimpleInterfaceMonitor, self)._spawn()
+
+    @property
+    def is_active(self):
+        return self._kill_event is not None
+
+    def wait_for_changes(self, timeout):
+        """Block until the interface table changes or timeout expires.
+
+        :returns: True if there is pending output to process.
+        """
+        return self.wait_for_output(timeout=timeout)
+
+    @staticmethod
+    def _get_vif_id(external_ids):
+        """Return the vif id described by an external_ids ovsdb map."""
+        if not isinstance(external_ids, list) or len(external_ids) != 2:
+            return
+        external_ids = dict(external_ids[1])
+        if 'attached-mac' not in external_ids:
+            return
+        if 'iface-id' in external_ids:
+            return external_ids['iface-id']
+        if 'xs-vif-uuid' in external_ids:
+            # The iface-id of a xenserver vif has to be retrieved from
+            # XAPI, which only a full scan of the bridge knows how to do.
+            raise ValueError(_('Unable to determine the vif id of a '
+                               'xenserver interface from ovsdb events'))
+
+    def _process_line(self, line, added, removed):
+        update = jsonutils.loads(line)
+        headings = update['headings']
+        for row in update['data']:
+            row = dict(zip(headings, row))
+            uuid = row['row']
+            action = row['action']
+            if action in ('initial', 'insert', 'new'):
+                vif_id = self._get_vif_id(row.get('external_ids'))
+                old_vif_id = self._vif_ids.pop(uuid, None)
+                if old_vif_id and old_vif_id != vif_id:
+                    added.pop(old_vif_id, None)
+                    removed.add(old_vif_id)
+                if vif_id:
+                    self._vif_ids[uuid] = vif_id
+                    removed.discard(vif_id)
+                    added[vif_id] = row['name']
+            elif action == 'delete':
+                vif_id = self._vif_ids.pop(uuid, None)
+                if vif_id:
+                    added.pop(vif_id, None)
+                    removed.add(vif_id)
+            # 'old' rows only carry the previous values of the modified
+            # columns and are superseded by the following 'new' row.
+
+    def get_events(self):
+        """Consume the pending monitor output.
+
+        :returns: None if a full scan is required, otherwise a tuple of
+                  a dict mapping each added vif id to its port name and
+                  of the set of removed vif ids.
+        """
+        added = {}
+        removed = set()
+        for line in self.iter_stdout():
+            try:
+                self._process_line(line, added, removed)
+            except Exception as e:
+                LOG.debug(_('Unable to process ovsdb monitor output '
+                            '%(line)s: %(e)s'), {'line': line, 'e': e})
+                self._resync_needed = True
+        if self._resync_needed:
+            self._resync_needed = False
+            return
+        return added, removed
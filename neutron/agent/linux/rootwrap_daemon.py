@@ -0,0 +1,258 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Root wrapper daemon
+
+   Runs the commands of a service through the same filters as
+   neutron-rootwrap, but loads the filters once and serves the commands
+   over a UNIX socket instead of being started for each command.
+
+   The daemon is started by the service itself, e.g. with:
+   sudo neutron-rootwrap-daemon /etc/neutron/rootwrap.conf
+
+   It prints the path of its socket and a random authentication key on
+   its standard output, and exits when its standard input is closed,
+   i.e. when the service exits. The socket is created in a directory
+   only accessible by the user which started the daemon through sudo,
+   and each connection must prove that it knows the key before running
+   commands.
+
+   The messages are JSON documents prefixed by their length. The
+   arguments, input and output of the commands are byte strings, which
+   are sent as latin-1 decoded strings so that any byte goes through
+   JSON unchanged.
+
+   The daemon only relies on the rootwrap library synced from
+   oslo-incubator, which is left unmodified; it is kept here until it can
+   be proposed to oslo rootwrap.
+"""
+
+import ConfigParser
+import hashlib
+import hmac
+import json
+import logging
+import os
+import shutil
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+
+from neutron.openstack.common.rootwrap import cmd
+from neutron.openstack.common.rootwrap import wrapper
+
+
+_HEADER = struct.Struct('!I')
+
+
+def encode_bytes(data):
+    if data is None:
+        return None
+    return data.decode('latin-1')
+
+
+def decode_bytes(data):
+    if data is None:
+        return None
+    return data.encode('latin-1')
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 65536))
+        if not chunk:
+            raise EOFError()
+        chunks.append(chunk)
+        size -= len(chunk)
+    return ''.join(chunks)
+
+
+def send_message(sock, message):
+    data = json.dumps(message)
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def recv_message(sock):
+    """Receive a message, raising EOFError if the peer closed the socket."""
+    size, = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+    return json.loads(_recv_exactly(sock, size))
+
+
+def get_digest(authkey, challenge):
+    return hmac.new(str(authkey), str(challenge), hashlib.sha256).hexdigest()
+
+
+def _compare_digest(a, b):
+    if hasattr(hmac, 'compare_digest'):
+        return hmac.compare_digest(a, b)
+    # Python < 2.7.7, compare the digests in constant time
+    if len(a) != len(b):
+        return False
+    result = 0
+    for x, y in zip(a, b):
+        result |= ord(x) ^ ord(y)
+    return result == 0
+
+
+class RootwrapDaemon(object):
+
+    def __init__(self, config, filters, authkey):
+        self.config = config
+        self.filters = filters
+        self.authkey = authkey
+
+    def run_command(self, userargs, process_input=None):
+        """Run a command if it matches a filter.
+
+        Returns a tuple of the exit code, output and error output of the
+        command, using the exit codes of neutron-rootwrap when the command
+        is refused.
+        """
+        if not userargs:
+            return cmd.RC_NOCOMMAND, '', 'No command specified'
+        try:
+            filtermatch = wrapper.match_filter(self.filters, userargs,
+                                               exec_dirs=self.config.exec_dirs)
+        except wrapper.FilterMatchNotExecutable as exc:
+            msg = ("Executable not found: %s (filter match = %s)"
+                   % (exc.match.exec_path, exc.match.name))
+            if self.config.use_syslog:
+                logging.error(msg)
+            return cmd.RC_NOEXECFOUND, '', msg
+        except wrapper.NoFilterMatched:
+            msg = ("Unauthorized command: %s (no filter matched)"
+                   % ' '.join(userargs))
+            if self.config.use_syslog:
+                logging.error(msg)
+            return cmd.RC_UNAUTHORIZED, '', msg
+
+        command = filtermatch.get_command(userargs,
+                                          exec_dirs=self.config.exec_dirs)
+        if self.config.use_syslog:
+            logging.info("Executing %s (filter match = %s)" % (
+                command, filtermatch.name))
+        obj = subprocess.Popen(command,
+                               stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE,
+                               close_fds=True,
+                               preexec_fn=cmd._subprocess_setup,
+                               env=filtermatch.get_environment(userargs))
+        stdout, stderr = obj.communicate(process_input)
+        return obj.returncode, stdout, stderr
+
+    def handle_connection(self, conn):
+        """Authenticate a connection and run the commands it sends."""
+        try:
+            challenge = os.urandom(16).encode('hex')
+            send_message(conn, {'challenge': challenge})
+            digest = str(recv_message(conn).get('digest', ''))
+            if not _compare_digest(digest,
+                                   get_digest(self.authkey, challenge)):
+                logging.warning("Refusing unauthenticated connection")
+                return
+            while True:
+                request = recv_message(conn)
+                userargs = [decode_bytes(arg) for arg in request['cmd']]
+                returncode, stdout, stderr = self.run_command(
+                    userargs, decode_bytes(request.get('stdin')))
+                send_message(conn, {'returncode': returncode,
+                                    'stdout': encode_bytes(stdout),
+                                    'stderr': encode_bytes(stderr)})
+        except EOFError:
+            pass
+        except Exception:
+            logging.exception("Error serving a connection")
+        finally:
+            conn.close()
+
+    def serve_forever(self, server):
+        while True:
+            conn, _address = server.accept()
+            thread = threading.Thread(target=self.handle_connection,
+                                      args=(conn,))
+            thread.daemon = True
+            thread.start()
+
+
+def _exit(signum, frame):
+    sys.exit(0)
+
+
+def serve(config):
+    """Serve the commands of the service which started the daemon."""
+    filters = wrapper.load_filters(config.filters_path)
+    authkey = os.urandom(32).encode('hex')
+    # mkdtemp creates the directory only accessible by its owner
+    tmpdir = tempfile.mkdtemp(prefix='rootwrap-')
+    signal.signal(signal.SIGTERM, _exit)
+    try:
+        path = os.path.join(tmpdir, 'rootwrap.sock')
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        server.listen(128)
+        # Let the user which started the daemon through sudo connect
+        uid = int(os.environ.get('SUDO_UID', os.getuid()))
+        gid = int(os.environ.get('SUDO_GID', os.getgid()))
+        os.chown(tmpdir, uid, gid)
+        os.chown(path, uid, gid)
+
+        daemon = RootwrapDaemon(config, filters, authkey)
+        thread = threading.Thread(target=daemon.serve_forever,
+                                  args=(server,))
+        thread.daemon = True
+        thread.start()
+
+        sys.stdout.write('%s\n%s\n' % (path, authkey))
+        sys.stdout.flush()
+        # Serve until the service closes our standard input
+        while os.read(sys.stdin.fileno(), 4096):
+            pass
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def main():
+    execname = sys.argv.pop(0)
+    if len(sys.argv) != 1:
+        cmd._exit_error(execname, "No configuration file specified",
+                        cmd.RC_BADCONFIG, log=False)
+    configfile = sys.argv.pop(0)
+
+    try:
+        rawconfig = ConfigParser.RawConfigParser()
+        rawconfig.read(configfile)
+        config = wrapper.RootwrapConfig(rawconfig)
+    except ValueError as exc:
+        msg = "Incorrect value in %s: %s" % (configfile, exc.message)
+        cmd._exit_error(execname, msg, cmd.RC_BADCONFIG, log=False)
+    except ConfigParser.Error:
+        cmd._exit_error(execname,
+                        "Incorrect configuration file: %s" % configfile,
+                        cmd.RC_BADCONFIG, log=False)
+
+    if config.use_syslog:
+        wrapper.setup_syslog(execname,
+                             config.syslog_log_facility,
+                             config.syslog_log_level)
+
+    serve(config)
@@ -25,7 +25,11 @@ import struct
 import tempfile
 
 from eventlet.green import subprocess
+from eventlet import semaphore
+from oslo.config import cfg
 
+from neutron.agent.common import config
+from neutron.agent.linux import rootwrap_daemon as daemon
 from neutron.common import utils
 from neutron.openstack.common import log as logging
 
@@ -33,8 +37,12 @@ from neutron.openstack.common import log as logging
 LOG = logging.getLogger(__name__)
 
 
-def execute(cmd, root_helper=None, process_input=None, addl_env=None,
-            check_exit_code=True, return_stderr=False):
+def create_process(cmd, root_helper=None, addl_env=None):
+    """Create a process object for the given command.
+
+    The return value will be a tuple of the process object and the
+    list of command arguments used to create it.
+    """
     if root_helper:
         cmd = shlex.split(root_helper) + cmd
     cmd = map(str, cmd)
@@ -49,15 +57,130 @@ def execute(cmd, root_helper=None, process_input=None, addl_env=None,
                                  stderr=subprocess.PIPE,
                                  env=env)
 
-    _stdout, _stderr = (process_input and
-                        obj.communicate(process_input) or
-                        obj.communicate())
-    obj.stdin.close()
+    return obj, cmd
+
+
+class RootHelperDaemonClient(object):
+    """Client running commands through a root helper daemon.
+
+    The daemon is started on first use, and started again if it exits.
+    The authenticated connections to the daemon are kept open to be
+    reused by the next commands.
+    """
+
+    def __init__(self, daemon_cmd):
+        self.daemon_cmd = shlex.split(daemon_cmd)
+        self._lock = semaphore.Semaphore()
+        self._process = None
+        self._address = None
+        self._authkey = None
+        self._connections = []
+
+    def _ensure_daemon(self):
+        if self._process and self._process.poll() is None:
+            return
+        for conn in self._connections:
+            conn.close()
+        self._connections = []
+        LOG.debug(_("Starting root helper daemon: %s"), self.daemon_cmd)
+        self._process = utils.subprocess_popen(self.daemon_cmd, shell=False,
+                                               stdin=subprocess.PIPE,
+                                               stdout=subprocess.PIPE)
+        self._address = self._process.stdout.readline().strip()
+        self._authkey = self._process.stdout.readline().strip()
+        if not self._authkey:
+            raise RuntimeError(_("Root helper daemon %s failed to start") %
+                               self.daemon_cmd)
+
+    def _get_connection(self):
+        with self._lock:
+            self._ensure_daemon()
+            process = self._process
+            if self._connections:
+                return process, self._connections.pop()
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            conn.connect(self._address)
+            challenge = daemon.recv_message(conn)['challenge']
+            daemon.send_message(
+                conn, {'digest': daemon.get_digest(self._authkey, challenge)})
+        except Exception:
+            conn.close()
+            raise
+        return process, conn
+
+    def execute(self, cmd, process_input=None):
+        """Run a command, returning its exit code, output and error output."""
+        try:
+            process, conn = self._get_connection()
+        except (EOFError, socket.error) as e:
+            raise RuntimeError(_("Unable to connect to root helper daemon: "
+                                 "%s") % e)
+        try:
+            daemon.send_message(
+                conn, {'cmd': [daemon.encode_bytes(arg) for arg in cmd],
+                       'stdin': daemon.encode_bytes(process_input)})
+            reply = daemon.recv_message(conn)
+        except (EOFError, socket.error) as e:
+            conn.close()
+            raise RuntimeError(_("Root helper daemon failed to run %(cmd)s: "
+                                 "%(error)s") % {'cmd': cmd, 'error': e})
+        if process is self._process:
+            self._connections.append(conn)
+        else:
+            conn.close()
+        return (reply['returncode'], daemon.decode_bytes(reply['stdout']),
+                daemon.decode_bytes(reply['stderr']))
+
+
+_root_helper_daemon_clients = {}
+
+
+def _get_root_helper_daemon_client(root_helper):
+    """Return the daemon client replacing the given root helper, if any.
+
+    The daemon applies the rootwrap filters in place of the root helper
+    configured for the agent, other root helpers are run as given.
+    """
+    try:
+        daemon_cmd = cfg.CONF.AGENT.root_helper_daemon
+        configured_root_helper = config.get_root_helper(cfg.CONF)
+    except cfg.NoSuchOptError:
+        return
+    if not daemon_cmd or root_helper != configured_root_helper:
+        return
+    if daemon_cmd not in _root_helper_daemon_clients:
+        _root_helper_daemon_clients[daemon_cmd] = RootHelperDaemonClient(
+            daemon_cmd)
+    return _root_helper_daemon_clients[daemon_cmd]
+
+
+def execute(cmd, root_helper=None, process_input=None, addl_env=None,
+            check_exit_code=True, return_stderr=False):
+    client = root_helper and _get_root_helper_daemon_client(root_helper)
+    if client:
+        # The daemon replaces the root helper, which is not prefixed, and
+        # runs the commands with its own environment.
+        if addl_env:
+            cmd = (['env'] +
+                   ['%s=%s' % pair for pair in sorted(addl_env.items())] +
+                   cmd)
+        cmd = map(str, cmd)
+        LOG.debug(_("Running command with root helper daemon: %s"), cmd)
+        returncode, _stdout, _stderr = client.execute(cmd, process_input)
+    else:
+        obj, cmd = create_process(cmd, root_helper=root_helper,
+                                  addl_env=addl_env)
+        _stdout, _stderr = (process_input and
+                            obj.communicate(process_input) or
+                            obj.communicate())
+        obj.stdin.close()
+        returncode = obj.returncode
     m = _("\nCommand: %(cmd)s\nExit code: %(code)s\nStdout: %(stdout)r\n"
-          "Stderr: %(stderr)r") % {'cmd': cmd, 'code': obj.returncode,
+          "Stderr: %(stderr)r") % {'cmd': cmd, 'code': returncode,
                                    'stdout': _stdout, 'stderr': _stderr}
     LOG.debug(m)
-    if obj.returncode and check_exit_code:
+    if returncode and check_exit_code:
         raise RuntimeError(m)
 
     return return_stderr and (_stdout, _stderr) or _stdout
@@ -20,9 +20,11 @@ import hashlib
 import hmac
 import os
 import socket
+import time
 import urlparse
 
 import eventlet
+from eventlet import pools
 import httplib2
 from neutronclient.v2_0 import client
 from oslo.config import cfg
@@ -38,6 +40,55 @@ LOG = logging.getLogger(__name__)
 DEVICE_OWNER_ROUTER_INTF = "network:router_interface"
 
 
+class InstanceIdCache(object):
+    """Cache of recent metadata lookups.
+
+    The entries expire ttl seconds after being set, and the least
+    recently used entries are evicted when max_size entries are cached.
+    A ttl or max_size of 0 disables the cache.
+    """
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        # key -> [expiration time, value, last use time]
+        self._entries = {}
+
+    def get(self, key):
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry and entry[0] > now:
+            entry[2] = now
+            self.hits += 1
+            return entry[1]
+        if entry:
+            del self._entries[key]
+        self.misses += 1
+
+    def set(self, key, value):
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        now = time.time()
+        if key not in self._entries and len(self._entries) >= self.max_size:
+            self._evict(now)
+        self._entries[key] = [now + self.ttl, value, now]
+
+    def _evict(self, now):
+        for key, entry in self._entries.items():
+            if entry[0] <= now:
+                del self._entries[key]
+        if len(self._entries) >= self.max_size:
+            del self._entries[min(self._entries,
+                                  key=lambda k: self._entries[k][2])]
+
+    @property
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        return lookups and float(self.hits) / lookups
+
+
 class MetadataProxyHandler(object):
     OPTS = [
         cfg.StrOpt('admin_user',
@@ -62,15 +113,34 @@ class MetadataProxyHandler(object):
         cfg.IntOpt('nova_metadata_port',
                    default=8775,
                    help=_("TCP Port used by Nova metadata server.")),
+        cfg.IntOpt('nova_metadata_pool_size',
+                   default=100,
+                   help=_("Maximum number of connections to the Nova "
+                          "metadata server, kept open to be reused by the "
+                          "following requests.")),
         cfg.StrOpt('metadata_proxy_shared_secret',
                    default='',
                    help=_('Shared secret to sign instance-id request'),
-                   secret=True)
+                   secret=True),
+        cfg.IntOpt('metadata_cache_ttl', default=5,
+                   help=_('Number of seconds the instance owning an address '
+                          'and the networks of a router are cached, 0 '
+                          'disables the cache')),
+        cfg.IntOpt('metadata_cache_size', default=1000,
+                   help=_('Maximum number of addresses and routers cached')),
     ]
 
     def __init__(self, conf):
         self.conf = conf
         self.auth_info = {}
+        self.instance_cache = InstanceIdCache(conf.metadata_cache_ttl,
+                                              conf.metadata_cache_size)
+        self.router_cache = InstanceIdCache(conf.metadata_cache_ttl,
+                                            conf.metadata_cache_size)
+        # Each client keeps its connection to nova open between requests.
+        self.http_pool = pools.Pool(max_size=conf.nova_metadata_pool_size,
+                                    order_as_stack=True,
+                                    create=lambda: httplib2.Http())
 
     def _get_neutron_client(self):
         qclient = client.Client(
@@ -104,20 +174,38 @@ class MetadataProxyHandler(object):
             return webob.exc.HTTPInternalServerError(explanation=unicode(msg))
 
     def _get_instance_id(self, req):
-        qclient = self._get_neutron_client()
-
         remote_address = req.headers.get('X-Forwarded-For')
         network_id = req.headers.get('X-Neutron-Network-ID')
         router_id = req.headers.get('X-Neutron-Router-ID')
 
+        # Instances request their metadata many times while booting, the
+        # lookups of their recent requests are reused.
+        key = (network_id, router_id, remote_address)
+        instance_id = self.instance_cache.get(key)
+        if not instance_id:
+            instance_id = self._lookup_instance_id(network_id, router_id,
+                                                   remote_address)
+            if instance_id:
+                self.instance_cache.set(key, instance_id)
+        LOG.debug(_("Metadata cache hit ratio: %.2f"),
+                  self.instance_cache.hit_ratio)
+        return instance_id
+
+    def _lookup_instance_id(self, network_id, router_id, remote_address):
+        qclient = self._get_neutron_client()
+
         if network_id:
             networks = [network_id]
         else:
-            internal_ports = qclient.list_ports(
-                device_id=router_id,
-                device_owner=DEVICE_OWNER_ROUTER_INTF)['ports']
+            networks = self.router_cache.get(router_id)
+            if not networks:
+                internal_ports = qclient.list_ports(
+                    device_id=router_id,
+                    device_owner=DEVICE_OWNER_ROUTER_INTF)['ports']
 
-            networks = [p['network_id'] for p in internal_ports]
+                networks = [p['network_id'] for p in internal_ports]
+                if networks:
+                    self.router_cache.set(router_id, networks)
 
         ports = qclient.list_ports(
             network_id=networks,
@@ -143,9 +231,9 @@ class MetadataProxyHandler(object):
             req.query_string,
             ''))
 
-        h = httplib2.Http()
-        resp, content = h.request(url, method=req.method, headers=headers,
-                                  body=req.body)
+        with self.http_pool.item() as h:
+            resp, content = h.request(url, method=req.method,
+                                      headers=headers, body=req.body)
 
         if resp.status == 200:
             LOG.debug(str(resp))
@@ -186,11 +274,11 @@ class UnixDomainHttpProtocol(eventlet.wsgi.HttpProtocol):
 
 
 class UnixDomainWSGIServer(wsgi.Server):
-    def start(self, application, file_socket, backlog=128):
-        sock = eventlet.listen(file_socket,
-                               family=socket.AF_UNIX,
-                               backlog=backlog)
-        self.pool.spawn_n(self._run, application, sock)
+    def start(self, application, file_socket, workers=0, backlog=128):
+        self._socket = eventlet.listen(file_socket,
+                                       family=socket.AF_UNIX,
+                                       backlog=backlog)
+        self._launch(application, workers=workers)
 
     def _run(self, application, socket):
         """Start a WSGI service in a new green thread."""
@@ -206,7 +294,20 @@ class UnixDomainMetadataProxy(object):
     OPTS = [
         cfg.StrOpt('metadata_proxy_socket',
                    default='$state_path/metadata_proxy',
-                   help=_('Location for Metadata Proxy UNIX domain socket'))
+                   help=_('Location for Metadata Proxy UNIX domain socket')),
+        cfg.IntOpt('metadata_backlog',
+                   default=128,
+                   help=_('Number of backlog requests to configure the '
+                          'metadata server socket with')),
+        cfg.IntOpt('metadata_threads',
+                   default=1000,
+                   help=_('Number of green threads serving the metadata '
+                          'requests in each process')),
+        cfg.IntOpt('metadata_workers',
+                   default=0,
+                   help=_('Number of separate worker processes serving the '
+                          'metadata requests, 0 serves them in the agent '
+                          'process')),
     ]
 
     def __init__(self, conf):
@@ -223,9 +324,12 @@ class UnixDomainMetadataProxy(object):
             os.makedirs(dirname, 0o755)
 
     def run(self):
-        server = UnixDomainWSGIServer('neutron-metadata-agent')
+        server = UnixDomainWSGIServer('neutron-metadata-agent',
+                                      threads=self.conf.metadata_threads)
         server.start(MetadataProxyHandler(self.conf),
-                     self.conf.metadata_proxy_socket)
+                     self.conf.metadata_proxy_socket,
+                     workers=self.conf.metadata_workers,
+                     backlog=self.conf.metadata_backlog)
         server.wait()
 
 
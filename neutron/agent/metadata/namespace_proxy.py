@@ -21,6 +21,7 @@ import socket
 import urlparse
 
 import eventlet
+from eventlet import pools
 import httplib2
 from oslo.config import cfg
 import webob
@@ -62,6 +63,10 @@ class NetworkMetadataProxyHandler(object):
     accessible within the isolated tenant context.
     """
 
+    # Maximum number of connections to the metadata agent, kept open to be
+    # reused by the following requests.
+    pool_size = 100
+
     def __init__(self, network_id=None, router_id=None):
         self.network_id = network_id
         self.router_id = router_id
@@ -70,6 +75,10 @@ class NetworkMetadataProxyHandler(object):
             msg = _('network_id and router_id are None. One must be provided.')
             raise ValueError(msg)
 
+        self.http_pool = pools.Pool(max_size=self.pool_size,
+                                    order_as_stack=True,
+                                    create=lambda: httplib2.Http())
+
     @webob.dec.wsgify(RequestClass=wsgi.Request)
     def __call__(self, req):
         LOG.debug(_("Request: %s"), req)
@@ -103,13 +112,13 @@ class NetworkMetadataProxyHandler(object):
             query_string,
             ''))
 
-        h = httplib2.Http()
-        resp, content = h.request(
-            url,
-            method=method,
-            headers=headers,
-            body=body,
-            connection_type=UnixDomainHTTPConnection)
+        with self.http_pool.item() as h:
+            resp, content = h.request(
+                url,
+                method=method,
+                headers=headers,
+                body=body,
+                connection_type=UnixDomainHTTPConnection)
 
         if resp.status == 200:
             LOG.debug(resp)
@@ -19,6 +19,7 @@ from neutron.common import topics
 
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import rpc
+from neutron.openstack.common.rpc import common as rpc_common
 from neutron.openstack.common.rpc import proxy
 from neutron.openstack.common import timeutils
 
@@ -68,6 +69,7 @@ class PluginApi(proxy.RpcProxy):
 
     API version history:
         1.0 - Initial version.
+        1.2 - get_devices_details_list.
 
     '''
 
@@ -76,6 +78,7 @@ class PluginApi(proxy.RpcProxy):
     def __init__(self, topic):
         super(PluginApi, self).__init__(
             topic=topic, default_version=self.BASE_RPC_API_VERSION)
+        self.devices_details_list_supported = True
 
     def get_device_details(self, context, device, agent_id):
         return self.call(context,
@@ -83,6 +86,29 @@ class PluginApi(proxy.RpcProxy):
                                        agent_id=agent_id),
                          topic=self.topic)
 
+    def get_devices_details_list(self, context, devices, agent_id):
+        """Retrieve the details of several devices with a single call.
+
+        Plugins which do not support the bulk call yet are detected from
+        the version they reject and are then queried device by device.
+        """
+        if self.devices_details_list_supported:
+            try:
+                return self.call(context,
+                                 self.make_msg('get_devices_details_list',
+                                               devices=devices,
+                                               agent_id=agent_id),
+                                 topic=self.topic, version='1.2')
+            except rpc_common.RemoteError as e:
+                if e.exc_type != 'UnsupportedRpcVersion':
+                    raise
+                LOG.warning(_("The plugin does not support "
+                              "get_devices_details_list, falling back to "
+                              "get_device_details"))
+                self.devices_details_list_supported = False
+        return [self.get_device_details(context, device, agent_id)
+                for device in devices]
+
     def update_device_down(self, context, device, agent_id):
         return self.call(context,
                          self.make_msg('update_device_down', device=device,
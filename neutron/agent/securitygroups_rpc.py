@@ -21,15 +21,27 @@ from oslo.config import cfg
 from neutron.common import topics
 from neutron.openstack.common import importutils
 from neutron.openstack.common import log as logging
+from neutron.openstack.common.rpc import common as rpc_common
 
 LOG = logging.getLogger(__name__)
 SG_RPC_VERSION = "1.1"
+SG_INFO_RPC_VERSION = "1.3"
 
 security_group_opts = [
     cfg.StrOpt(
         'firewall_driver',
         default='neutron.agent.firewall.NoopFirewallDriver',
-        help=_('Driver for Security Groups Firewall'))
+        help=_('Driver for Security Groups Firewall')),
+    cfg.BoolOpt(
+        'iptables_incremental_apply',
+        default=False,
+        help=_('Only reload the iptables chains changed since the last '
+               'update instead of the whole tables')),
+    cfg.BoolOpt(
+        'enable_ipset',
+        default=False,
+        help=_('Match the members of remote security groups with an '
+               'ipset per group instead of one iptables rule per member'))
 ]
 cfg.CONF.register_opts(security_group_opts, 'SECURITYGROUP')
 
@@ -57,6 +69,15 @@ class SecurityGroupServerRpcApiMixin(object):
                          version=SG_RPC_VERSION,
                          topic=self.topic)
 
+    def security_group_info_for_devices(self, context, devices):
+        LOG.debug(_("Get security group information "
+                    "for devices via rpc %r"), devices)
+        return self.call(context,
+                         self.make_msg('security_group_info_for_devices',
+                                       devices=devices),
+                         version=SG_INFO_RPC_VERSION,
+                         topic=self.topic)
+
 
 class SecurityGroupAgentRpcCallbackMixin(object):
     """A mix-in that enable SecurityGroup agent
@@ -100,13 +121,41 @@ class SecurityGroupAgentRpcMixin(object):
         firewall_driver = cfg.CONF.SECURITYGROUP.firewall_driver
         LOG.debug(_("Init firewall settings (driver=%s)"), firewall_driver)
         self.firewall = importutils.import_object(firewall_driver)
+        self.use_ipset = cfg.CONF.SECURITYGROUP.enable_ipset
+
+    def _security_group_info_for_devices(self, device_ids):
+        """Fetch the security group information of devices.
+
+        Returns None if the plugin does not support it, in which case
+        remote group rules are expanded by the plugin from then on.
+        """
+        try:
+            return self.plugin_rpc.security_group_info_for_devices(
+                self.context, device_ids)
+        except rpc_common.RemoteError as e:
+            if e.exc_type != 'UnsupportedRpcVersion':
+                raise
+            LOG.warning(_("The plugin does not support "
+                          "security_group_info_for_devices, falling back "
+                          "to security_group_rules_for_devices"))
+            self.use_ipset = False
+
+    def _get_devices_with_rules(self, device_ids):
+        if self.use_ipset:
+            sg_info = self._security_group_info_for_devices(device_ids)
+            if sg_info is not None:
+                for sg_id, sg_members in sg_info['sg_member_ips'].iteritems():
+                    self.firewall.update_security_group_members(sg_id,
+                                                                sg_members)
+                return sg_info['devices']
+        return self.plugin_rpc.security_group_rules_for_devices(
+            self.context, device_ids)
 
     def prepare_devices_filter(self, device_ids):
         if not device_ids:
             return
         LOG.info(_("Preparing filters for devices %s"), device_ids)
-        devices = self.plugin_rpc.security_group_rules_for_devices(
-            self.context, list(device_ids))
+        devices = self._get_devices_with_rules(list(device_ids))
         with self.firewall.defer_apply():
             for device in devices.values():
                 self.firewall.prepare_port_filter(device)
@@ -121,20 +170,45 @@ class SecurityGroupAgentRpcMixin(object):
     def security_groups_member_updated(self, security_groups):
         LOG.info(_("Security group "
                    "member updated %r"), security_groups)
-        self._security_group_updated(
-            security_groups,
-            'security_group_source_groups')
+        if self.use_ipset:
+            self._security_group_members_updated(security_groups)
+        else:
+            self._security_group_updated(
+                security_groups,
+                'security_group_source_groups')
 
-    def _security_group_updated(self, security_groups, attribute):
+    def _get_devices_in_security_groups(self, security_groups, attribute):
         devices = []
         sec_grp_set = set(security_groups)
         for device in self.firewall.ports.values():
             if sec_grp_set & set(device.get(attribute, [])):
                 devices.append(device)
+        return devices
 
+    def _security_group_updated(self, security_groups, attribute):
+        devices = self._get_devices_in_security_groups(security_groups,
+                                                       attribute)
         if devices:
             self.refresh_firewall(devices)
 
+    def _security_group_members_updated(self, security_groups):
+        # Only the member sets of the remote groups need to be updated,
+        # the rules referencing them are left untouched.
+        devices = self._get_devices_in_security_groups(
+            security_groups, 'security_group_source_groups')
+        if not devices:
+            return
+        sg_info = self._security_group_info_for_devices(
+            [d['device'] for d in devices])
+        if sg_info is None:
+            self.refresh_firewall(devices)
+            return
+        for sg_id in security_groups:
+            sg_members = sg_info['sg_member_ips'].get(sg_id)
+            if sg_members is not None:
+                self.firewall.update_security_group_members(sg_id,
+                                                            sg_members)
+
     def security_groups_provider_updated(self):
         LOG.info(_("Provider rule updated"))
         self.refresh_firewall()
@@ -160,8 +234,7 @@ class SecurityGroupAgentRpcMixin(object):
         if not device_ids:
             LOG.info(_("No ports here to refresh firewall"))
             return
-        devices = self.plugin_rpc.security_group_rules_for_devices(
-            self.context, device_ids)
+        devices = self._get_devices_with_rules(device_ids)
         with self.firewall.defer_apply():
             for device in devices.values():
                 LOG.debug(_("Update port filter for %s"), device['device'])
@@ -29,6 +29,7 @@ from neutron.openstack.common import log as logging
 from neutron.openstack.common.notifier import api as notifier_api
 from neutron import policy
 from neutron import quota
+from neutron import wsgi
 
 
 LOG = logging.getLogger(__name__)
@@ -236,13 +237,15 @@ class Controller(object):
                                         self._plugin_handlers[self.SHOW],
                                         obj,
                                         plugin=self._plugin)]
-        collection = {self._collection:
-                      [self._view(request.context, obj,
-                                  fields_to_strip=fields_to_add)
-                       for obj in obj_list]}
+        # NOTE: items are only viewed while the response is serialized, so
+        # large listings are not rendered in memory all at once.
+        collection = wsgi.StreamedCollection(
+            self._collection, obj_list,
+            lambda obj: self._view(request.context, obj,
+                                   fields_to_strip=fields_to_add))
         pagination_links = pagination_helper.get_links(obj_list)
         if pagination_links:
-            collection[self._collection + "_links"] = pagination_links
+            collection.extra[self._collection + "_links"] = pagination_links
 
         return collection
 
@@ -17,6 +17,8 @@
 Utility methods for working with WSGI servers redux
 """
 
+import itertools
+
 import netaddr
 import webob.dec
 import webob.exc
@@ -34,6 +36,29 @@ class Request(wsgi.Request):
     pass
 
 
+def _prefetch(iterable):
+    """Produce the first item of iterable, returning an equivalent one."""
+    iterator = iter(iterable)
+    for item in iterator:
+        return itertools.chain([item], iterator)
+    return []
+
+
+def _stream(body_iter, action):
+    """Write a response body, logging the errors raised meanwhile.
+
+    The status was already sent: the error is raised again so that the
+    server closes the connection without terminating the body, instead of
+    clients getting a truncated body as a complete response.
+    """
+    try:
+        for chunk in body_iter:
+            yield chunk
+    except Exception:
+        LOG.exception(_('%s failed while streaming the response'), action)
+        raise
+
+
 def Resource(controller, faults=None, deserializers=None, serializers=None):
     """Represents an API entity resource and the associated serialization and
     deserialization logic
@@ -80,6 +105,12 @@ def Resource(controller, faults=None, deserializers=None, serializers=None):
             method = getattr(controller, action)
 
             result = method(request=request, **args)
+            if isinstance(result, wsgi.StreamedCollection):
+                # NOTE: the collection is rendered while the body is
+                # written, once the status is sent. Its first chunk is
+                # rendered here, so that errors such as failing policy
+                # checks still get an error status.
+                body_iter = _prefetch(serializer.serialize_iter(result))
         except (exceptions.NeutronException,
                 netaddr.AddrFormatError) as e:
             LOG.exception(_('%s failed'), action)
@@ -116,6 +147,10 @@ def Resource(controller, faults=None, deserializers=None, serializers=None):
             raise webob.exc.HTTPInternalServerError(**kwargs)
 
         status = action_status.get(action, 200)
+        if isinstance(result, wsgi.StreamedCollection):
+            return webob.Response(request=request, status=status,
+                                  content_type=content_type,
+                                  app_iter=_stream(body_iter, action))
         body = serializer.serialize(result)
         # NOTE(jkoelker) Comply with RFC2616 section 9.7
         if status == 204:
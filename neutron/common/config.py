@@ -71,6 +71,10 @@ core_opts = [
                help=_("Maximum number of host routes per subnet")),
     cfg.IntOpt('max_fixed_ips_per_port', default=5,
                help=_("Maximum number of fixed ips per port")),
+    cfg.StrOpt('ipam_driver',
+               default='neutron.db.ipam.AvailabilityRangeIpamDriver',
+               help=_("The driver used by the database plugins to choose "
+                      "the IP addresses of ports")),
     cfg.IntOpt('dhcp_lease_duration', default=120,
                deprecated_name='dhcp_lease_time',
                help=_("DHCP lease duration")),
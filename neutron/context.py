@@ -102,6 +102,11 @@ class ContextBase(common_context.RequestContext):
     read_deleted = property(_get_read_deleted, _set_read_deleted,
                             _del_read_deleted)
 
+    def __setattr__(self, name, value):
+        # Drop the policy values of the context whenever it is modified
+        self.__dict__.pop('_policy_values', None)
+        super(ContextBase, self).__setattr__(name, value)
+
     def to_dict(self):
         return {'user_id': self.user_id,
                 'tenant_id': self.tenant_id,
@@ -111,6 +116,17 @@ class ContextBase(common_context.RequestContext):
                 'roles': self.roles,
                 'timestamp': str(self.timestamp)}
 
+    def to_policy_values(self):
+        """Return the credentials checked by the policy engine.
+
+        They are built once for the many checks of a request, and must
+        not be modified.
+        """
+        values = self.__dict__.get('_policy_values')
+        if values is None:
+            values = self.__dict__['_policy_values'] = self.to_dict()
+        return values
+
     @classmethod
     def from_dict(cls, values):
         return cls(**values)
@@ -109,10 +109,16 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
         query = self._get_collection_query(context, Agent, filters=filters)
         return query.all()
 
-    def get_agents(self, context, filters=None, fields=None):
+    def get_agents(self, context, filters=None, fields=None,
+                   sorts=None, limit=None, marker=None, page_reverse=False):
+        marker_obj = self._get_marker_obj(context, 'agent', limit, marker)
         return self._get_collection(context, Agent,
                                     self._make_agent_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts,
+                                    limit=limit,
+                                    marker_obj=marker_obj,
+                                    page_reverse=page_reverse)
 
     def _get_agent_by_type_and_host(self, context, agent_type, host):
         query = self._model_query(context, Agent)
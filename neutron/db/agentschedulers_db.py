@@ -187,6 +187,16 @@ class L3AgentSchedulerDbMixin(l3agentscheduler.L3AgentSchedulerPluginBase,
         else:
             return {'routers': []}
 
+    def list_router_ids_on_host(self, context, host):
+        agent = self._get_agent_by_type_and_host(
+            context, constants.AGENT_TYPE_L3, host)
+        if not agent.admin_state_up:
+            return []
+        query = context.session.query(RouterL3AgentBinding.router_id)
+        query = query.filter(
+            RouterL3AgentBinding.l3_agent_id == agent.id)
+        return [item[0] for item in query]
+
     def list_active_sync_routers_on_active_l3_agent(
             self, context, host, router_ids):
         agent = self._get_agent_by_type_and_host(
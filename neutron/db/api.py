@@ -48,6 +48,16 @@ def clear_db(base=BASE):
     _DB_ENGINE = None
 
 
+def dispose():
+    """Close the pooled connections of the database engine.
+
+    The engine opens new connections when they are needed, this is used
+    before forking processes which must not share the connections.
+    """
+    if _DB_ENGINE:
+        _DB_ENGINE.pool.dispose()
+
+
 def get_session(autocommit=True, expire_on_commit=False):
     """Helper method to grab session."""
     return session.get_session(autocommit=autocommit,
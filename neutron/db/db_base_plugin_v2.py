@@ -16,6 +16,7 @@
 #    under the License.
 
 import datetime
+import functools
 import random
 
 import netaddr
@@ -27,9 +28,11 @@ from neutron.api.v2 import attributes
 from neutron.common import constants
 from neutron.common import exceptions as q_exc
 from neutron.db import api as db
+from neutron.db import ipam
 from neutron.db import models_v2
 from neutron.db import sqlalchemyutils
 from neutron import neutron_plugin_base_v2
+from neutron.openstack.common.db import exception as db_exc
 from neutron.openstack.common import excutils
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import timeutils
@@ -49,6 +52,41 @@ AGENT_OWNER_PREFIX = 'network:'
 # IP allocations being cleaned up by cascade.
 AUTO_DELETE_PORT_OWNERS = ['network:dhcp']
 
+# Number of times a port creation is retried when its addresses have been
+# allocated by a concurrent request
+IP_ALLOCATION_RETRIES = 3
+
+# Maximum number of MAC addresses checked by a query of a bulk port creation
+MAC_ADDRESSES_PER_QUERY = 500
+
+
+def retry_ip_allocation_conflicts(f):
+    """Retry a port creation whose addresses were allocated concurrently.
+
+    Unless the IPAM driver locks the free addresses, concurrent requests may
+    pick the same address for their ports, and the primary key of the
+    allocations then fails all but one of them. The creation is retried,
+    with new addresses, unless it runs within a transaction of the caller
+    which could only be replayed as a whole: plugins creating ports within
+    their own transaction must decorate their create_port too.
+
+    The wrapper keeps the (self, context, port) signature of the decorated
+    methods, which some plugins inspect to build their calls.
+    """
+    @functools.wraps(f)
+    def wrapper(self, context, port):
+        retries = 0 if context.session.is_active else IP_ALLOCATION_RETRIES
+        while True:
+            try:
+                return f(self, context, port)
+            except db_exc.DBDuplicateEntry as e:
+                if not retries:
+                    raise
+                retries -= 1
+                LOG.debug(_("Retrying port creation after an allocation "
+                            "conflict: %s"), e)
+    return wrapper
+
 
 class CommonDbMixin(object):
     """Common methods used in core and service plugins."""
@@ -58,6 +96,16 @@ class CommonDbMixin(object):
     # To this aim, the register_model_query_hook and unregister_query_hook
     # from this class should be invoked
     _model_query_hooks = {}
+    # Loader options, such as the eager loading of the relationships read
+    # when building the dict of each object, applied to the queries
+    # retrieving collections of objects from a model class. They are
+    # registered with register_model_query_options.
+    _model_query_options = {}
+    # Relationships of a model which are only read when building some
+    # attributes of its dict. Collection queries do not eagerly load them
+    # unless one of these attributes is requested. They are registered with
+    # register_model_query_relationship.
+    _model_query_relationships = {}
 
     @classmethod
     def register_model_query_hook(cls, model, name, query_hook, filter_hook,
@@ -84,6 +132,31 @@ class CommonDbMixin(object):
         model_hooks[name] = {'query': query_hook, 'filter': filter_hook,
                              'result_filters': result_filters}
 
+    @classmethod
+    def register_model_query_options(cls, model, name, options):
+        """Register loader options for the collection queries of a model.
+
+        Mixins implementing extensions whose dict extend functions read
+        relationships of the objects should register the eager loading of
+        these relationships (e.g. orm.joinedload or orm.subqueryload), so
+        that listing a collection does not issue a query per object.
+        """
+        model_options = cls._model_query_options.setdefault(model, {})
+        model_options[name] = options
+
+    @classmethod
+    def register_model_query_relationship(cls, model, relationship, attrs):
+        """Register the attributes built from a relationship of a model.
+
+        When fields are requested and none of attrs is among them, the
+        collection queries of the model lazy load the relationship instead
+        of joining it, so that narrow queries (e.g. listing only the ids and
+        device ids of ports) do not read rows which are discarded anyway.
+        """
+        model_relationships = cls._model_query_relationships.setdefault(
+            model, {})
+        model_relationships[relationship] = frozenset(attrs)
+
     def _model_query(self, context, model):
         query = context.session.query(model)
         # define basic filter condition for model query
@@ -112,6 +185,10 @@ class CommonDbMixin(object):
             query = query.filter(query_filter)
         return query
 
+    def _fields_requested(self, fields, attrs):
+        """Return whether any of attrs is to be included in a dict."""
+        return not fields or any(attr in fields for attr in attrs)
+
     def _fields(self, resource, fields):
         if fields:
             return dict(((key, item) for key, item in resource.items()
@@ -146,11 +223,24 @@ class CommonDbMixin(object):
                     query = result_filter(self, query, filters)
         return query
 
+    def _apply_options_to_query(self, query, model, fields=None):
+        for _name, options in self._model_query_options.get(model,
+                                                            {}).iteritems():
+            query = query.options(*options)
+        # NOTE: these options come last in order to override any eager
+        # loading of the relationships which are not needed
+        for relationship, attrs in self._model_query_relationships.get(
+                model, {}).iteritems():
+            if not self._fields_requested(fields, attrs):
+                query = query.options(orm.lazyload(relationship))
+        return query
+
     def _get_collection_query(self, context, model, filters=None,
                               sorts=None, limit=None, marker_obj=None,
-                              page_reverse=False):
+                              page_reverse=False, fields=None):
         collection = self._model_query(context, model)
         collection = self._apply_filters_to_query(collection, model, filters)
+        collection = self._apply_options_to_query(collection, model, fields)
         if limit and page_reverse and sorts:
             sorts = [(s[0], not s[1]) for s in sorts]
         collection = sqlalchemyutils.paginate_query(collection, model, limit,
@@ -165,7 +255,8 @@ class CommonDbMixin(object):
                                            sorts=sorts,
                                            limit=limit,
                                            marker_obj=marker_obj,
-                                           page_reverse=page_reverse)
+                                           page_reverse=page_reverse,
+                                           fields=fields)
         items = [dict_func(c, fields) for c in query]
         if limit and page_reverse:
             items.reverse()
@@ -196,6 +287,27 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
     # api resources. Mixins can use this dict for adding their own methods
     # TODO(salvatore-orlando): Avoid using class-level variables
     _dict_extend_functions = {}
+    # The attributes added by the dict extend functions which declared
+    # them; these functions are skipped when none of them is requested
+    _dict_extend_attributes = {}
+
+    # The subnets of the networks, and the dns nameservers and host routes
+    # of the subnets are read by _make_network_dict and _make_subnet_dict
+    CommonDbMixin.register_model_query_options(
+        models_v2.Network, 'subnets', [orm.subqueryload('subnets')])
+    CommonDbMixin.register_model_query_options(
+        models_v2.Subnet, 'subnet_attributes',
+        [orm.subqueryload('dns_nameservers'), orm.subqueryload('routes')])
+    CommonDbMixin.register_model_query_relationship(
+        models_v2.Network, 'subnets', ['subnets'])
+    CommonDbMixin.register_model_query_relationship(
+        models_v2.Subnet, 'allocation_pools', ['allocation_pools'])
+    CommonDbMixin.register_model_query_relationship(
+        models_v2.Subnet, 'dns_nameservers', ['dns_nameservers'])
+    CommonDbMixin.register_model_query_relationship(
+        models_v2.Subnet, 'routes', ['host_routes'])
+    CommonDbMixin.register_model_query_relationship(
+        models_v2.Port, 'fixed_ips', ['fixed_ips'])
 
     def __init__(self):
         # NOTE(jkoelker) This is an incomlete implementation. Subclasses
@@ -205,10 +317,21 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         db.configure_db()
 
     @classmethod
-    def register_dict_extend_funcs(cls, resource, funcs):
+    def register_dict_extend_funcs(cls, resource, funcs, attrs=None):
         cur_funcs = cls._dict_extend_functions.get(resource, [])
         cur_funcs.extend(funcs)
         cls._dict_extend_functions[resource] = cur_funcs
+        if attrs:
+            for func in funcs:
+                cls._dict_extend_attributes[func] = frozenset(attrs)
+
+    def _apply_dict_extend_functions(self, resource_type, response,
+                                     db_object, fields=None):
+        for func in self._dict_extend_functions.get(resource_type, []):
+            attrs = self._dict_extend_attributes.get(func)
+            if attrs and not self._fields_requested(fields, attrs):
+                continue
+            func(self, response, db_object)
 
     def _filter_non_model_columns(self, data, model):
         """Remove all the attributes from data which are not columns of
@@ -259,18 +382,23 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         return context.session.query(models_v2.Subnet).all()
 
     @staticmethod
-    def _generate_mac(context, network_id):
+    def _get_random_mac():
         base_mac = cfg.CONF.base_mac.split(':')
+        mac = [int(base_mac[0], 16), int(base_mac[1], 16),
+               int(base_mac[2], 16), random.randint(0x00, 0xff),
+               random.randint(0x00, 0xff), random.randint(0x00, 0xff)]
+        if base_mac[3] != '00':
+            mac[3] = int(base_mac[3], 16)
+        return ':'.join(map(lambda x: "%02x" % x, mac))
+
+    @staticmethod
+    def _generate_mac(context, network_id, excluded=()):
         max_retries = cfg.CONF.mac_generation_retries
         for i in range(max_retries):
-            mac = [int(base_mac[0], 16), int(base_mac[1], 16),
-                   int(base_mac[2], 16), random.randint(0x00, 0xff),
-                   random.randint(0x00, 0xff), random.randint(0x00, 0xff)]
-            if base_mac[3] != '00':
-                mac[3] = int(base_mac[3], 16)
-            mac_address = ':'.join(map(lambda x: "%02x" % x, mac))
-            if NeutronDbPluginV2._check_unique_mac(context, network_id,
-                                                   mac_address):
+            mac_address = NeutronDbPluginV2._get_random_mac()
+            if (mac_address not in excluded and
+                NeutronDbPluginV2._check_unique_mac(context, network_id,
+                                                    mac_address)):
                 LOG.debug(_("Generated mac for network %(network_id)s "
                             "is %(mac_address)s"),
                           {'network_id': network_id,
@@ -348,81 +476,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         """Return an IP address to the pool of free IP's on the network
         subnet.
         """
-        # Grab all allocation pools for the subnet
-        pool_qry = context.session.query(
-            models_v2.IPAllocationPool).with_lockmode('update')
-        allocation_pools = pool_qry.filter_by(subnet_id=subnet_id)
-        # Find the allocation pool for the IP to recycle
-        pool_id = None
-        for allocation_pool in allocation_pools:
-            allocation_pool_range = netaddr.IPRange(
-                allocation_pool['first_ip'],
-                allocation_pool['last_ip'])
-            if netaddr.IPAddress(ip_address) in allocation_pool_range:
-                pool_id = allocation_pool['id']
-                break
-        if not pool_id:
-            error_message = _("No allocation pool found for "
-                              "ip address:%s") % ip_address
-            raise q_exc.InvalidInput(error_message=error_message)
-        # Two requests will be done on the database. The first will be to
-        # search if an entry starts with ip_address + 1 (r1). The second
-        # will be to see if an entry ends with ip_address -1 (r2).
-        # If 1 of the above holds true then the specific entry will be
-        # modified. If both hold true then the two ranges will be merged.
-        # If there are no entries then a single entry will be added.
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange).with_lockmode('update')
-        ip_first = str(netaddr.IPAddress(ip_address) + 1)
-        ip_last = str(netaddr.IPAddress(ip_address) - 1)
-        LOG.debug(_("Recycle %s"), ip_address)
-        try:
-            r1 = range_qry.filter_by(allocation_pool_id=pool_id,
-                                     first_ip=ip_first).one()
-            LOG.debug(_("Recycle: first match for %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
-        except exc.NoResultFound:
-            r1 = []
-        try:
-            r2 = range_qry.filter_by(allocation_pool_id=pool_id,
-                                     last_ip=ip_last).one()
-            LOG.debug(_("Recycle: last match for %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
-        except exc.NoResultFound:
-            r2 = []
-
-        if r1 and r2:
-            # Merge the two ranges
-            ip_range = models_v2.IPAvailabilityRange(
-                allocation_pool_id=pool_id,
-                first_ip=r2['first_ip'],
-                last_ip=r1['last_ip'])
-            context.session.add(ip_range)
-            LOG.debug(_("Recycle: merged %(first_ip1)s-%(last_ip1)s and "
-                        "%(first_ip2)s-%(last_ip2)s"),
-                      {'first_ip1': r2['first_ip'], 'last_ip1': r2['last_ip'],
-                       'first_ip2': r1['first_ip'], 'last_ip2': r1['last_ip']})
-            context.session.delete(r1)
-            context.session.delete(r2)
-        elif r1:
-            # Update the range with matched first IP
-            r1['first_ip'] = ip_address
-            LOG.debug(_("Recycle: updated first %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
-        elif r2:
-            # Update the range with matched last IP
-            r2['last_ip'] = ip_address
-            LOG.debug(_("Recycle: updated last %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
-        else:
-            # Create a new range
-            ip_range = models_v2.IPAvailabilityRange(
-                allocation_pool_id=pool_id,
-                first_ip=ip_address,
-                last_ip=ip_address)
-            context.session.add(ip_range)
-            LOG.debug(_("Recycle: created new %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': ip_address, 'last_ip': ip_address})
+        ipam.get_driver().release_ip(context, subnet_id, ip_address)
         NeutronDbPluginV2._delete_ip_allocation(context, network_id, subnet_id,
                                                 ip_address)
 
@@ -472,65 +526,12 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         The IP address will be generated from one of the subnets defined on
         the network.
         """
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange).join(
-                models_v2.IPAllocationPool).with_lockmode('update')
-        for subnet in subnets:
-            range = range_qry.filter_by(subnet_id=subnet['id']).first()
-            if not range:
-                LOG.debug(_("All IP's from subnet %(subnet_id)s (%(cidr)s) "
-                            "allocated"),
-                          {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
-                continue
-            ip_address = range['first_ip']
-            LOG.debug(_("Allocated IP - %(ip_address)s from %(first_ip)s "
-                        "to %(last_ip)s"),
-                      {'ip_address': ip_address,
-                       'first_ip': range['first_ip'],
-                       'last_ip': range['last_ip']})
-            if range['first_ip'] == range['last_ip']:
-                # No more free indices on subnet => delete
-                LOG.debug(_("No more free IP's in slice. Deleting allocation "
-                            "pool."))
-                context.session.delete(range)
-            else:
-                # increment the first free
-                range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
-            return {'ip_address': ip_address, 'subnet_id': subnet['id']}
-        raise q_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+        return ipam.get_driver().generate_ip(context, subnets)
 
     @staticmethod
     def _allocate_specific_ip(context, subnet_id, ip_address):
         """Allocate a specific IP address on the subnet."""
-        ip = int(netaddr.IPAddress(ip_address))
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange).join(
-                models_v2.IPAllocationPool).with_lockmode('update')
-        results = range_qry.filter_by(subnet_id=subnet_id)
-        for range in results:
-            first = int(netaddr.IPAddress(range['first_ip']))
-            last = int(netaddr.IPAddress(range['last_ip']))
-            if first <= ip <= last:
-                if first == last:
-                    context.session.delete(range)
-                    return
-                elif first == ip:
-                    range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
-                    return
-                elif last == ip:
-                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
-                    return
-                else:
-                    # Split into two ranges
-                    new_first = str(netaddr.IPAddress(ip_address) + 1)
-                    new_last = range['last_ip']
-                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
-                    ip_range = models_v2.IPAvailabilityRange(
-                        allocation_pool_id=range['allocation_pool_id'],
-                        first_ip=new_first,
-                        last_ip=new_last)
-                    context.session.add(ip_range)
-                    return
+        ipam.get_driver().allocate_specific_ip(context, subnet_id, ip_address)
 
     @staticmethod
     def _check_unique_ip(context, network_id, subnet_id, ip_address):
@@ -704,12 +705,14 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             ips = self._allocate_fixed_ips(context, network, to_add)
         return ips, prev_ips
 
-    def _allocate_ips_for_port(self, context, network, port):
+    def _allocate_ips_for_port(self, context, network, port, subnets=None):
         """Allocate IP addresses for the port.
 
         If port['fixed_ips'] is set to 'ATTR_NOT_SPECIFIED', allocate IP
         addresses for the port. If port['fixed_ips'] contains an IP address or
         a subnet_id then allocate an IP address accordingly.
+
+        The subnets of the network are looked up unless they are given.
         """
         p = port['port']
         ips = []
@@ -721,8 +724,9 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                                            p['fixed_ips'])
             ips = self._allocate_fixed_ips(context, network, configured_ips)
         else:
-            filter = {'network_id': [p['network_id']]}
-            subnets = self.get_subnets(context, filters=filter)
+            if subnets is None:
+                filter = {'network_id': [p['network_id']]}
+                subnets = self.get_subnets(context, filters=filter)
             # Split into v4 and v6 subnets
             v4 = []
             v6 = []
@@ -901,14 +905,13 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                'tenant_id': network['tenant_id'],
                'admin_state_up': network['admin_state_up'],
                'status': network['status'],
-               'shared': network['shared'],
-               'subnets': [subnet['id']
-                           for subnet in network['subnets']]}
+               'shared': network['shared']}
+        if self._fields_requested(fields, ['subnets']):
+            res['subnets'] = [subnet['id'] for subnet in network['subnets']]
         # Call auxiliary extend functions, if any
         if process_extensions:
-            for func in self._dict_extend_functions.get(attributes.NETWORKS,
-                                                        []):
-                func(self, res, network)
+            self._apply_dict_extend_functions(attributes.NETWORKS, res,
+                                              network, fields)
         return self._fields(res, fields)
 
     def _make_subnet_dict(self, subnet, fields=None):
@@ -918,18 +921,21 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                'network_id': subnet['network_id'],
                'ip_version': subnet['ip_version'],
                'cidr': subnet['cidr'],
-               'allocation_pools': [{'start': pool['first_ip'],
-                                     'end': pool['last_ip']}
-                                    for pool in subnet['allocation_pools']],
                'gateway_ip': subnet['gateway_ip'],
                'enable_dhcp': subnet['enable_dhcp'],
-               'dns_nameservers': [dns['address']
-                                   for dns in subnet['dns_nameservers']],
-               'host_routes': [{'destination': route['destination'],
-                                'nexthop': route['nexthop']}
-                               for route in subnet['routes']],
                'shared': subnet['shared']
                }
+        if self._fields_requested(fields, ['allocation_pools']):
+            res['allocation_pools'] = [{'start': pool['first_ip'],
+                                        'end': pool['last_ip']}
+                                       for pool in subnet['allocation_pools']]
+        if self._fields_requested(fields, ['dns_nameservers']):
+            res['dns_nameservers'] = [dns['address']
+                                      for dns in subnet['dns_nameservers']]
+        if self._fields_requested(fields, ['host_routes']):
+            res['host_routes'] = [{'destination': route['destination'],
+                                   'nexthop': route['nexthop']}
+                                  for route in subnet['routes']]
         return self._fields(res, fields)
 
     def _make_port_dict(self, port, fields=None,
@@ -941,16 +947,16 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                "mac_address": port["mac_address"],
                "admin_state_up": port["admin_state_up"],
                "status": port["status"],
-               "fixed_ips": [{'subnet_id': ip["subnet_id"],
-                              'ip_address': ip["ip_address"]}
-                             for ip in port["fixed_ips"]],
                "device_id": port["device_id"],
                "device_owner": port["device_owner"]}
+        if self._fields_requested(fields, ['fixed_ips']):
+            res["fixed_ips"] = [{'subnet_id': ip["subnet_id"],
+                                 'ip_address': ip["ip_address"]}
+                                for ip in port["fixed_ips"]]
         # Call auxiliary extend functions, if any
         if process_extensions:
-            for func in self._dict_extend_functions.get(attributes.PORTS,
-                                                        []):
-                func(self, res, port)
+            self._apply_dict_extend_functions(attributes.PORTS, res,
+                                              port, fields)
         return self._fields(res, fields)
 
     def _create_bulk(self, resource, context, request_items):
@@ -1179,11 +1185,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                                      first_ip=pool['start'],
                                                      last_ip=pool['end'])
                 context.session.add(ip_pool)
-                ip_range = models_v2.IPAvailabilityRange(
-                    ipallocationpool=ip_pool,
-                    first_ip=pool['start'],
-                    last_ip=pool['end'])
-                context.session.add(ip_range)
+                ipam.get_driver().create_pool(context, ip_pool)
 
         return self._make_subnet_dict(subnet)
 
@@ -1310,10 +1312,19 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         return self._get_collection_count(context, models_v2.Subnet,
                                           filters=filters)
 
+    @retry_ip_allocation_conflicts
     def create_port_bulk(self, context, ports):
-        return self._create_bulk('port', context, ports)
+        if (self.create_port.im_func is not
+                NeutronDbPluginV2.create_port.im_func):
+            # The plugin extends the creation of each port
+            return self._create_bulk('port', context, ports)
+        return self._create_port_bulk_db(context, ports)
 
+    @retry_ip_allocation_conflicts
     def create_port(self, context, port):
+        return self._create_port_db(context, port)
+
+    def _create_port_db(self, context, port):
         p = port['port']
         port_id = p.get('id') or uuidutils.generate_uuid()
         network_id = p['network_id']
@@ -1380,6 +1391,124 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
 
         return self._make_port_dict(port, process_extensions=False)
 
+    def _create_port_bulk_db(self, context, ports):
+        """Create the ports of a bulk request.
+
+        The networks and subnets of the ports are loaded once, their MAC
+        addresses are checked with a single query per network, and the
+        rows of the ports and of their IP allocations are inserted with
+        one statement each.
+        """
+        items = [port['port'] for port in ports['ports']]
+        # NOTE(jkoelker) Get the tenant_id outside of the session to avoid
+        #                unneeded db action if the operation raises
+        tenant_ids = [self._get_tenant_id_for_create(context, p)
+                      for p in items]
+
+        with context.session.begin(subtransactions=True):
+            networks = {}
+            subnets = {}
+            for p in items:
+                network_id = p['network_id']
+                if network_id not in networks:
+                    self._recycle_expired_ip_allocations(context, network_id)
+                    networks[network_id] = self._get_network(context,
+                                                             network_id)
+                    filter = {'network_id': [network_id]}
+                    subnets[network_id] = self.get_subnets(context,
+                                                           filters=filter)
+            mac_addresses = self._get_mac_addresses_for_ports(context, items)
+
+            port_rows = []
+            allocation_rows = []
+            allocated = set()
+            for p, tenant_id, mac_address in zip(items, tenant_ids,
+                                                 mac_addresses):
+                network_id = p['network_id']
+                port_id = p.get('id') or uuidutils.generate_uuid()
+                ips = self._allocate_ips_for_port(
+                    context, networks[network_id], {'port': p},
+                    subnets=subnets[network_id])
+                for ip in ips:
+                    # The allocations of the previous ports are not
+                    # inserted yet, so they are not checked by the IPAM
+                    if (ip['subnet_id'], ip['ip_address']) in allocated:
+                        raise q_exc.IpAddressInUse(
+                            net_id=network_id, ip_address=ip['ip_address'])
+                    allocated.add((ip['subnet_id'], ip['ip_address']))
+                    allocation_rows.append({
+                        'network_id': network_id,
+                        'port_id': port_id,
+                        'ip_address': ip['ip_address'],
+                        'subnet_id': ip['subnet_id'],
+                        'expiration': self._default_allocation_expiration()})
+                port_rows.append({
+                    'tenant_id': tenant_id,
+                    'name': p['name'],
+                    'id': port_id,
+                    'network_id': network_id,
+                    'mac_address': mac_address,
+                    'admin_state_up': p['admin_state_up'],
+                    'status': p.get('status', constants.PORT_STATUS_ACTIVE),
+                    'device_id': p['device_id'],
+                    'device_owner': p['device_owner'],
+                    'fixed_ips': ips})
+
+            LOG.debug(_("Creating %(ports)d ports with %(ips)d IP "
+                        "allocations"),
+                      {'ports': len(port_rows), 'ips': len(allocation_rows)})
+            port_table = models_v2.Port.__table__
+            context.session.execute(
+                port_table.insert(),
+                [dict((column.name, row[column.name])
+                      for column in port_table.columns)
+                 for row in port_rows])
+            if allocation_rows:
+                context.session.execute(
+                    models_v2.IPAllocation.__table__.insert(),
+                    allocation_rows)
+
+        return [self._make_port_dict(row, process_extensions=False)
+                for row in port_rows]
+
+    def _get_mac_addresses_for_ports(self, context, ports):
+        """Return the MAC addresses of ports to be created.
+
+        The requested and generated addresses of the ports of a network are
+        checked with a single query, and the few generated addresses which
+        are already used are then replaced one by one.
+        """
+        mac_addresses = []
+        indexes_by_network = {}
+        for index, p in enumerate(ports):
+            mac_address = p['mac_address']
+            if mac_address is attributes.ATTR_NOT_SPECIFIED:
+                mac_address = NeutronDbPluginV2._get_random_mac()
+            mac_addresses.append(mac_address)
+            indexes_by_network.setdefault(p['network_id'], []).append(index)
+
+        for network_id, indexes in indexes_by_network.iteritems():
+            mac_qry = context.session.query(models_v2.Port.mac_address)
+            mac_qry = mac_qry.filter_by(network_id=network_id)
+            used = set()
+            for i in range(0, len(indexes), MAC_ADDRESSES_PER_QUERY):
+                macs = [mac_addresses[index] for index in
+                        indexes[i:i + MAC_ADDRESSES_PER_QUERY]]
+                used.update(mac for (mac,) in mac_qry.filter(
+                    models_v2.Port.mac_address.in_(macs)))
+            for index in indexes:
+                mac_address = mac_addresses[index]
+                if mac_address in used:
+                    if (ports[index]['mac_address'] is not
+                            attributes.ATTR_NOT_SPECIFIED):
+                        raise q_exc.MacAddressInUse(net_id=network_id,
+                                                    mac=mac_address)
+                    mac_address = NeutronDbPluginV2._generate_mac(
+                        context, network_id, excluded=used)
+                    mac_addresses[index] = mac_address
+                used.add(mac_address)
+        return mac_addresses
+
     def update_port(self, context, id, port):
         p = port['port']
 
@@ -1454,7 +1583,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         return self._make_port_dict(port, fields)
 
     def _get_ports_query(self, context, filters=None, sorts=None, limit=None,
-                         marker_obj=None, page_reverse=False):
+                         marker_obj=None, page_reverse=False, fields=None):
         Port = models_v2.Port
         IPAllocation = models_v2.IPAllocation
 
@@ -1474,6 +1603,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                 query = query.filter(IPAllocation.subnet_id.in_(subnet_ids))
 
         query = self._apply_filters_to_query(query, Port, filters)
+        query = self._apply_options_to_query(query, Port, fields)
         if limit and page_reverse and sorts:
             sorts = [(s[0], not s[1]) for s in sorts]
         query = sqlalchemyutils.paginate_query(query, Port, limit,
@@ -1487,7 +1617,8 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         query = self._get_ports_query(context, filters=filters,
                                       sorts=sorts, limit=limit,
                                       marker_obj=marker_obj,
-                                      page_reverse=page_reverse)
+                                      page_reverse=page_reverse,
+                                      fields=fields)
         items = [self._make_port_dict(c, fields) for c in query]
         if limit and page_reverse:
             items.reverse()
@@ -55,21 +55,35 @@ class DhcpRpcCallbackMixin(object):
         return [net['id'] for net in nets]
 
     def get_active_networks_info(self, context, **kwargs):
-        """Returns all the networks/subnets/ports in system."""
+        """Returns all the networks/subnets/ports in system.
+
+        When network_ids is given, only the information of these networks
+        is returned, which lets the agents retrieve the networks returned
+        by get_active_networks a page at a time.
+        """
         host = kwargs.get('host')
+        network_ids = kwargs.get('network_ids')
         LOG.debug(_('get_active_networks_info from %s'), host)
-        networks = self._get_active_networks(context, **kwargs)
         plugin = manager.NeutronManager.get_plugin()
-        filters = {'network_id': [network['id'] for network in networks]}
+        if network_ids is None:
+            networks = self._get_active_networks(context, **kwargs)
+        else:
+            filters = dict(id=network_ids, admin_state_up=[True])
+            networks = plugin.get_networks(context, filters=filters)
+        networks_by_id = {}
+        for network in networks:
+            network['subnets'] = []
+            network['ports'] = []
+            networks_by_id[network['id']] = network
+        filters = {'network_id': networks_by_id.keys()}
         ports = plugin.get_ports(context, filters=filters)
         filters['enable_dhcp'] = [True]
         subnets = plugin.get_subnets(context, filters=filters)
 
-        for network in networks:
-            network['subnets'] = [subnet for subnet in subnets
-                                  if subnet['network_id'] == network['id']]
-            network['ports'] = [port for port in ports
-                                if port['network_id'] == network['id']]
+        for subnet in subnets:
+            networks_by_id[subnet['network_id']]['subnets'].append(subnet)
+        for port in ports:
+            networks_by_id[port['network_id']]['ports'].append(port)
 
         return networks
 
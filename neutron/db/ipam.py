@@ -0,0 +1,335 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""IP address management drivers of the db base plugin.
+
+The driver used by NeutronDbPluginV2 is set by the ipam_driver option. The
+allocations themselves are always stored in the ipallocations table by the
+plugin, whose primary key guarantees that an address is only allocated once
+on a subnet; the drivers only choose which free address a port gets.
+"""
+
+import itertools
+import random
+
+import netaddr
+from oslo.config import cfg
+from sqlalchemy.orm import exc
+
+from neutron.common import exceptions as q_exc
+from neutron.db import models_v2
+from neutron.openstack.common import importutils
+from neutron.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+_DRIVERS = {}
+
+
+def get_driver():
+    """Return an instance of the configured IPAM driver."""
+    driver_class = cfg.CONF.ipam_driver
+    if driver_class not in _DRIVERS:
+        _DRIVERS[driver_class] = importutils.import_object(driver_class)
+    return _DRIVERS[driver_class]
+
+
+class IpamDriver(object):
+    """Base class of the IPAM drivers.
+
+    The drivers are called within the transaction of the plugin operation
+    that creates or releases the allocations.
+    """
+
+    def create_pool(self, context, ip_pool):
+        """Called when the allocation pool of a subnet is created."""
+        pass
+
+    def generate_ip(self, context, subnets):
+        """Pick a free IP address from one of the subnets.
+
+        :returns: a dict with the 'ip_address' and 'subnet_id' to allocate.
+        :raises: IpAddressGenerationFailure if all the subnets are full.
+        """
+        raise NotImplementedError()
+
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        """Called when a port is given an address it requested."""
+        pass
+
+    def release_ip(self, context, subnet_id, ip_address):
+        """Called when an address of an allocation pool is freed."""
+        pass
+
+
+class AvailabilityRangeIpamDriver(IpamDriver):
+    """Allocate addresses in order from the ranges of free addresses.
+
+    The ranges of each allocation pool are stored in the
+    ipavailabilityranges table, and are locked by each allocation and
+    release, which serializes the port operations on a subnet.
+    """
+
+    def create_pool(self, context, ip_pool):
+        ip_range = models_v2.IPAvailabilityRange(
+            ipallocationpool=ip_pool,
+            first_ip=ip_pool['first_ip'],
+            last_ip=ip_pool['last_ip'])
+        context.session.add(ip_range)
+
+    def generate_ip(self, context, subnets):
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).join(
+                models_v2.IPAllocationPool).with_lockmode('update')
+        for subnet in subnets:
+            range = range_qry.filter_by(subnet_id=subnet['id']).first()
+            if not range:
+                LOG.debug(_("All IP's from subnet %(subnet_id)s (%(cidr)s) "
+                            "allocated"),
+                          {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
+                continue
+            ip_address = range['first_ip']
+            LOG.debug(_("Allocated IP - %(ip_address)s from %(first_ip)s "
+                        "to %(last_ip)s"),
+                      {'ip_address': ip_address,
+                       'first_ip': range['first_ip'],
+                       'last_ip': range['last_ip']})
+            if range['first_ip'] == range['last_ip']:
+                # No more free indices on subnet => delete
+                LOG.debug(_("No more free IP's in slice. Deleting allocation "
+                            "pool."))
+                context.session.delete(range)
+            else:
+                # increment the first free
+                range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
+            return {'ip_address': ip_address, 'subnet_id': subnet['id']}
+        raise q_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        ip = int(netaddr.IPAddress(ip_address))
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).join(
+                models_v2.IPAllocationPool).with_lockmode('update')
+        results = range_qry.filter_by(subnet_id=subnet_id)
+        for range in results:
+            first = int(netaddr.IPAddress(range['first_ip']))
+            last = int(netaddr.IPAddress(range['last_ip']))
+            if first <= ip <= last:
+                if first == last:
+                    context.session.delete(range)
+                    return
+                elif first == ip:
+                    range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
+                    return
+                elif last == ip:
+                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
+                    return
+                else:
+                    # Split into two ranges
+                    new_first = str(netaddr.IPAddress(ip_address) + 1)
+                    new_last = range['last_ip']
+                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
+                    ip_range = models_v2.IPAvailabilityRange(
+                        allocation_pool_id=range['allocation_pool_id'],
+                        first_ip=new_first,
+                        last_ip=new_last)
+                    context.session.add(ip_range)
+                    return
+
+    def release_ip(self, context, subnet_id, ip_address):
+        # Grab all allocation pools for the subnet
+        pool_qry = context.session.query(
+            models_v2.IPAllocationPool).with_lockmode('update')
+        allocation_pools = pool_qry.filter_by(subnet_id=subnet_id)
+        # Find the allocation pool for the IP to recycle
+        pool_id = None
+        for allocation_pool in allocation_pools:
+            allocation_pool_range = netaddr.IPRange(
+                allocation_pool['first_ip'],
+                allocation_pool['last_ip'])
+            if netaddr.IPAddress(ip_address) in allocation_pool_range:
+                pool_id = allocation_pool['id']
+                break
+        if not pool_id:
+            error_message = _("No allocation pool found for "
+                              "ip address:%s") % ip_address
+            raise q_exc.InvalidInput(error_message=error_message)
+        # Two requests will be done on the database. The first will be to
+        # search if an entry starts with ip_address + 1 (r1). The second
+        # will be to see if an entry ends with ip_address -1 (r2).
+        # If 1 of the above holds true then the specific entry will be
+        # modified. If both hold true then the two ranges will be merged.
+        # If there are no entries then a single entry will be added.
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).with_lockmode('update')
+        ip_first = str(netaddr.IPAddress(ip_address) + 1)
+        ip_last = str(netaddr.IPAddress(ip_address) - 1)
+        LOG.debug(_("Recycle %s"), ip_address)
+        try:
+            r1 = range_qry.filter_by(allocation_pool_id=pool_id,
+                                     first_ip=ip_first).one()
+            LOG.debug(_("Recycle: first match for %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
+        except exc.NoResultFound:
+            r1 = []
+        try:
+            r2 = range_qry.filter_by(allocation_pool_id=pool_id,
+                                     last_ip=ip_last).one()
+            LOG.debug(_("Recycle: last match for %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
+        except exc.NoResultFound:
+            r2 = []
+
+        if r1 and r2:
+            # Merge the two ranges
+            ip_range = models_v2.IPAvailabilityRange(
+                allocation_pool_id=pool_id,
+                first_ip=r2['first_ip'],
+                last_ip=r1['last_ip'])
+            context.session.add(ip_range)
+            LOG.debug(_("Recycle: merged %(first_ip1)s-%(last_ip1)s and "
+                        "%(first_ip2)s-%(last_ip2)s"),
+                      {'first_ip1': r2['first_ip'], 'last_ip1': r2['last_ip'],
+                       'first_ip2': r1['first_ip'], 'last_ip2': r1['last_ip']})
+            context.session.delete(r1)
+            context.session.delete(r2)
+        elif r1:
+            # Update the range with matched first IP
+            r1['first_ip'] = ip_address
+            LOG.debug(_("Recycle: updated first %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
+        elif r2:
+            # Update the range with matched last IP
+            r2['last_ip'] = ip_address
+            LOG.debug(_("Recycle: updated last %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
+        else:
+            # Create a new range
+            ip_range = models_v2.IPAvailabilityRange(
+                allocation_pool_id=pool_id,
+                first_ip=ip_address,
+                last_ip=ip_address)
+            context.session.add(ip_range)
+            LOG.debug(_("Recycle: created new %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': ip_address, 'last_ip': ip_address})
+
+
+class RandomIpamDriver(IpamDriver):
+    """Allocate random free addresses of the allocation pools.
+
+    Nothing is locked: a few random candidates are tried against the
+    existing allocations, and if two requests pick the same address the
+    primary key of the ipallocations table fails one of them, which the
+    plugin retries. Only when a pool is nearly full are its free addresses
+    enumerated.
+
+    The availability ranges are not maintained, so a deployment cannot
+    switch back to the AvailabilityRangeIpamDriver once ports have been
+    given addresses by this driver.
+    """
+
+    # Number of random candidates tried before scanning a subnet's pools
+    random_attempts = 16
+
+    def generate_ip(self, context, subnets):
+        for subnet in subnets:
+            ip_address = self._generate_ip_on_subnet(context, subnet)
+            if ip_address:
+                LOG.debug(_("Allocated IP - %(ip_address)s from subnet "
+                            "%(subnet_id)s"),
+                          {'ip_address': ip_address,
+                           'subnet_id': subnet['id']})
+                return {'ip_address': ip_address, 'subnet_id': subnet['id']}
+            LOG.debug(_("All IP's from subnet %(subnet_id)s (%(cidr)s) "
+                        "allocated"),
+                      {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
+        raise q_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+
+    def _generate_ip_on_subnet(self, context, subnet):
+        pool_qry = context.session.query(models_v2.IPAllocationPool)
+        pools = [netaddr.IPRange(pool['first_ip'], pool['last_ip'])
+                 for pool in pool_qry.filter_by(subnet_id=subnet['id'])]
+        size = sum(pool.size for pool in pools)
+        if not size:
+            return
+        picked = self._get_picked_ips(context, subnet['id'])
+        alloc_qry = context.session.query(
+            models_v2.IPAllocation.ip_address).filter_by(
+                subnet_id=subnet['id'])
+        for i in range(min(self.random_attempts, size)):
+            candidate = str(self._get_pools_address(pools,
+                                                    random.randrange(size)))
+            if (candidate not in picked and
+                    not alloc_qry.filter_by(ip_address=candidate).first()):
+                picked.add(candidate)
+                return candidate
+        # Most of the pools are allocated, look for the free addresses
+        # following a random one.
+        allocated = set(ip_address for (ip_address,) in alloc_qry)
+        allocated |= picked
+        start = random.randrange(size)
+        for address in self._iter_pools_addresses(pools, start):
+            candidate = str(address)
+            if candidate not in allocated:
+                picked.add(candidate)
+                return candidate
+
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        self._get_picked_ips(context, subnet_id).add(ip_address)
+
+    @staticmethod
+    def _get_picked_ips(context, subnet_id):
+        """Return the addresses of a subnet picked during this request.
+
+        The plugin only adds the allocations of a port once all of its
+        addresses have been picked, so they are not found in the database.
+        """
+        if not hasattr(context, '_picked_ips'):
+            context._picked_ips = {}
+        return context._picked_ips.setdefault(subnet_id, set())
+
+    @staticmethod
+    def _iter_pools_addresses(pools, start):
+        """Iterate over the addresses of pools from the one at index start.
+
+        The addresses before it come last. No list of the addresses is
+        built, as the pools may be as large as an IPv6 subnet.
+        """
+        head = []
+        tail = []
+        for pool in pools:
+            if start >= pool.size:
+                head.append(iter(pool))
+            elif start < 0:
+                tail.append(iter(pool))
+            else:
+                last = pool[pool.size - 1]
+                tail.append(netaddr.iter_iprange(pool[start], last))
+                if start:
+                    head.append(netaddr.iter_iprange(pool[0],
+                                                     pool[start - 1]))
+            start -= pool.size
+        return itertools.chain(*(tail + head))
+
+    @staticmethod
+    def _get_pools_address(pools, index):
+        """Return the address at index in the concatenation of pools."""
+        for pool in pools:
+            if index < pool.size:
+                return pool[index]
+            index -= pool.size
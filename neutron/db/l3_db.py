@@ -124,6 +124,12 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
         _network_filter_hook,
         _network_result_filter_hook)
 
+    # The network of the gateway port is read by _make_router_dict
+    db_base_plugin_v2.NeutronDbPluginV2.register_model_query_options(
+        Router, 'gw_port', [orm.joinedload('gw_port')])
+    db_base_plugin_v2.NeutronDbPluginV2.register_model_query_relationship(
+        Router, 'gw_port', [EXTERNAL_GW_INFO])
+
     def _get_router(self, context, id):
         try:
             router = self._get_by_id(context, Router, id)
@@ -140,12 +146,13 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
                'status': router['status'],
                EXTERNAL_GW_INFO: None,
                'gw_port_id': router['gw_port_id']}
-        if router['gw_port_id']:
+        if (router['gw_port_id'] and
+                self._fields_requested(fields, [EXTERNAL_GW_INFO])):
             nw_id = router.gw_port['network_id']
             res[EXTERNAL_GW_INFO] = {'network_id': nw_id}
         if process_extensions:
-            for func in self._dict_extend_functions.get(l3.ROUTERS, []):
-                func(self, res, router)
+            self._apply_dict_extend_functions(l3.ROUTERS, res, router,
+                                              fields)
         return self._fields(res, fields)
 
     def create_router(self, context, router):
@@ -792,7 +799,9 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
 
     # Register dict extend functions for networks
     db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
-        attributes.NETWORKS, [_extend_network_dict_l3])
+        attributes.NETWORKS, [_extend_network_dict_l3], attrs=[l3.EXTERNAL])
+    db_base_plugin_v2.NeutronDbPluginV2.register_model_query_relationship(
+        models_v2.Network, 'external', [l3.EXTERNAL])
 
     def _process_l3_create(self, context, net_data, req_data):
         external = req_data.get(l3.EXTERNAL)
@@ -53,6 +53,27 @@ class L3RpcCallbackMixin(object):
                   jsonutils.dumps(routers, indent=5))
         return routers
 
+    def get_router_ids(self, context, **kwargs):
+        """Get the ids of the routers hosted by a specific agent.
+
+        The agent then syncs the routers a few at a time with sync_routers.
+        @param kwargs: host
+        @return: a list of router ids
+        """
+        host = kwargs.get('host')
+        context = neutron_context.get_admin_context()
+        plugin = manager.NeutronManager.get_plugin()
+        if utils.is_extension_supported(
+            plugin, constants.L3_AGENT_SCHEDULER_EXT_ALIAS):
+            if cfg.CONF.router_auto_schedule:
+                plugin.auto_schedule_routers(context, host, None)
+            router_ids = plugin.list_router_ids_on_host(context, host)
+        else:
+            router_ids = [router['id'] for router in
+                          plugin.get_routers(context, fields=['id'])]
+        LOG.debug(_("Router ids returned to l3 agent: %s"), router_ids)
+        return router_ids
+
     def get_external_network_id(self, context, **kwargs):
         """Get one external network id for l3 agent.
 
@@ -108,4 +108,8 @@ def _extend_port_dict_binding(plugin, port_res, port_db):
 
     # Register dict extend functions for ports
 db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
-    attributes.PORTS, [_extend_port_dict_binding])
+    attributes.PORTS, [_extend_port_dict_binding],
+    attrs=portbindings.EXTENDED_ATTRIBUTES_2_0[attributes.PORTS])
+db_base_plugin_v2.NeutronDbPluginV2.register_model_query_relationship(
+    models_v2.Port, 'portbinding',
+    portbindings.EXTENDED_ATTRIBUTES_2_0[attributes.PORTS])
@@ -15,7 +15,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import time
+
 import netaddr
+from oslo.config import cfg
 
 from neutron.common import constants as q_const
 from neutron.common import utils
@@ -26,6 +29,19 @@ from neutron.openstack.common import log as logging
 
 LOG = logging.getLogger(__name__)
 
+sg_cache_opts = [
+    cfg.IntOpt('security_group_cache_ttl', default=0,
+               help=_("Seconds to cache the rules and member ips of "
+                      "security groups for the agent RPC calls. The cache "
+                      "is also invalidated when rules or members change, "
+                      "but only within the process changing them: it must "
+                      "not be enabled when several neutron-server "
+                      "instances share the database, and it is disabled "
+                      "with api_workers. 0 disables the cache.")),
+]
+
+cfg.CONF.register_opts(sg_cache_opts)
+
 
 IP_MASK = {q_const.IPv4: 32,
            q_const.IPv6: 128}
@@ -35,6 +51,85 @@ DIRECTION_IP_PREFIX = {'ingress': 'source_ip_prefix',
                        'egress': 'dest_ip_prefix'}
 
 
+class SecurityGroupCache(object):
+    """In-process cache of security group rules and member ips.
+
+    Entries expire after security_group_cache_ttl seconds, and are
+    invalidated earlier by SecurityGroupServerRpcMixin whenever the rules
+    or the members of a group change.
+    """
+
+    def __init__(self):
+        # Map each security group id to a tuple of expiry time and value
+        self.rules = {}
+        self.member_ips = {}
+        self.hits = 0
+        self.misses = 0
+        # Bumped by each invalidation, so that values read from the
+        # database before an invalidation are not cached after it.
+        self.generation = 0
+
+    @property
+    def enabled(self):
+        return cfg.CONF.security_group_cache_ttl > 0
+
+    def _get(self, cache, sg_ids):
+        found = {}
+        if self.enabled:
+            now = time.time()
+            for sg_id in sg_ids:
+                entry = cache.get(sg_id)
+                if entry and entry[0] > now:
+                    found[sg_id] = entry[1]
+            self.hits += len(found)
+            self.misses += len(sg_ids) - len(found)
+        return found
+
+    def _set(self, cache, values, generation):
+        if not self.enabled or generation != self.generation:
+            return
+        expiry = time.time() + cfg.CONF.security_group_cache_ttl
+        for sg_id, value in values.iteritems():
+            cache[sg_id] = (expiry, value)
+
+    def _invalidate(self, cache, sg_ids):
+        self.generation += 1
+        for sg_id in sg_ids or []:
+            cache.pop(sg_id, None)
+
+    def get_rules(self, sg_ids):
+        return self._get(self.rules, sg_ids)
+
+    def set_rules(self, rules_by_sg, generation):
+        self._set(self.rules, rules_by_sg, generation)
+
+    def invalidate_rules(self, sg_ids):
+        self._invalidate(self.rules, sg_ids)
+
+    def get_member_ips(self, sg_ids):
+        return self._get(self.member_ips, sg_ids)
+
+    def set_member_ips(self, ips_by_sg, generation):
+        self._set(self.member_ips, ips_by_sg, generation)
+
+    def invalidate_member_ips(self, sg_ids):
+        self._invalidate(self.member_ips, sg_ids)
+
+    def clear(self):
+        self.generation += 1
+        self.rules.clear()
+        self.member_ips.clear()
+
+    def log_stats(self):
+        if self.enabled:
+            LOG.debug(_("Security group cache: %(hits)d hits, "
+                        "%(misses)d misses"),
+                      {'hits': self.hits, 'misses': self.misses})
+
+
+sg_cache = SecurityGroupCache()
+
+
 class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
 
     def create_security_group_rule(self, context, security_group_rule):
@@ -42,6 +137,7 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         rule = self.create_security_group_rule_bulk_native(context,
                                                            bulk_rule)[0]
         sgids = [rule['security_group_id']]
+        sg_cache.invalidate_rules(sgids)
         self.notifier.security_groups_rule_updated(context, sgids)
         return rule
 
@@ -51,6 +147,7 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
                       self).create_security_group_rule_bulk_native(
                           context, security_group_rule)
         sgids = set([r['security_group_id'] for r in rules])
+        sg_cache.invalidate_rules(sgids)
         self.notifier.security_groups_rule_updated(context, list(sgids))
         return rules
 
@@ -58,6 +155,7 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         rule = self.get_security_group_rule(context, sgrid)
         super(SecurityGroupServerRpcMixin,
               self).delete_security_group_rule(context, sgrid)
+        sg_cache.invalidate_rules([rule['security_group_id']])
         self.notifier.security_groups_rule_updated(context,
                                                    [rule['security_group_id']])
 
@@ -79,6 +177,9 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
                 context,
                 updated_port,
                 port['port'][ext_sg.SECURITYGROUPS])
+            sg_cache.invalidate_member_ips(
+                set(original_port.get(ext_sg.SECURITYGROUPS) or []) |
+                set(port['port'][ext_sg.SECURITYGROUPS] or []))
             need_notify = True
         else:
             updated_port[ext_sg.SECURITYGROUPS] = (
@@ -98,6 +199,8 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
             not utils.compare_elements(
                 original_port.get(ext_sg.SECURITYGROUPS),
                 updated_port.get(ext_sg.SECURITYGROUPS))):
+            sg_cache.invalidate_member_ips(
+                original_port.get(ext_sg.SECURITYGROUPS))
             self.notify_security_groups_member_updated(
                 context, updated_port)
             need_notify = True
@@ -114,6 +217,7 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         occurs and the plugin agent fetches the update provider
         rule in the other RPC call (security_group_rules_for_devices).
         """
+        sg_cache.invalidate_member_ips(port.get(ext_sg.SECURITYGROUPS))
         if port['device_owner'] == q_const.DEVICE_OWNER_DHCP:
             self.notifier.security_groups_provider_updated(context)
         else:
@@ -136,7 +240,47 @@ class SecurityGroupServerRpcCallbackMixin(object):
         :returns: port correspond to the devices with security group rules
         """
         devices = kwargs.get('devices')
+        ports = self._get_ports_for_devices(devices)
+        ports = self._security_group_rules_for_ports(context, ports)
+        sg_cache.log_stats()
+        return ports
+
+    def security_group_info_for_devices(self, context, **kwargs):
+        """Return security group rules and remote group members.
+
+        Unlike security_group_rules_for_devices, remote_group_id rules
+        are not converted to one rule per member ip. The member ips of
+        each remote group are returned once instead.
 
+        :params devices: list of devices
+        :returns: dict with 'devices', the ports corresponding to the
+                  devices with security group rules, and 'sg_member_ips',
+                  the member ips of each remote group by ethertype
+        """
+        devices = kwargs.get('devices')
+        ports = self._get_ports_for_devices(devices)
+        self._add_security_group_rules_to_ports(context, ports)
+        remote_group_ids = set(self._select_remote_group_ids(ports))
+        for port in ports.values():
+            for rule in port['security_group_rules']:
+                remote_group_id = rule.get('remote_group_id')
+                if (remote_group_id and remote_group_id not in
+                        port['security_group_source_groups']):
+                    port['security_group_source_groups'].append(
+                        remote_group_id)
+
+        ips = self._get_ips_for_remote_groups(context, remote_group_ids)
+        sg_cache.log_stats()
+        sg_member_ips = {}
+        for remote_group_id, member_ips in ips.iteritems():
+            sg_member_ips[remote_group_id] = {q_const.IPv4: [],
+                                              q_const.IPv6: []}
+            for ip in member_ips:
+                ethertype = 'IPv%s' % netaddr.IPAddress(ip).version
+                sg_member_ips[remote_group_id][ethertype].append(ip)
+        return {'devices': ports, 'sg_member_ips': sg_member_ips}
+
+    def _get_ports_for_devices(self, devices):
         ports = {}
         for device in devices:
             port = self.get_port_from_device(device)
@@ -145,22 +289,57 @@ class SecurityGroupServerRpcCallbackMixin(object):
             if port['device_owner'].startswith('network:'):
                 continue
             ports[port['id']] = port
-        return self._security_group_rules_for_ports(context, ports)
+        return ports
 
-    def _select_rules_for_ports(self, context, ports):
+    def _select_security_group_ids_for_ports(self, context, ports):
+        sg_ids_by_port = dict((port_id, []) for port_id in ports)
         if not ports:
-            return []
+            return sg_ids_by_port
         sg_binding_port = sg_db.SecurityGroupPortBinding.port_id
-        sg_binding_sgid = sg_db.SecurityGroupPortBinding.security_group_id
 
+        query = context.session.query(sg_db.SecurityGroupPortBinding)
+        query = query.filter(sg_binding_port.in_(ports.keys()))
+        for binding in query:
+            sg_ids_by_port[binding['port_id']].append(
+                binding['security_group_id'])
+        return sg_ids_by_port
+
+    def _select_rules_for_security_groups(self, context, sg_ids):
+        rules_by_sg = dict((sg_id, []) for sg_id in sg_ids)
+        if not sg_ids:
+            return rules_by_sg
         sgr_sgid = sg_db.SecurityGroupRule.security_group_id
 
-        query = context.session.query(sg_db.SecurityGroupPortBinding,
-                                      sg_db.SecurityGroupRule)
-        query = query.join(sg_db.SecurityGroupRule,
-                           sgr_sgid == sg_binding_sgid)
-        query = query.filter(sg_binding_port.in_(ports.keys()))
-        return query.all()
+        query = context.session.query(sg_db.SecurityGroupRule)
+        query = query.filter(sgr_sgid.in_(sg_ids))
+        for rule_in_db in query:
+            direction = rule_in_db['direction']
+            rule_dict = {
+                'security_group_id': rule_in_db['security_group_id'],
+                'direction': direction,
+                'ethertype': rule_in_db['ethertype'],
+            }
+            for key in ('protocol', 'port_range_min', 'port_range_max',
+                        'remote_ip_prefix', 'remote_group_id'):
+                if rule_in_db.get(key):
+                    if key == 'remote_ip_prefix':
+                        direction_ip_prefix = DIRECTION_IP_PREFIX[direction]
+                        rule_dict[direction_ip_prefix] = rule_in_db[key]
+                        continue
+                    rule_dict[key] = rule_in_db[key]
+            rules_by_sg[rule_in_db['security_group_id']].append(rule_dict)
+        return rules_by_sg
+
+    def _get_rules_for_security_groups(self, context, sg_ids):
+        generation = sg_cache.generation
+        rules_by_sg = sg_cache.get_rules(sg_ids)
+        missing = [sg_id for sg_id in sg_ids if sg_id not in rules_by_sg]
+        if missing:
+            selected = self._select_rules_for_security_groups(context,
+                                                              missing)
+            sg_cache.set_rules(selected, generation)
+            rules_by_sg.update(selected)
+        return rules_by_sg
 
     def _select_ips_for_remote_group(self, context, remote_group_ids):
         ips_by_group = {}
@@ -182,6 +361,17 @@ class SecurityGroupServerRpcCallbackMixin(object):
             ips_by_group[security_group_id].append(ip_address)
         return ips_by_group
 
+    def _get_ips_for_remote_groups(self, context, remote_group_ids):
+        generation = sg_cache.generation
+        ips_by_group = sg_cache.get_member_ips(remote_group_ids)
+        missing = [sg_id for sg_id in remote_group_ids
+                   if sg_id not in ips_by_group]
+        if missing:
+            selected = self._select_ips_for_remote_group(context, missing)
+            sg_cache.set_member_ips(selected, generation)
+            ips_by_group.update(selected)
+        return ips_by_group
+
     def _select_remote_group_ids(self, ports):
         remote_group_ids = []
         for port in ports.values():
@@ -213,8 +403,8 @@ class SecurityGroupServerRpcCallbackMixin(object):
         return ips
 
     def _convert_remote_group_id_to_ip_prefix(self, context, ports):
-        remote_group_ids = self._select_remote_group_ids(ports)
-        ips = self._select_ips_for_remote_group(context, remote_group_ids)
+        remote_group_ids = set(self._select_remote_group_ids(ports))
+        ips = self._get_ips_for_remote_groups(context, remote_group_ids)
         for port in ports.values():
             updated_rule = []
             for rule in port.get('security_group_rules'):
@@ -279,24 +469,22 @@ class SecurityGroupServerRpcCallbackMixin(object):
             self._add_ingress_dhcp_rule(port, ips)
 
     def _security_group_rules_for_ports(self, context, ports):
-        rules_in_db = self._select_rules_for_ports(context, ports)
-        for (binding, rule_in_db) in rules_in_db:
-            port_id = binding['port_id']
+        self._add_security_group_rules_to_ports(context, ports)
+        return self._convert_remote_group_id_to_ip_prefix(context, ports)
+
+    def _add_security_group_rules_to_ports(self, context, ports):
+        sg_ids_by_port = self._select_security_group_ids_for_ports(context,
+                                                                   ports)
+        sg_ids = set()
+        for port_sg_ids in sg_ids_by_port.values():
+            sg_ids.update(port_sg_ids)
+        rules_by_sg = self._get_rules_for_security_groups(context, sg_ids)
+        for port_id, port_sg_ids in sg_ids_by_port.iteritems():
             port = ports[port_id]
-            direction = rule_in_db['direction']
-            rule_dict = {
-                'security_group_id': rule_in_db['security_group_id'],
-                'direction': direction,
-                'ethertype': rule_in_db['ethertype'],
-            }
-            for key in ('protocol', 'port_range_min', 'port_range_max',
-                        'remote_ip_prefix', 'remote_group_id'):
-                if rule_in_db.get(key):
-                    if key == 'remote_ip_prefix':
-                        direction_ip_prefix = DIRECTION_IP_PREFIX[direction]
-                        rule_dict[direction_ip_prefix] = rule_in_db[key]
-                        continue
-                    rule_dict[key] = rule_in_db[key]
-            port['security_group_rules'].append(rule_dict)
+            # Visit the groups in a stable order so that agents are not
+            # handed the same rules reshuffled from one call to the next.
+            # The rules may be cached, so each port gets its own copy.
+            for sg_id in sorted(port_sg_ids):
+                port['security_group_rules'].extend(
+                    dict(rule) for rule in rules_by_sg[sg_id])
         self._apply_provider_rule(context, ports)
-        return self._convert_remote_group_id_to_ip_prefix(context, ports)
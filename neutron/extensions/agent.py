@@ -15,6 +15,8 @@
 
 from abc import abstractmethod
 
+from oslo.config import cfg
+
 from neutron.api import extensions
 from neutron.api.v2 import attributes as attr
 from neutron.api.v2 import base
@@ -101,10 +103,10 @@ class Agent(object):
         attr.PLURALS.update(dict(my_plurals))
         plugin = manager.NeutronManager.get_plugin()
         params = RESOURCE_ATTRIBUTE_MAP.get(RESOURCE_NAME + 's')
-        controller = base.create_resource(RESOURCE_NAME + 's',
-                                          RESOURCE_NAME,
-                                          plugin, params
-                                          )
+        controller = base.create_resource(
+            RESOURCE_NAME + 's', RESOURCE_NAME, plugin, params,
+            allow_pagination=cfg.CONF.allow_pagination,
+            allow_sorting=cfg.CONF.allow_sorting)
 
         ex = extensions.ResourceExtension(RESOURCE_NAME + 's',
                                           controller)
@@ -155,7 +157,8 @@ class AgentPluginBase(object):
         pass
 
     @abstractmethod
-    def get_agents(self, context, filters=None, fields=None):
+    def get_agents(self, context, filters=None, fields=None,
+                   sorts=None, limit=None, marker=None, page_reverse=False):
         pass
 
     @abstractmethod
@@ -14,6 +14,7 @@
 # limitations under the License.
 
 
+import sqlalchemy as sa
 from sqlalchemy.orm import exc
 
 from neutron.common import exceptions as q_exc
@@ -201,6 +202,36 @@ def get_network_binding(session, network_id):
         return
 
 
+def get_network_bindings(session, network_ids):
+    """Get the bindings of several networks keyed by network id."""
+    if not network_ids:
+        return {}
+    bindings = (session.query(l2network_models_v2.NetworkBinding).
+                filter(l2network_models_v2.NetworkBinding.network_id.in_(
+                    network_ids)))
+    return dict((binding.network_id, binding) for binding in bindings)
+
+
+def get_ports_from_devices(session, devices):
+    """Get the port records whose id starts with one of the devices.
+
+    :returns: a dict mapping each device to its port record.
+    """
+    if not devices:
+        return {}
+    ports = (session.query(models_v2.Port).
+             filter(sa.or_(*[models_v2.Port.id.startswith(device)
+                             for device in devices])).
+             all())
+    result = {}
+    for device in devices:
+        for port in ports:
+            if port.id.startswith(device):
+                result[device] = port
+                break
+    return result
+
+
 def get_port_from_device(device):
     """Get port from database."""
     LOG.debug(_("get_port_from_device() called"))
@@ -58,7 +58,11 @@ class LinuxBridgeRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
 
     # history
     #   1.1 Support Security Group RPC
-    RPC_API_VERSION = '1.1'
+    #   1.2 Support get_devices_details_list
+    #   1.3 Support security_group_info_for_devices
+    #   1.4 Support get_router_ids
+    #   1.5 Support network_ids in get_active_networks_info
+    RPC_API_VERSION = '1.5'
     # Device names start with "tap"
     TAP_PREFIX_LEN = 3
 
@@ -78,6 +82,21 @@ class LinuxBridgeRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
             port['device'] = device
         return port
 
+    @staticmethod
+    def _make_device_details(device, port, binding):
+        (network_type,
+         segmentation_id) = constants.interpret_vlan_id(binding.vlan_id)
+        entry = {'device': device,
+                 'network_type': network_type,
+                 'physical_network': binding.physical_network,
+                 'segmentation_id': segmentation_id,
+                 'network_id': port['network_id'],
+                 'port_id': port['id'],
+                 'admin_state_up': port['admin_state_up']}
+        if cfg.CONF.AGENT.rpc_support_old_agents:
+            entry['vlan_id'] = binding.vlan_id
+        return entry
+
     def get_device_details(self, rpc_context, **kwargs):
         """Agent requests device details."""
         agent_id = kwargs.get('agent_id')
@@ -88,17 +107,7 @@ class LinuxBridgeRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
         if port:
             binding = db.get_network_binding(db_api.get_session(),
                                              port['network_id'])
-            (network_type,
-             segmentation_id) = constants.interpret_vlan_id(binding.vlan_id)
-            entry = {'device': device,
-                     'network_type': network_type,
-                     'physical_network': binding.physical_network,
-                     'segmentation_id': segmentation_id,
-                     'network_id': port['network_id'],
-                     'port_id': port['id'],
-                     'admin_state_up': port['admin_state_up']}
-            if cfg.CONF.AGENT.rpc_support_old_agents:
-                entry['vlan_id'] = binding.vlan_id
+            entry = self._make_device_details(device, port, binding)
             new_status = (q_const.PORT_STATUS_ACTIVE if port['admin_state_up']
                           else q_const.PORT_STATUS_DOWN)
             if port['status'] != new_status:
@@ -108,6 +117,36 @@ class LinuxBridgeRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
             LOG.debug(_("%s can not be found in database"), device)
         return entry
 
+    def get_devices_details_list(self, rpc_context, **kwargs):
+        """Agent requests the details of several devices."""
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices') or []
+        LOG.debug(_("Details of devices %(devices)s requested from "
+                    "%(agent_id)s"),
+                  {'devices': devices, 'agent_id': agent_id})
+        session = db_api.get_session()
+        with session.begin(subtransactions=True):
+            ports = db.get_ports_from_devices(
+                session, [device[self.TAP_PREFIX_LEN:] for device in devices])
+            bindings = db.get_network_bindings(
+                session, set(port['network_id'] for port in ports.values()))
+            entries = []
+            for device in devices:
+                port = ports.get(device[self.TAP_PREFIX_LEN:])
+                if not port:
+                    entries.append({'device': device})
+                    LOG.debug(_("%s can not be found in database"), device)
+                    continue
+                binding = bindings[port['network_id']]
+                entries.append(self._make_device_details(device, port,
+                                                         binding))
+                new_status = (q_const.PORT_STATUS_ACTIVE
+                              if port['admin_state_up']
+                              else q_const.PORT_STATUS_DOWN)
+                if port['status'] != new_status:
+                    port['status'] = new_status
+        return entries
+
     def update_device_down(self, rpc_context, **kwargs):
         """Device no longer exists on agent."""
         # TODO(garyk) - live migration and port status
@@ -449,6 +488,7 @@ class LinuxBridgePluginV2(db_base_plugin_v2.NeutronDbPluginV2,
 
         return [self._fields(net, fields) for net in nets]
 
+    @db_base_plugin_v2.retry_ip_allocation_conflicts
     def create_port(self, context, port):
         session = context.session
         port_data = port['port']
@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import sqlalchemy as sa
 from sqlalchemy.orm import exc
 
 from neutron.db import api as db_api
@@ -58,6 +59,23 @@ def get_network_segments(session, network_id):
                 for record in records]
 
 
+def get_networks_segments(session, network_ids):
+    """Get the segments of several networks with a single query."""
+
+    segments = dict((network_id, []) for network_id in network_ids)
+    if not network_ids:
+        return segments
+    with session.begin(subtransactions=True):
+        records = (session.query(models.NetworkSegment).
+                   filter(models.NetworkSegment.network_id.in_(network_ids)))
+        for record in records:
+            segments[record.network_id].append(
+                {api.NETWORK_TYPE: record.network_type,
+                 api.PHYSICAL_NETWORK: record.physical_network,
+                 api.SEGMENTATION_ID: record.segmentation_id})
+        return segments
+
+
 def get_port(session, port_id):
     """Get port record for update within transcation."""
 
@@ -75,6 +93,36 @@ def get_port(session, port_id):
             return
 
 
+def get_ports(session, port_ids):
+    """Get the port records matching several port id prefixes.
+
+    :returns: a dict mapping each port id prefix to its record, prefixes
+              matching no port or several ports are omitted.
+    """
+
+    if not port_ids:
+        return {}
+    with session.begin(subtransactions=True):
+        records = (session.query(models_v2.Port).
+                   filter(sa.or_(*[models_v2.Port.id.startswith(port_id)
+                                   for port_id in port_ids])).
+                   all())
+    records_by_id = dict((record.id, record) for record in records)
+    ports = {}
+    for port_id in port_ids:
+        if port_id in records_by_id:
+            ports[port_id] = records_by_id[port_id]
+            continue
+        matches = [record for record in records
+                   if record.id.startswith(port_id)]
+        if len(matches) == 1:
+            ports[port_id] = matches[0]
+        elif matches:
+            LOG.error(_("Multiple ports have port_id starting with %s"),
+                      port_id)
+    return ports
+
+
 def get_port_and_sgs(port_id):
     """Get port from database with security group info."""
 
@@ -307,6 +307,7 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
             pass
         self.notifier.network_delete(context, id)
 
+    @db_base_plugin_v2.retry_ip_allocation_conflicts
     def create_port(self, context, port):
         attrs = port['port']
         attrs['status'] = const.PORT_STATUS_DOWN
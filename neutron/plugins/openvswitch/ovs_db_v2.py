@@ -47,6 +47,17 @@ def get_network_binding(session, network_id):
         return
 
 
+def get_network_bindings(session, network_ids):
+    """Get the bindings of several networks keyed by network id."""
+    if not network_ids:
+        return {}
+    session = session or db.get_session()
+    bindings = (session.query(ovs_models_v2.NetworkBinding).
+                filter(ovs_models_v2.NetworkBinding.network_id.in_(
+                    network_ids)))
+    return dict((binding.network_id, binding) for binding in bindings)
+
+
 def add_network_binding(session, network_id, network_type,
                         physical_network, segmentation_id):
     with session.begin(subtransactions=True):
@@ -316,6 +327,16 @@ def get_port(port_id):
     return port
 
 
+def get_ports(session, port_ids):
+    """Get several port records keyed by port id."""
+    if not port_ids:
+        return {}
+    session = session or db.get_session()
+    ports = (session.query(models_v2.Port).
+             filter(models_v2.Port.id.in_(port_ids)))
+    return dict((port.id, port) for port in ports)
+
+
 def get_port_from_device(port_id):
     """Get port from database."""
     LOG.debug(_("get_port_with_securitygroups() called:port_id=%s"), port_id)
@@ -36,6 +36,7 @@ from neutron.common import topics
 from neutron.common import utils
 from neutron.db import agents_db
 from neutron.db import agentschedulers_db
+from neutron.db import api as db_api
 from neutron.db import db_base_plugin_v2
 from neutron.db import dhcp_rpc_base
 from neutron.db import extraroute_db
@@ -66,8 +67,12 @@ class OVSRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
     # history
     #   1.0 Initial version
     #   1.1 Support Security Group RPC
+    #   1.2 Support get_devices_details_list
+    #   1.3 Support security_group_info_for_devices
+    #   1.4 Support get_router_ids
+    #   1.5 Support network_ids in get_active_networks_info
 
-    RPC_API_VERSION = '1.1'
+    RPC_API_VERSION = '1.5'
 
     def __init__(self, notifier, tunnel_type):
         self.notifier = notifier
@@ -114,6 +119,40 @@ class OVSRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
             LOG.debug(_("%s can not be found in database"), device)
         return entry
 
+    def get_devices_details_list(self, rpc_context, **kwargs):
+        """Agent requests the details of several devices."""
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices') or []
+        LOG.debug(_("Details of devices %(devices)s requested from "
+                    "%(agent_id)s"),
+                  {'devices': devices, 'agent_id': agent_id})
+        session = db_api.get_session()
+        with session.begin(subtransactions=True):
+            ports = ovs_db_v2.get_ports(session, devices)
+            bindings = ovs_db_v2.get_network_bindings(
+                session, set(port['network_id'] for port in ports.values()))
+            entries = []
+            for device in devices:
+                port = ports.get(device)
+                if not port:
+                    entries.append({'device': device})
+                    LOG.debug(_("%s can not be found in database"), device)
+                    continue
+                binding = bindings[port['network_id']]
+                entries.append({'device': device,
+                                'network_id': port['network_id'],
+                                'port_id': port['id'],
+                                'admin_state_up': port['admin_state_up'],
+                                'network_type': binding.network_type,
+                                'segmentation_id': binding.segmentation_id,
+                                'physical_network': binding.physical_network})
+                new_status = (q_const.PORT_STATUS_ACTIVE
+                              if port['admin_state_up']
+                              else q_const.PORT_STATUS_DOWN)
+                if port['status'] != new_status:
+                    port['status'] = new_status
+        return entries
+
     def update_device_down(self, rpc_context, **kwargs):
         """Device no longer exists on agent."""
         # TODO(garyk) - live migration and port status
@@ -528,6 +567,29 @@ class OVSNeutronPluginV2(db_base_plugin_v2.NeutronDbPluginV2,
 
         return [self._fields(net, fields) for net in nets]
 
+    @db_base_plugin_v2.retry_ip_allocation_conflicts
+    def create_port_bulk(self, context, ports):
+        port_datas = [port['port'] for port in ports['ports']]
+        session = context.session
+        with session.begin(subtransactions=True):
+            sgids = []
+            for port in ports['ports']:
+                # Set port status as 'DOWN'. This will be updated by agent
+                port['port']['status'] = q_const.PORT_STATUS_DOWN
+                self._ensure_default_security_group_on_port(context, port)
+                sgids.append(self._get_security_groups_on_port(context,
+                                                               port))
+            ports = self._create_port_bulk_db(context, ports)
+            for port_data, port, port_sgids in zip(port_datas, ports, sgids):
+                self._process_portbindings_create_and_update(context,
+                                                             port_data, port)
+                self._process_port_create_security_group(context, port,
+                                                         port_sgids)
+        for port in ports:
+            self.notify_security_groups_member_updated(context, port)
+        return ports
+
+    @db_base_plugin_v2.retry_ip_allocation_conflicts
     def create_port(self, context, port):
         # Set port status as 'DOWN'. This will be updated by agent
         port['port']['status'] = q_const.PORT_STATUS_DOWN
@@ -35,6 +35,12 @@ from neutron.openstack.common import policy
 LOG = logging.getLogger(__name__)
 _POLICY_PATH = None
 _POLICY_CACHE = {}
+# Match rules built for (action, enforced attributes) keys, and whether
+# they are granted to admin contexts by their roles, for the rules in use
+_MATCH_RULE_CACHE = {}
+_ADMIN_GRANT_CACHE = {}
+_CACHED_RULES = None
+_ADMIN_GRANTED_RULE = policy.TrueCheck()
 ADMIN_CTX_POLICY = 'context_is_admin'
 # Maps deprecated 'extension' policies to new-style policies
 DEPRECATED_POLICY_MAP = {
@@ -61,9 +67,17 @@ def reset():
     global _POLICY_CACHE
     _POLICY_PATH = None
     _POLICY_CACHE = {}
+    _clear_caches()
     policy.reset()
 
 
+def _clear_caches():
+    global _CACHED_RULES
+    _MATCH_RULE_CACHE.clear()
+    _ADMIN_GRANT_CACHE.clear()
+    _CACHED_RULES = policy._rules
+
+
 def init():
     global _POLICY_PATH
     global _POLICY_CACHE
@@ -116,6 +130,7 @@ def _set_rules(data):
                             "deprecated policy %s. The policy will "
                             "not be enforced"), pol)
     policy.set_rules(policies)
+    _clear_caches()
 
 
 def _is_attribute_explicitly_set(attribute_name, resource, target):
@@ -126,8 +141,8 @@ def _is_attribute_explicitly_set(attribute_name, resource, target):
             target[attribute_name] != resource[attribute_name]['default'])
 
 
-def _build_subattr_match_rule(attr_name, attr, action, target):
-    """Create the rule to match for sub-attribute policy checks."""
+def _get_subattr_names(attr_name, attr, target):
+    """Return the names of the sub-attributes set in the target."""
     # TODO(salv-orlando): Instead of relying on validator info, introduce
     # typing for API attributes
     # Expect a dict as type descriptor
@@ -143,14 +158,62 @@ def _build_subattr_match_rule(attr_name, attr, action, target):
                     "generate any sub-attr policy rule for %s."),
                   attr_name)
         return
+    return tuple(sub_attr_name for sub_attr_name in data
+                 if sub_attr_name in target[attr_name])
+
+
+def _build_subattr_match_rule(attr_name, attr, action, target):
+    """Create the rule to match for sub-attribute policy checks."""
+    sub_attr_names = _get_subattr_names(attr_name, attr, target)
+    if sub_attr_names is None:
+        return
+    return _build_subattr_rule(action, attr_name, sub_attr_names)
+
+
+def _build_subattr_rule(action, attr_name, sub_attr_names):
     sub_attr_rules = [policy.RuleCheck('rule', '%s:%s:%s' %
-                                       (action, attr_name,
-                                        sub_attr_name)) for
-                      sub_attr_name in data if sub_attr_name in
-                      target[attr_name]]
+                                       (action, attr_name, sub_attr_name))
+                      for sub_attr_name in sub_attr_names]
     return policy.AndCheck(sub_attr_rules)
 
 
+def _get_match_rule_key(action, target):
+    """Return what the match rule of an action on a target depends on.
+
+    This is the action itself for reads, and the action with the
+    attributes with policies explicitly set in the target, along with the
+    names of their sub-attributes set in the target, for writes.
+    """
+    if action in _MATCH_RULE_CACHE:
+        # Rules only depending on the action are cached by action
+        return action
+    resource, is_write = get_resource_and_action(action)
+    # Attribute-based checks shall not be enforced on GETs
+    if not is_write:
+        return action
+    # assigning to variable with short name for improving readability
+    res_map = attributes.RESOURCE_ATTRIBUTE_MAP
+    if resource not in res_map:
+        return action
+    attrs = []
+    for attribute_name in res_map[resource]:
+        if _is_attribute_explicitly_set(attribute_name,
+                                        res_map[resource],
+                                        target):
+            attribute = res_map[resource][attribute_name]
+            if 'enforce_policy' in attribute:
+                # Add the sub-attributes, if present
+                sub_attr_names = False
+                validate = attribute.get('validate')
+                if (validate and any([k.startswith('type:dict') and v
+                                      for (k, v) in
+                                      validate.iteritems()])):
+                    sub_attr_names = _get_subattr_names(
+                        attribute_name, attribute, target)
+                attrs.append((attribute_name, sub_attr_names))
+    return (action, tuple(attrs))
+
+
 def _build_match_rule(action, target):
     """Create the rule to match for a given action.
 
@@ -162,36 +225,74 @@ def _build_match_rule(action, target):
     4) add an entry for sub-attributes of a resource for which the
        action is being executed
        (e.g.: create_router:external_gateway_info:network_id)
+
+    The rules are cached by action and set of attributes, as they
+    only refer to the rules of the policy engine by name.
     """
+    return _get_match_rule(_get_match_rule_key(action, target))
+
 
+def _get_match_rule(key):
+    try:
+        return _MATCH_RULE_CACHE[key]
+    except KeyError:
+        pass
+    if isinstance(key, tuple):
+        action, attrs = key
+    else:
+        action, attrs = key, ()
     match_rule = policy.RuleCheck('rule', action)
-    resource, is_write = get_resource_and_action(action)
-    # Attribute-based checks shall not be enforced on GETs
-    if is_write:
-        # assigning to variable with short name for improving readability
-        res_map = attributes.RESOURCE_ATTRIBUTE_MAP
-        if resource in res_map:
-            for attribute_name in res_map[resource]:
-                if _is_attribute_explicitly_set(attribute_name,
-                                                res_map[resource],
-                                                target):
-                    attribute = res_map[resource][attribute_name]
-                    if 'enforce_policy' in attribute:
-                        attr_rule = policy.RuleCheck('rule', '%s:%s' %
-                                                     (action, attribute_name))
-                        # Build match entries for sub-attributes, if present
-                        validate = attribute.get('validate')
-                        if (validate and any([k.startswith('type:dict') and v
-                                              for (k, v) in
-                                              validate.iteritems()])):
-                            attr_rule = policy.AndCheck(
-                                [attr_rule, _build_subattr_match_rule(
-                                    attribute_name, attribute,
-                                    action, target)])
-                        match_rule = policy.AndCheck([match_rule, attr_rule])
+    for attribute_name, sub_attr_names in attrs:
+        attr_rule = policy.RuleCheck('rule', '%s:%s' %
+                                     (action, attribute_name))
+        if sub_attr_names is not False:
+            sub_attr_rule = None
+            if sub_attr_names is not None:
+                sub_attr_rule = _build_subattr_rule(
+                    action, attribute_name, sub_attr_names)
+            attr_rule = policy.AndCheck([attr_rule, sub_attr_rule])
+        match_rule = policy.AndCheck([match_rule, attr_rule])
+    _MATCH_RULE_CACHE[key] = match_rule
     return match_rule
 
 
+def _is_granted_by_roles(rule, roles):
+    """Verify that a rule is granted by roles whatever the target.
+
+    Checks on the target, and negations, are considered as failing, so
+    that this is only True if the rule passes for any target.
+    """
+    if isinstance(rule, policy.TrueCheck):
+        return True
+    elif isinstance(rule, policy.RoleCheck):
+        return rule.match.lower() in roles
+    elif isinstance(rule, policy.RuleCheck):
+        try:
+            return _is_granted_by_roles(policy._rules[rule.match], roles)
+        except KeyError:
+            return False
+    elif isinstance(rule, policy.AndCheck):
+        return all(_is_granted_by_roles(r, roles) for r in rule.rules)
+    elif isinstance(rule, policy.OrCheck):
+        return any(_is_granted_by_roles(r, roles) for r in rule.rules)
+    return False
+
+
+def _is_granted_to_admin(key, match_rule, credentials):
+    """Verify if an admin context passes a match rule by its roles only."""
+    if policy._rules is not _CACHED_RULES:
+        # Rules were set without going through _set_rules
+        _clear_caches()
+    roles = tuple(credentials['roles'])
+    try:
+        return _ADMIN_GRANT_CACHE[key, roles]
+    except KeyError:
+        granted = _is_granted_by_roles(
+            match_rule, [role.lower() for role in roles])
+        _ADMIN_GRANT_CACHE[key, roles] = granted
+        return granted
+
+
 # This check is registered as 'tenant_id' so that it can override
 # GenericCheck which was used for validating parent resource ownership.
 # This will prevent us from having to handling backward compatibility
@@ -320,8 +421,14 @@ def _prepare_check(context, action, target):
     # Compare with None to distinguish case in which target is {}
     if target is None:
         target = {}
-    match_rule = _build_match_rule(action, target)
-    credentials = context.to_dict()
+    key = _get_match_rule_key(action, target)
+    match_rule = _get_match_rule(key)
+    credentials = context.to_policy_values()
+    # Admin contexts are granted most actions by their roles, which
+    # spares evaluating the checks on the target
+    if (credentials.get('is_admin') and
+            _is_granted_to_admin(key, match_rule, credentials)):
+        match_rule = _ADMIN_GRANTED_RULE
     return match_rule, target, credentials
 
 
@@ -373,7 +480,6 @@ def enforce(context, action, target, plugin=None):
     :raises neutron.exceptions.PolicyNotAllowed: if verification fails.
     """
 
-    init()
     rule, target, credentials = _prepare_check(context, action, target)
     return policy.check(rule, target, credentials,
                         exc=exceptions.PolicyNotAuthorized, action=action)
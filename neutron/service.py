@@ -25,9 +25,11 @@ from oslo.config import cfg
 from neutron.common import config
 from neutron.common import legacy
 from neutron import context
+from neutron.db import api as db_api
 from neutron.openstack.common import importutils
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import loopingcall
+from neutron.openstack.common import rpc
 from neutron.openstack.common.rpc import service
 from neutron import wsgi
 
@@ -41,9 +43,15 @@ service_opts = [
                help=_('range of seconds to randomly delay when starting the'
                       ' periodic task scheduler to reduce stampeding.'
                       ' (Disable by setting to 0)')),
+    cfg.IntOpt('api_workers',
+               default=0,
+               help=_('Number of separate worker processes serving the API.'
+                      ' The default of 0 serves it in the server process.')),
 ]
 CONF = cfg.CONF
 CONF.register_opts(service_opts)
+CONF.import_opt('security_group_cache_ttl',
+                'neutron.db.securitygroups_rpc_base')
 
 LOG = logging.getLogger(__name__)
 
@@ -110,8 +118,23 @@ def _run_wsgi(app_name):
     if not app:
         LOG.error(_('No known API applications configured.'))
         return
+    if cfg.CONF.api_workers > 0:
+        # The workers must not share the database and messaging
+        # connections opened by the plugin, they open their own ones. The
+        # RPC consumers of the plugin keep running in this process only.
+        db_api.dispose()
+        rpc.cleanup()
+        # NOTE: the security group cache is invalidated by the workers
+        # changing the groups, while the agents are answered from the cache
+        # of this process, which would then serve stale rules.
+        if cfg.CONF.security_group_cache_ttl > 0:
+            LOG.warning(_('security_group_cache_ttl is not supported with '
+                          'api_workers, disabling the security group '
+                          'cache.'))
+            cfg.CONF.set_override('security_group_cache_ttl', 0)
     server = wsgi.Server("Neutron")
-    server.start(app, cfg.CONF.bind_port, cfg.CONF.bind_host)
+    server.start(app, cfg.CONF.bind_port, cfg.CONF.bind_host,
+                 workers=cfg.CONF.api_workers)
     # Dump all option values here after all options are parsed
     cfg.CONF.log_opt_values(LOG, std_logging.DEBUG)
     LOG.info(_("Neutron service started, listening on %(host)s:%(port)s"),
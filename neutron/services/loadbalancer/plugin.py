@@ -50,6 +50,8 @@ class LoadBalancerPlugin(loadbalancer_db.LoadBalancerPluginDb,
     loadbalancer_db.LoadBalancerPluginDb.
     """
     supported_extension_aliases = ["lbaas", "lbaas_agent_scheduler"]
+    __native_pagination_support = True
+    __native_sorting_support = True
 
     # lbaas agent notifiers to handle agent update operations;
     # can be updated by plugin drivers while loading;
@@ -279,6 +279,16 @@ class LoadBalancerPluginDbTestCase(LoadBalancerTestMixin,
         app = config.load_paste_app('extensions_test_app')
         self.ext_api = ExtensionMiddleware(app, ext_mgr=ext_mgr)
 
+    def _test_list_loads_only_pages(self, collection, items, sort):
+        # Three items in pages of two are loaded in two queries which
+        # return two and one rows, instead of the whole collection twice
+        make_dict = getattr(ldb.LoadBalancerPluginDb,
+                            '_make_%s_dict' % collection)
+        with mock.patch.object(ldb.LoadBalancerPluginDb, make_dict.__name__,
+                               autospec=True, side_effect=make_dict) as m:
+            self._test_list_with_pagination(collection, items, sort, 2, 2)
+        self.assertEqual(3, m.call_count)
+
 
 class TestLoadBalancer(LoadBalancerPluginDbTestCase):
     def setUp(self):
@@ -524,7 +534,7 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
             for k, v in keys:
                 self.assertEqual(res['vips'][0][k], v)
 
-    def test_list_vips_with_sort_emulated(self):
+    def test_list_vips_with_sort_native(self):
         with self.subnet() as subnet:
             with contextlib.nested(
                 self.vip(name='vip1', subnet=subnet, protocol_port=81),
@@ -537,7 +547,7 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
                     [('protocol_port', 'asc'), ('name', 'desc')]
                 )
 
-    def test_list_vips_with_pagination_emulated(self):
+    def test_list_vips_with_pagination_native(self):
         with self.subnet() as subnet:
             with contextlib.nested(self.vip(name='vip1', subnet=subnet),
                                    self.vip(name='vip2', subnet=subnet),
@@ -547,7 +557,7 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
                                                 (vip1, vip2, vip3),
                                                 ('name', 'asc'), 2, 2)
 
-    def test_list_vips_with_pagination_reverse_emulated(self):
+    def test_list_vips_with_pagination_reverse_native(self):
         with self.subnet() as subnet:
             with contextlib.nested(self.vip(name='vip1', subnet=subnet),
                                    self.vip(name='vip2', subnet=subnet),
@@ -557,6 +567,14 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
                                                         (vip1, vip2, vip3),
                                                         ('name', 'asc'), 2, 2)
 
+    def test_list_vips_loads_only_pages(self):
+        with self.subnet() as subnet:
+            with contextlib.nested(self.vip(name='vip1', subnet=subnet),
+                                   self.vip(name='vip2', subnet=subnet),
+                                   self.vip(name='vip3', subnet=subnet)
+                                   ) as vips:
+                self._test_list_loads_only_pages('vip', vips, ('name', 'asc'))
+
     def test_create_pool_with_invalid_values(self):
         name = 'pool3'
 
@@ -639,7 +657,7 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
             for k, v in keys:
                 self.assertEqual(res['pool'][k], v)
 
-    def test_list_pools_with_sort_emulated(self):
+    def test_list_pools_with_sort_native(self):
         with contextlib.nested(self.pool(name='p1'),
                                self.pool(name='p2'),
                                self.pool(name='p3')
@@ -647,7 +665,7 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
             self._test_list_with_sort('pool', (p3, p2, p1),
                                       [('name', 'desc')])
 
-    def test_list_pools_with_pagination_emulated(self):
+    def test_list_pools_with_pagination_native(self):
         with contextlib.nested(self.pool(name='p1'),
                                self.pool(name='p2'),
                                self.pool(name='p3')
@@ -656,7 +674,7 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
                                             (p1, p2, p3),
                                             ('name', 'asc'), 2, 2)
 
-    def test_list_pools_with_pagination_reverse_emulated(self):
+    def test_list_pools_with_pagination_reverse_native(self):
         with contextlib.nested(self.pool(name='p1'),
                                self.pool(name='p2'),
                                self.pool(name='p3')
@@ -665,6 +683,13 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
                                                     (p1, p2, p3),
                                                     ('name', 'asc'), 2, 2)
 
+    def test_list_pools_loads_only_pages(self):
+        with contextlib.nested(self.pool(name='p1'),
+                               self.pool(name='p2'),
+                               self.pool(name='p3')
+                               ) as pools:
+            self._test_list_loads_only_pages('pool', pools, ('name', 'asc'))
+
     def test_create_member(self):
         with self.pool() as pool:
             pool_id = pool['pool']['id']
@@ -787,7 +812,7 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
                 for k, v in keys:
                     self.assertEqual(res['member'][k], v)
 
-    def test_list_members_with_sort_emulated(self):
+    def test_list_members_with_sort_native(self):
         with self.pool() as pool:
             with contextlib.nested(self.member(pool_id=pool['pool']['id'],
                                                protocol_port=81),
@@ -799,7 +824,7 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
                 self._test_list_with_sort('member', (m3, m2, m1),
                                           [('protocol_port', 'desc')])
 
-    def test_list_members_with_pagination_emulated(self):
+    def test_list_members_with_pagination_native(self):
         with self.pool() as pool:
             with contextlib.nested(self.member(pool_id=pool['pool']['id'],
                                                protocol_port=81),
@@ -812,7 +837,7 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
                     'member', (m1, m2, m3), ('protocol_port', 'asc'), 2, 2
                 )
 
-    def test_list_members_with_pagination_reverse_emulated(self):
+    def test_list_members_with_pagination_reverse_native(self):
         with self.pool() as pool:
             with contextlib.nested(self.member(pool_id=pool['pool']['id'],
                                                protocol_port=81),
@@ -825,6 +850,18 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
                     'member', (m1, m2, m3), ('protocol_port', 'asc'), 2, 2
                 )
 
+    def test_list_members_loads_only_pages(self):
+        with self.pool() as pool:
+            with contextlib.nested(self.member(pool_id=pool['pool']['id'],
+                                               protocol_port=81),
+                                   self.member(pool_id=pool['pool']['id'],
+                                               protocol_port=82),
+                                   self.member(pool_id=pool['pool']['id'],
+                                               protocol_port=83)
+                                   ) as members:
+                self._test_list_loads_only_pages(
+                    'member', members, ('protocol_port', 'asc'))
+
     def test_create_healthmonitor(self):
         keys = [('type', "TCP"),
                 ('tenant_id', self._tenant_id),
@@ -916,7 +953,7 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
             for k, v in keys:
                 self.assertEqual(res['health_monitor'][k], v)
 
-    def test_list_healthmonitors_with_sort_emulated(self):
+    def test_list_healthmonitors_with_sort_native(self):
         with contextlib.nested(self.health_monitor(delay=30),
                                self.health_monitor(delay=31),
                                self.health_monitor(delay=32)
@@ -924,7 +961,7 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
             self._test_list_with_sort('health_monitor', (m3, m2, m1),
                                       [('delay', 'desc')])
 
-    def test_list_healthmonitors_with_pagination_emulated(self):
+    def test_list_healthmonitors_with_pagination_native(self):
         with contextlib.nested(self.health_monitor(delay=30),
                                self.health_monitor(delay=31),
                                self.health_monitor(delay=32)
@@ -933,7 +970,7 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
                                             (m1, m2, m3),
                                             ('delay', 'asc'), 2, 2)
 
-    def test_list_healthmonitors_with_pagination_reverse_emulated(self):
+    def test_list_healthmonitors_with_pagination_reverse_native(self):
         with contextlib.nested(self.health_monitor(delay=30),
                                self.health_monitor(delay=31),
                                self.health_monitor(delay=32)
@@ -942,6 +979,14 @@ class TestLoadBalancer(LoadBalancerPluginDbTestCase):
                                                     (m1, m2, m3),
                                                     ('delay', 'asc'), 2, 2)
 
+    def test_list_healthmonitors_loads_only_pages(self):
+        with contextlib.nested(self.health_monitor(delay=30),
+                               self.health_monitor(delay=31),
+                               self.health_monitor(delay=32)
+                               ) as monitors:
+            self._test_list_loads_only_pages(
+                'health_monitor', monitors, ('delay', 'asc'))
+
     def test_update_pool_stats_with_no_stats(self):
         keys = ["bytes_in", "bytes_out",
                 "active_connections",
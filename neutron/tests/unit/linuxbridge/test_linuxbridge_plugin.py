@@ -13,7 +13,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import contextlib
+
+from neutron import context
 from neutron.extensions import portbindings
+from neutron import manager
 from neutron.tests.unit import _test_extension_portbindings as test_bindings
 from neutron.tests.unit import test_db_plugin as test_plugin
 from neutron.tests.unit import test_security_groups_rpc as test_sg_rpc
@@ -54,6 +58,25 @@ class TestLinuxBridgePortsV2(test_plugin.TestPortsV2,
             self.assertEqual(port['port']['status'], 'DOWN')
             self.assertEqual(self.port_create_status, 'DOWN')
 
+    def test_get_devices_details_list(self):
+        plugin = manager.NeutronManager.get_plugin()
+        ctx = context.get_admin_context()
+        with self.subnet() as subnet:
+            with contextlib.nested(self.port(subnet=subnet),
+                                   self.port(subnet=subnet)) as ports:
+                port_ids = [port['port']['id'] for port in ports]
+                devices = ['tap' + port_id[:11] for port_id in port_ids]
+                details = plugin.callbacks.get_devices_details_list(
+                    ctx, devices=devices + ['unknown'],
+                    agent_id='fake_agent_id')
+                self.assertEqual([entry['device'] for entry in details],
+                                 devices + ['unknown'])
+                self.assertEqual([entry.get('port_id') for entry in details],
+                                 port_ids + [None])
+                for port_id in port_ids:
+                    port = plugin.get_port(ctx, port_id)
+                    self.assertEqual(port['status'], 'ACTIVE')
+
 
 class TestLinuxBridgePortBinding(LinuxBridgePluginV2TestCase,
                                  test_bindings.PortBindingsTestCase):
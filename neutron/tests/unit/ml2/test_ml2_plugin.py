@@ -13,6 +13,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+
+from neutron import context
+from neutron import manager
 from neutron.plugins.ml2 import config as config
 from neutron.tests.unit import _test_extension_portbindings as test_bindings
 from neutron.tests.unit import test_db_plugin as test_plugin
@@ -52,6 +56,11 @@ class TestMl2NetworksV2(test_plugin.TestNetworksV2,
     pass
 
 
+class TestMl2RandomIpamDriver(test_plugin.TestRandomIpamDriver,
+                              Ml2PluginV2TestCase):
+    pass
+
+
 class TestMl2PortsV2(test_plugin.TestPortsV2, Ml2PluginV2TestCase):
 
     def test_update_port_status_build(self):
@@ -59,6 +68,26 @@ class TestMl2PortsV2(test_plugin.TestPortsV2, Ml2PluginV2TestCase):
             self.assertEqual(port['port']['status'], 'DOWN')
             self.assertEqual(self.port_create_status, 'DOWN')
 
+    def test_get_devices_details_list(self):
+        plugin = manager.NeutronManager.get_plugin()
+        ctx = context.get_admin_context()
+        with self.subnet() as subnet:
+            with contextlib.nested(self.port(subnet=subnet),
+                                   self.port(subnet=subnet)) as ports:
+                port_ids = [port['port']['id'] for port in ports]
+                # Both full port ids and tap device names are accepted
+                devices = [port_ids[0], 'tap' + port_ids[1][:11]]
+                details = plugin.callbacks.get_devices_details_list(
+                    ctx, devices=devices + ['unknown'],
+                    agent_id='fake_agent_id')
+                self.assertEqual([entry['device'] for entry in details],
+                                 devices + ['unknown'])
+                self.assertEqual([entry.get('port_id') for entry in details],
+                                 port_ids + [None])
+                for port_id in port_ids:
+                    port = plugin.get_port(ctx, port_id)
+                    self.assertEqual(port['status'], 'ACTIVE')
+
 
 # TODO(rkukura) add TestMl2PortBinding
 
@@ -685,6 +685,19 @@ class OvsAgentSchedulerTestCase(test_l3_plugin.L3NatTestCaseMixin,
         self.assertEqual(1, len(l3_agents_1['agents']))
         self.assertEqual(0, len(l3_agents_2['agents']))
 
+    def test_rpc_get_router_ids(self):
+        l3_rpc = l3_rpc_base.L3RpcCallbackMixin()
+        self._register_agent_states()
+        self.assertEqual([], l3_rpc.get_router_ids(self.adminContext,
+                                                   host=L3_HOSTA))
+        with contextlib.nested(self.router(),
+                               self.router()) as routers:
+            router_ids = [r['router']['id'] for r in routers]
+            ret_a = l3_rpc.get_router_ids(self.adminContext, host=L3_HOSTA)
+            ret_b = l3_rpc.get_router_ids(self.adminContext, host=L3_HOSTB)
+        self.assertEqual(set(router_ids), set(ret_a))
+        self.assertEqual([], ret_b)
+
     def test_rpc_sync_routers(self):
         l3_rpc = l3_rpc_base.L3RpcCallbackMixin()
         self._register_agent_states()
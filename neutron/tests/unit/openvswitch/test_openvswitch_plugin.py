@@ -13,7 +13,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import contextlib
+
+import mock
+
+from neutron import context
 from neutron.extensions import portbindings
+from neutron import manager
 from neutron.tests.unit import _test_extension_portbindings as test_bindings
 from neutron.tests.unit import test_db_plugin as test_plugin
 from neutron.tests.unit import test_security_groups_rpc as test_sg_rpc
@@ -47,6 +53,67 @@ class TestOpenvswitchPortsV2(test_plugin.TestPortsV2,
             self.assertEqual(port['port']['status'], 'DOWN')
             self.assertEqual(self.port_create_status, 'DOWN')
 
+    def _test_create_ports_bulk_plugin_failure(self):
+        # The ports are created without calling create_port, so the fault
+        # is injected once the rows of the first port have been inserted
+        plugin = manager.NeutronManager.get_plugin()
+        orig = plugin._process_port_create_security_group
+        with mock.patch.object(plugin, '_process_port_create_security_group',
+                               autospec=True) as patched_plugin:
+
+            def side_effect(*args, **kwargs):
+                return self._do_side_effect(patched_plugin, orig,
+                                            *args, **kwargs)
+
+            patched_plugin.side_effect = side_effect
+            with self.network() as net:
+                res = self._create_port_bulk(self.fmt, 2,
+                                             net['network']['id'],
+                                             'test', True)
+                # We expect a 500 as we injected a fault in the plugin
+                self._validate_behavior_on_bulk_failure(res, 'ports', 500)
+
+    def test_create_ports_bulk_emulated_plugin_failure(self):
+        self._test_create_ports_bulk_plugin_failure()
+
+    def test_create_ports_bulk_native_plugin_failure(self):
+        self._test_create_ports_bulk_plugin_failure()
+
+    def test_create_ports_bulk_native_creates_bindings(self):
+        with self.network() as net:
+            res = self._create_port_bulk(self.fmt, 2, net['network']['id'],
+                                         'test', True)
+            ports = self.deserialize(self.fmt, res)['ports']
+            for port in ports:
+                self.assertEqual('DOWN', port['status'])
+                self.assertEqual(portbindings.VIF_TYPE_OVS,
+                                 port[portbindings.VIF_TYPE])
+                self._delete('ports', port['id'])
+
+    def test_get_devices_details_list(self):
+        plugin = manager.NeutronManager.get_plugin()
+        ctx = context.get_admin_context()
+        with self.subnet() as subnet:
+            with contextlib.nested(self.port(subnet=subnet),
+                                   self.port(subnet=subnet)) as ports:
+                port_ids = [port['port']['id'] for port in ports]
+                devices = port_ids
+                details = plugin.callbacks.get_devices_details_list(
+                    ctx, devices=devices + ['unknown'],
+                    agent_id='fake_agent_id')
+                self.assertEqual([entry['device'] for entry in details],
+                                 devices + ['unknown'])
+                self.assertEqual([entry.get('port_id') for entry in details],
+                                 port_ids + [None])
+                for port_id in port_ids:
+                    port = plugin.get_port(ctx, port_id)
+                    self.assertEqual(port['status'], 'ACTIVE')
+
+
+class TestOpenvswitchRandomIpamDriver(test_plugin.TestRandomIpamDriver,
+                                      OpenvswitchPluginV2TestCase):
+    pass
+
 
 class TestOpenvswitchNetworksV2(test_plugin.TestNetworksV2,
                                 OpenvswitchPluginV2TestCase):
@@ -231,7 +231,7 @@ class OVS_Lib_Test(base.BaseTestCase):
 
     def _test_get_vif_ports(self, is_xen=False):
         pname = "tap99"
-        ofport = "6"
+        ofport = 6
         vif_id = uuidutils.generate_uuid()
         mac = "ca:fe:de:ad:be:ef"
 
@@ -239,18 +239,22 @@ class OVS_Lib_Test(base.BaseTestCase):
                       root_helper=self.root_helper).AndReturn("%s\n" % pname)
 
         if is_xen:
-            external_ids = ('{xs-vif-uuid="%s", attached-mac="%s"}'
-                            % (vif_id, mac))
+            external_ids = {"xs-vif-uuid": vif_id, "attached-mac": mac}
         else:
-            external_ids = ('{iface-id="%s", attached-mac="%s"}'
-                            % (vif_id, mac))
+            external_ids = {"iface-id": vif_id, "attached-mac": mac}
 
-        utils.execute(["ovs-vsctl", self.TO, "get",
-                       "Interface", pname, "external_ids"],
-                      root_helper=self.root_helper).AndReturn(external_ids)
-        utils.execute(["ovs-vsctl", self.TO, "get",
-                       "Interface", pname, "ofport"],
-                      root_helper=self.root_helper).AndReturn(ofport)
+        headings = ['name', 'ofport', 'external_ids']
+        data = [
+            # A vif port on this bridge:
+            [pname, ofport, external_ids],
+            # A vif port on another bridge:
+            ['tap88', 3, {'iface-id': 'tap88id', 'attached-mac': 'tap88id'}],
+        ]
+        utils.execute(["ovs-vsctl", self.TO, "--format=json",
+                       "--", "--columns=name,ofport,external_ids",
+                       "list", "Interface"],
+                      root_helper=self.root_helper).AndReturn(
+                          self._encode_ovs_json(headings, data))
         if is_xen:
             utils.execute(["xe", "vif-param-get", "param-name=other-config",
                            "param-key=nicira-iface-id", "uuid=" + vif_id],
@@ -266,6 +270,24 @@ class OVS_Lib_Test(base.BaseTestCase):
         self.assertEqual(ports[0].switch.br_name, self.BR_NAME)
         self.mox.VerifyAll()
 
+    def test_get_vif_ports_unassigned_ofport(self):
+        utils.execute(["ovs-vsctl", self.TO, "list-ports", self.BR_NAME],
+                      root_helper=self.root_helper).AndReturn("tap99\n")
+        headings = ['name', 'ofport', 'external_ids']
+        data = [['tap99', ['set', []],
+                 {'iface-id': 'tap99id', 'attached-mac': 'tap99mac'}]]
+        utils.execute(["ovs-vsctl", self.TO, "--format=json",
+                       "--", "--columns=name,ofport,external_ids",
+                       "list", "Interface"],
+                      root_helper=self.root_helper).AndReturn(
+                          self._encode_ovs_json(headings, data))
+        self.mox.ReplayAll()
+
+        ports = self.br.get_vif_ports()
+        self.assertEqual(1, len(ports))
+        self.assertEqual(ports[0].ofport, -1)
+        self.mox.VerifyAll()
+
     def _encode_ovs_json(self, headings, data):
         # See man ovs-vsctl(8) for the encoding details.
         r = {"data": [],
@@ -274,12 +296,13 @@ class OVS_Lib_Test(base.BaseTestCase):
             ovs_row = []
             r["data"].append(ovs_row)
             for cell in row:
-                if isinstance(cell, str):
+                if isinstance(cell, (str, int, list)):
                     ovs_row.append(cell)
                 elif isinstance(cell, dict):
                     ovs_row.append(["map", cell.items()])
                 else:
-                    raise TypeError('%r not str or dict' % type(cell))
+                    raise TypeError('%r not str, int, list or dict' %
+                                    type(cell))
         return jsonutils.dumps(r)
 
     def _test_get_vif_port_set(self, is_xen):
@@ -329,6 +352,29 @@ class OVS_Lib_Test(base.BaseTestCase):
     def test_get_vif_port_set_xen(self):
         self._test_get_vif_port_set(True)
 
+    def _count_vif_ports_invocations(self, num_ports):
+        port_names = ['tap%d' % i for i in range(num_ports)]
+        headings = ['name', 'ofport', 'external_ids']
+        data = [[name, i, {'iface-id': '%s-id' % name,
+                           'attached-mac': 'fa:16:3e:00:00:01'}]
+                for i, name in enumerate(port_names)]
+
+        def fake_execute(args, root_helper=None):
+            if 'list-ports' in args:
+                return '\n'.join(port_names)
+            return self._encode_ovs_json(headings, data)
+
+        with mock.patch.object(utils, 'execute',
+                               side_effect=fake_execute) as execute:
+            ports = self.br.get_vif_ports()
+        self.assertEqual(num_ports, len(ports))
+        return execute.call_count
+
+    def test_get_vif_ports_invocations_independent_of_port_count(self):
+        # Querying each port in turn would need 1 + 2 * 500 invocations
+        self.assertEqual(2, self._count_vif_ports_invocations(1))
+        self.assertEqual(2, self._count_vif_ports_invocations(500))
+
     def test_get_vif_port_set_list_ports_error(self):
         utils.execute(["ovs-vsctl", self.TO, "list-ports", self.BR_NAME],
                       root_helper=self.root_helper).AndRaise(RuntimeError())
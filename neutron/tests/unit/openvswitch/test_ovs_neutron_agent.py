@@ -145,8 +145,83 @@ class TestOvsNeutronAgent(base.BaseTestCase):
         actual = self.mock_update_ports(vif_port_set, registered_ports)
         self.assertEqual(expected, actual)
 
+    def _mock_update_ports_from_events(self, events, registered_ports,
+                                       port_names=()):
+        with mock.patch.object(self.agent.int_br, 'get_port_name_list',
+                               return_value=list(port_names)):
+            return self.agent.update_ports_from_events(registered_ports,
+                                                       events)
+
+    def test_update_ports_from_events_returns_none_without_changes(self):
+        events = ({}, set(['vif3']))
+        self.assertIsNone(self._mock_update_ports_from_events(
+            events, set(['vif1'])))
+
+    def test_update_ports_from_events_returns_port_changes(self):
+        events = ({'vif3': 'tap3', 'vif4': 'tap4'}, set(['vif2']))
+        expected = dict(current=set(['vif1', 'vif3']),
+                        added=set(['vif3']), removed=set(['vif2']))
+        actual = self._mock_update_ports_from_events(
+            events, set(['vif1', 'vif2']), port_names=['tap1', 'tap3'])
+        self.assertEqual(expected, actual)
+
+    def test_get_port_info_scans_bridge_without_monitor(self):
+        with mock.patch.object(self.agent, 'update_ports') as update_ports:
+            self.agent._get_port_info(set(), None, False)
+        update_ports.assert_called_once_with(set())
+
+    def test_get_port_info_uses_monitor_events(self):
+        monitor = mock.Mock()
+        monitor.get_events.return_value = ({}, set())
+        with contextlib.nested(
+            mock.patch.object(self.agent, 'update_ports'),
+            mock.patch.object(self.agent, 'update_ports_from_events')
+        ) as (update_ports, update_from_events):
+            self.agent._get_port_info(set(), monitor, False)
+        self.assertFalse(update_ports.called)
+        update_from_events.assert_called_once_with(set(), ({}, set()))
+
+    def _test_get_port_info_falls_back_to_scan(self, events, full_scan):
+        monitor = mock.Mock()
+        monitor.get_events.return_value = events
+        with contextlib.nested(
+            mock.patch.object(self.agent, 'update_ports'),
+            mock.patch.object(self.agent, 'update_ports_from_events')
+        ) as (update_ports, update_from_events):
+            self.agent._get_port_info(set(), monitor, full_scan)
+        self.assertTrue(monitor.get_events.called)
+        self.assertFalse(update_from_events.called)
+        update_ports.assert_called_once_with(set())
+
+    def test_get_port_info_scans_bridge_on_monitor_resync(self):
+        self._test_get_port_info_falls_back_to_scan(None, False)
+
+    def test_get_port_info_scans_bridge_on_agent_resync(self):
+        self._test_get_port_info_falls_back_to_scan(({}, set()), True)
+
+    def test_wait_for_next_iteration_waits_on_monitor(self):
+        monitor = mock.Mock()
+        with mock.patch('time.sleep') as sleep:
+            self.agent._wait_for_next_iteration(monitor, 2)
+        self.assertFalse(sleep.called)
+        monitor.wait_for_changes.assert_called_once_with(2)
+
+    def test_daemon_loop_starts_monitor_when_minimizing_polling(self):
+        self.agent.minimize_polling = True
+        with contextlib.nested(
+            mock.patch.object(ovs_neutron_agent.ovsdb_monitor,
+                              'SimpleInterfaceMonitor'),
+            mock.patch.object(self.agent, 'rpc_loop')
+        ) as (monitor_cls, rpc_loop):
+            self.agent.daemon_loop()
+        monitor = monitor_cls.return_value
+        self.assertTrue(monitor.start.called)
+        rpc_loop.assert_called_once_with(monitor=monitor)
+        self.assertTrue(monitor.stop.called)
+
     def test_treat_devices_added_returns_true_for_missing_device(self):
-        with mock.patch.object(self.agent.plugin_rpc, 'get_device_details',
+        with mock.patch.object(self.agent.plugin_rpc,
+                               'get_devices_details_list',
                                side_effect=Exception()):
             self.assertTrue(self.agent.treat_devices_added([{}]))
 
@@ -159,8 +234,9 @@ class TestOvsNeutronAgent(base.BaseTestCase):
         :returns: whether the named function was called
         """
         with contextlib.nested(
-            mock.patch.object(self.agent.plugin_rpc, 'get_device_details',
-                              return_value=details),
+            mock.patch.object(self.agent.plugin_rpc,
+                              'get_devices_details_list',
+                              return_value=[details]),
             mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
                               return_value=port),
             mock.patch.object(self.agent, func_name)
@@ -18,6 +18,7 @@
 import copy
 import time
 
+import mock
 from oslo.config import cfg
 from webob import exc
 
@@ -29,6 +30,7 @@ from neutron import context
 from neutron.db import agents_db
 from neutron.db import db_base_plugin_v2
 from neutron.extensions import agent
+from neutron import manager
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import timeutils
 from neutron.openstack.common import uuidutils
@@ -71,6 +73,8 @@ class AgentTestExtensionManager(object):
 class TestAgentPlugin(db_base_plugin_v2.NeutronDbPluginV2,
                       agents_db.AgentDbMixin):
     supported_extension_aliases = ["agent"]
+    __native_pagination_support = True
+    __native_sorting_support = True
 
 
 class AgentDBTestMixIn(object):
@@ -209,6 +213,29 @@ class AgentDBTestCase(AgentDBTestMixIn,
                 break
         self.assertEqual(len(agents), len(res['agents']))
 
+    def test_list_agent_with_sort(self):
+        self._register_agent_states()
+        agents = self._list('agents', query_params='sort_key=host&'
+                            'sort_dir=desc&sort_key=agent_type&sort_dir=asc')
+        self.assertEqual(
+            [(DHCP_HOSTC, constants.AGENT_TYPE_DHCP),
+             (L3_HOSTB, constants.AGENT_TYPE_L3),
+             (DHCP_HOSTA, constants.AGENT_TYPE_DHCP),
+             (L3_HOSTA, constants.AGENT_TYPE_L3)],
+            [(agent['host'], agent['agent_type'])
+             for agent in agents['agents']])
+
+    def test_list_agent_with_pagination(self):
+        self._register_agent_states()
+        agents = [{'agent': agent} for agent in self._list('agents')['agents']]
+        plugin = manager.NeutronManager.get_plugin()
+        with mock.patch.object(plugin, '_make_agent_dict',
+                               wraps=plugin._make_agent_dict) as make_dict:
+            self._test_list_with_pagination('agent', agents,
+                                            ('host', 'asc'), 3, 2)
+        # Only the rows of the requested pages are loaded
+        self.assertEqual(len(agents), make_dict.call_count)
+
     def test_show_agent(self):
         self._register_agent_states()
         agents = self._list_agents(
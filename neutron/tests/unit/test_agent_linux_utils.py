@@ -15,10 +15,17 @@
 #    under the License.
 # @author: Dan Wendlandt, Nicira, Inc.
 
+import os
+import sys
+
 import fixtures
 import mock
+from oslo.config import cfg
 
+from neutron.agent.common import config
+from neutron.agent.linux import rootwrap_daemon
 from neutron.agent.linux import utils
+from neutron.openstack.common.rootwrap import cmd
 from neutron.tests import base
 
 
@@ -63,6 +70,100 @@ class AgentUtilsExecuteTest(base.BaseTestCase):
         self.assertEqual(result, "%s\n" % self.test_file)
 
 
+class AgentUtilsExecuteRootHelperDaemonTest(base.BaseTestCase):
+    def setUp(self):
+        super(AgentUtilsExecuteRootHelperDaemonTest, self).setUp()
+        tempdir = self.useFixture(fixtures.TempDir()).path
+        filters_path = os.path.join(tempdir, 'rootwrap.d')
+        os.mkdir(filters_path)
+        with open(os.path.join(filters_path, 'test.filters'), 'w') as f:
+            f.write("[Filters]\n"
+                    "cat: CommandFilter, cat, root\n"
+                    "false: CommandFilter, false, root\n"
+                    "printenv: EnvFilter, env, root, FOO=, printenv\n")
+        conf_file = os.path.join(tempdir, 'rootwrap.conf')
+        with open(conf_file, 'w') as f:
+            f.write("[DEFAULT]\n"
+                    "filters_path=%s\n"
+                    "exec_dirs=/bin,/usr/bin\n" % filters_path)
+        daemon_cmd = ('%s -c "from neutron.agent.linux '
+                      'import rootwrap_daemon; rootwrap_daemon.main()" %s' %
+                      (sys.executable, conf_file))
+        config.register_root_helper(cfg.CONF)
+        cfg.CONF.set_override('root_helper_daemon', daemon_cmd, 'AGENT')
+        self.addCleanup(self._stop_daemon, daemon_cmd)
+
+    def _stop_daemon(self, daemon_cmd):
+        client = utils._root_helper_daemon_clients.pop(daemon_cmd, None)
+        if client and client._process:
+            client._process.stdin.close()
+            client._process.wait()
+
+    def test_execute(self):
+        result = utils.execute(['cat'], 'sudo', process_input='foo\xff\n')
+        self.assertEqual(result, 'foo\xff\n')
+
+    def test_execute_reuses_connection(self):
+        utils.execute(['cat'], 'sudo', process_input='foo')
+        client = utils._get_root_helper_daemon_client('sudo')
+        conn = client._connections[0]
+        utils.execute(['cat'], 'sudo', process_input='bar')
+        self.assertEqual(client._connections, [conn])
+
+    def test_check_exit_code(self):
+        self.assertRaises(RuntimeError, utils.execute, ['false'], 'sudo')
+        self.assertEqual(utils.execute(['false'], 'sudo',
+                                       check_exit_code=False), '')
+
+    def test_unauthorized_command(self):
+        client = utils._get_root_helper_daemon_client('sudo')
+        returncode, stdout, stderr = client.execute(['ls'])
+        self.assertEqual(returncode, cmd.RC_UNAUTHORIZED)
+        self.assertIn('Unauthorized command', stderr)
+
+    def test_daemon_restarted(self):
+        utils.execute(['cat'], 'sudo', process_input='foo')
+        client = utils._get_root_helper_daemon_client('sudo')
+        process = client._process
+        process.stdin.close()
+        process.wait()
+        result = utils.execute(['cat'], 'sudo', process_input='bar')
+        self.assertEqual(result, 'bar')
+        self.assertIsNot(client._process, process)
+
+    def test_unauthenticated_connection(self):
+        client = utils._get_root_helper_daemon_client('sudo')
+        client.execute(['cat'])
+        client._connections = []
+        client._authkey = 'wrong'
+        self.assertRaises(RuntimeError, client.execute, ['cat'])
+
+    def test_addl_env(self):
+        result = utils.execute(['printenv', 'FOO'], 'sudo',
+                               addl_env={'FOO': 'bar'})
+        self.assertEqual(result, 'bar\n')
+
+    def test_other_root_helper(self):
+        with mock.patch.object(utils.RootHelperDaemonClient,
+                               'execute') as execute:
+            result = utils.execute(['cat'], 'echo', process_input='foo')
+        self.assertEqual(result, 'cat\n')
+        self.assertFalse(execute.called)
+
+    def test_without_root_helper(self):
+        with mock.patch.object(utils,
+                               '_get_root_helper_daemon_client') as get:
+            self.assertEqual(utils.execute(['cat'], process_input='foo'),
+                             'foo')
+        self.assertFalse(get.called)
+
+
+class RootwrapDaemonRunCommandTest(base.BaseTestCase):
+    def test_no_command(self):
+        rootwrap = rootwrap_daemon.RootwrapDaemon(mock.Mock(), [], 'key')
+        self.assertEqual(rootwrap.run_command([])[0], cmd.RC_NOCOMMAND)
+
+
 class AgentUtilsGetInterfaceMAC(base.BaseTestCase):
     def test_get_interface_mac(self):
         expect_val = '01:02:03:04:05:06'
@@ -0,0 +1,136 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright 2013 OpenStack Foundation.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron.agent.linux import ovsdb_monitor
+from neutron.openstack.common import jsonutils
+from neutron.tests import base
+
+
+def _update(*rows):
+    return jsonutils.dumps({
+        'headings': ['row', 'action', 'name', 'external_ids'],
+        'data': list(rows)})
+
+
+def _row(uuid, action, name, vif_id=None, mac='fa:16:3e:00:00:01'):
+    external_ids = []
+    if mac:
+        external_ids.append(['attached-mac', mac])
+    if vif_id:
+        external_ids.append(['iface-id', vif_id])
+    return [uuid, action, name, ['map', external_ids]]
+
+
+class TestOvsdbMonitor(base.BaseTestCase):
+
+    def test___init__(self):
+        monitor = ovsdb_monitor.OvsdbMonitor('Interface',
+                                             columns=['name', 'ofport'],
+                                             format='json')
+        self.assertEqual(['ovsdb-client', 'monitor', 'Interface',
+                          'name,ofport', '--format=json'], monitor.cmd)
+
+    def test__read_stderr_logs_output(self):
+        monitor = ovsdb_monitor.OvsdbMonitor('Interface')
+        monitor._process = mock.Mock()
+        monitor._process.stderr.readline.return_value = 'error'
+        with mock.patch.object(ovsdb_monitor.LOG, 'error') as log_error:
+            self.assertTrue(monitor._read_stderr())
+        self.assertTrue(log_error.called)
+
+
+class TestSimpleInterfaceMonitor(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestSimpleInterfaceMonitor, self).setUp()
+        self.monitor = ovsdb_monitor.SimpleInterfaceMonitor()
+        # Consume the full scan requested by a newly created monitor
+        self.assertIsNone(self.monitor.get_events())
+
+    def _get_events(self, *lines):
+        for line in lines:
+            self.monitor._stdout_lines.put(line)
+        return self.monitor.get_events()
+
+    def test_is_active(self):
+        self.assertFalse(self.monitor.is_active)
+        self.monitor._kill_event = True
+        self.assertTrue(self.monitor.is_active)
+
+    def test__spawn_requests_full_scan(self):
+        self.monitor._stdout_lines.put('stale')
+        with mock.patch.object(ovsdb_monitor.OvsdbMonitor, '_spawn'):
+            self.monitor._spawn()
+        self.assertIsNone(self.monitor.get_events())
+        self.assertEqual(({}, set()), self.monitor.get_events())
+
+    def test_get_events_without_output(self):
+        self.assertEqual(({}, set()), self.monitor.get_events())
+
+    def test_get_events_reports_inserted_vifs(self):
+        events = self._get_events(_update(_row('1', 'insert', 'tap1', 'vif1'),
+                                          _row('2', 'insert', 'tap2')))
+        self.assertEqual(({'vif1': 'tap1'}, set()), events)
+
+    def test_get_events_ignores_interfaces_without_mac(self):
+        events = self._get_events(
+            _update(_row('1', 'insert', 'tap1', 'vif1', mac=None)))
+        self.assertEqual(({}, set()), events)
+
+    def test_get_events_reports_deleted_vifs(self):
+        self._get_events(_update(_row('1', 'insert', 'tap1', 'vif1')))
+        events = self._get_events(_update(_row('1', 'delete', 'tap1',
+                                               'vif1')))
+        self.assertEqual(({}, set(['vif1'])), events)
+
+    def test_get_events_ignores_unknown_deleted_rows(self):
+        events = self._get_events(_update(_row('1', 'delete', 'tap1')))
+        self.assertEqual(({}, set()), events)
+
+    def test_get_events_cancels_transient_vifs(self):
+        events = self._get_events(
+            _update(_row('1', 'insert', 'tap1', 'vif1')),
+            _update(_row('1', 'delete', 'tap1', 'vif1')))
+        self.assertEqual(({}, set(['vif1'])), events)
+
+    def test_get_events_reports_modified_vifs(self):
+        self._get_events(_update(_row('1', 'insert', 'tap1')))
+        events = self._get_events(
+            _update(['1', 'old', '', ['map', []]],
+                    _row('1', 'new', 'tap1', 'vif1')))
+        self.assertEqual(({'vif1': 'tap1'}, set()), events)
+
+    def test_get_events_reports_replaced_vif_ids(self):
+        self._get_events(_update(_row('1', 'insert', 'tap1', 'vif1')))
+        events = self._get_events(_update(_row('1', 'new', 'tap1', 'vif2')))
+        self.assertEqual(({'vif2': 'tap1'}, set(['vif1'])), events)
+
+    def test_get_events_requests_full_scan_for_invalid_output(self):
+        self.assertIsNone(self._get_events('invalid'))
+        self.assertEqual(({}, set()), self.monitor.get_events())
+
+    def test_get_events_requests_full_scan_for_xenserver_vifs(self):
+        row = ['1', 'insert', 'tap1',
+               ['map', [['attached-mac', 'fa:16:3e:00:00:01'],
+                        ['xs-vif-uuid', 'xs1']]]]
+        self.assertIsNone(self._get_events(_update(row)))
+
+    def test_wait_for_changes(self):
+        self.assertFalse(self.monitor.wait_for_changes(0.01))
+        self.monitor._stdout_lines.put(_update())
+        self.assertTrue(self.monitor.wait_for_changes(0.01))
@@ -19,6 +19,7 @@ import mock
 
 from neutron.agent import rpc
 from neutron.openstack.common import context
+from neutron.openstack.common.rpc import common as rpc_common
 from neutron.tests import base
 
 
@@ -39,6 +40,42 @@ class AgentRPCPluginApi(base.BaseTestCase):
     def test_get_device_details(self):
         self._test_rpc_call('get_device_details')
 
+    def test_get_devices_details_list(self):
+        self._test_rpc_call('get_devices_details_list')
+
+    def test_get_devices_details_list_uses_bulk_version(self):
+        agent = rpc.PluginApi('fake_topic')
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        with mock.patch('neutron.openstack.common.rpc.call') as rpc_call:
+            agent.get_devices_details_list(ctxt, ['fake_device'],
+                                           'fake_agent_id')
+        msg = rpc_call.call_args[0][2]
+        self.assertEqual(msg['method'], 'get_devices_details_list')
+        self.assertEqual(msg['version'], '1.2')
+        self.assertEqual(msg['args']['devices'], ['fake_device'])
+
+    def test_get_devices_details_list_falls_back_for_old_plugin(self):
+        agent = rpc.PluginApi('fake_topic')
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        error = rpc_common.RemoteError(exc_type='UnsupportedRpcVersion')
+        with mock.patch('neutron.openstack.common.rpc.call',
+                        side_effect=[error, 'foo', 'bar']):
+            result = agent.get_devices_details_list(
+                ctxt, ['fake_device1', 'fake_device2'], 'fake_agent_id')
+        self.assertFalse(agent.devices_details_list_supported)
+        self.assertEqual(result, ['foo', 'bar'])
+
+    def test_get_devices_details_list_raises_remote_errors(self):
+        agent = rpc.PluginApi('fake_topic')
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        error = rpc_common.RemoteError(exc_type='Exception')
+        with mock.patch('neutron.openstack.common.rpc.call',
+                        side_effect=error):
+            self.assertRaises(rpc_common.RemoteError,
+                              agent.get_devices_details_list,
+                              ctxt, ['fake_device'], 'fake_agent_id')
+        self.assertTrue(agent.devices_details_list_supported)
+
     def test_update_device_down(self):
         self._test_rpc_call('update_device_down')
 
@@ -19,12 +19,14 @@
 #
 
 import mock
+import webob
 from webob import exc
 import webtest
 
 from neutron.api.v2 import resource as wsgi_resource
 from neutron.common import exceptions as q_exc
 from neutron import context
+from neutron.openstack.common import jsonutils
 from neutron.tests import base
 from neutron import wsgi
 
@@ -238,6 +240,70 @@ class ResourceTestCase(base.BaseTestCase):
         res = resource.delete('', extra_environ=environ, expect_errors=True)
         self.assertEqual(res.status_int, 204)
 
+    def test_streamed_collection(self):
+        controller = mock.MagicMock()
+        controller.test = lambda request: wsgi.StreamedCollection(
+            'foos', ['a', 'b'], lambda item: {'name': item})
+
+        resource = webtest.TestApp(wsgi_resource.Resource(controller))
+
+        environ = {'wsgiorg.routing_args': (None, {'action': 'test',
+                                                   'format': 'json'})}
+        res = resource.get('', extra_environ=environ)
+        self.assertEqual(res.status_int, 200)
+        self.assertEqual(jsonutils.loads(res.body),
+                         {'foos': [{'name': 'a'}, {'name': 'b'}]})
+
+    def test_streamed_collection_view_error(self):
+        def view(item):
+            raise Exception()
+
+        controller = mock.MagicMock()
+        controller.test = lambda request: wsgi.StreamedCollection(
+            'foos', ['a'], view)
+
+        resource = webtest.TestApp(wsgi_resource.Resource(controller))
+
+        environ = {'wsgiorg.routing_args': (None, {'action': 'test',
+                                                   'format': 'json'})}
+        res = resource.get('', extra_environ=environ, expect_errors=True)
+        self.assertEqual(res.status_int, exc.HTTPInternalServerError.code)
+
+    def test_streamed_collection_view_error_after_status(self):
+        def view(item):
+            if item == 'b':
+                raise ValueError()
+            return {'name': item}
+
+        controller = mock.MagicMock()
+        controller.test = lambda request: wsgi.StreamedCollection(
+            'foos', ['a', 'b'], view)
+
+        request = webob.Request.blank('/', environ={
+            'wsgiorg.routing_args': (None, {'action': 'test',
+                                            'format': 'json'})})
+        with mock.patch.object(wsgi, 'STREAM_CHUNK_SIZE', new=1):
+            with mock.patch.object(wsgi_resource.LOG,
+                                   'exception') as log:
+                res = request.get_response(
+                    wsgi_resource.Resource(controller))
+                self.assertEqual(res.status_int, 200)
+                self.assertRaises(ValueError, list, res.app_iter)
+        self.assertTrue(log.called)
+
+    def test_streamed_collection_with_xml(self):
+        controller = mock.MagicMock()
+        controller.test = lambda request: wsgi.StreamedCollection(
+            'foos', ['a'], lambda item: {'name': item})
+
+        resource = webtest.TestApp(wsgi_resource.Resource(controller))
+
+        environ = {'wsgiorg.routing_args': (None, {'action': 'test',
+                                                   'format': 'xml'})}
+        res = resource.get('', extra_environ=environ)
+        self.assertEqual(res.status_int, 200)
+        self.assertIn('<name>a</name>', res.body)
+
     def test_no_route_args(self):
         controller = mock.MagicMock()
 
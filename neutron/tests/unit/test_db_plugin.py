@@ -18,10 +18,12 @@
 import contextlib
 import copy
 import datetime
+import inspect
 import os
 import random
 
 import mock
+import netaddr
 from oslo.config import cfg
 from testtools import matchers
 import webob.exc
@@ -38,8 +40,10 @@ from neutron.common.test_lib import test_config
 from neutron import context
 from neutron.db import api as db
 from neutron.db import db_base_plugin_v2
+from neutron.db import ipam
 from neutron.db import models_v2
 from neutron.manager import NeutronManager
+from neutron.openstack.common.db import exception as db_exc
 from neutron.openstack.common import timeutils
 from neutron.tests import base
 from neutron.tests.unit import test_extensions
@@ -907,6 +911,63 @@ class TestPortsV2(NeutronDbPluginV2TestCase):
                 # We expect a 500 as we injected a fault in the plugin
                 self._validate_behavior_on_bulk_failure(res, 'ports', 500)
 
+    def test_create_ports_bulk_allocates_addresses(self):
+        with self.subnet() as subnet:
+            res = self._create_port_bulk(self.fmt, 3,
+                                         subnet['subnet']['network_id'],
+                                         'test', True)
+            self.assertEqual(res.status_int, webob.exc.HTTPCreated.code)
+            ports = self.deserialize(self.fmt, res)['ports']
+            macs = set(port['mac_address'] for port in ports)
+            ips = set(ip['ip_address']
+                      for port in ports for ip in port['fixed_ips'])
+            self.assertEqual(3, len(macs))
+            self.assertEqual(set(['10.0.0.2', '10.0.0.3', '10.0.0.4']), ips)
+            for port in ports:
+                port_res = self._show('ports', port['id'])
+                self.assertEqual(port['fixed_ips'],
+                                 port_res['port']['fixed_ips'])
+                self._delete('ports', port['id'])
+
+    def test_create_ports_bulk_regenerates_used_mac(self):
+        with self.port() as port:
+            used_mac = port['port']['mac_address']
+            macs = ['12:34:56:78:00:01', '12:34:56:78:00:02']
+            with mock.patch.object(db_base_plugin_v2.NeutronDbPluginV2,
+                                   '_get_random_mac',
+                                   side_effect=[used_mac, macs[0],
+                                                used_mac, macs[1]]):
+                res = self._create_port_bulk(self.fmt, 2,
+                                             port['port']['network_id'],
+                                             'test', True)
+            self.assertEqual(res.status_int, webob.exc.HTTPCreated.code)
+            ports = self.deserialize(self.fmt, res)['ports']
+            self.assertEqual(macs,
+                             sorted(p['mac_address'] for p in ports))
+            for p in ports:
+                self._delete('ports', p['id'])
+
+    def test_create_ports_bulk_duplicate_mac(self):
+        with self.network() as net:
+            override = {0: {'mac_address': '12:34:56:78:00:01'},
+                        1: {'mac_address': '12:34:56:78:00:01'}}
+            res = self._create_port_bulk(self.fmt, 2, net['network']['id'],
+                                         'test', True, override=override)
+            self._validate_behavior_on_bulk_failure(
+                res, 'ports', webob.exc.HTTPConflict.code)
+
+    def test_create_ports_bulk_duplicate_ip(self):
+        with self.subnet() as subnet:
+            fixed_ips = [{'subnet_id': subnet['subnet']['id'],
+                          'ip_address': '10.0.0.10'}]
+            override = {0: {'fixed_ips': fixed_ips},
+                        1: {'fixed_ips': fixed_ips}}
+            res = self._create_port_bulk(self.fmt, 2,
+                                         subnet['subnet']['network_id'],
+                                         'test', True, override=override)
+            self._validate_behavior_on_bulk_failure(
+                res, 'ports', webob.exc.HTTPConflict.code)
+
     def test_list_ports(self):
         # for this test we need to enable overlapping ips
         cfg.CONF.set_default('allow_overlapping_ips', True)
@@ -3510,6 +3571,254 @@ class TestSubnetsV2(NeutronDbPluginV2TestCase):
         self.assertEqual(res.status_int, 204)
 
 
+class TestRandomIpamDriver(NeutronDbPluginV2TestCase):
+
+    def setUp(self):
+        super(TestRandomIpamDriver, self).setUp()
+        cfg.CONF.set_override('ipam_driver',
+                              'neutron.db.ipam.RandomIpamDriver')
+
+    def test_allocate_from_pools(self):
+        pools = [{'start': '10.0.0.10', 'end': '10.0.0.20'}]
+        with self.subnet(allocation_pools=pools) as subnet:
+            with self.port(subnet=subnet) as port:
+                ips = port['port']['fixed_ips']
+                self.assertEqual(len(ips), 1)
+                self.assertIn(netaddr.IPAddress(ips[0]['ip_address']),
+                              netaddr.IPRange('10.0.0.10', '10.0.0.20'))
+                self.assertEqual(ips[0]['subnet_id'], subnet['subnet']['id'])
+
+    def test_allocate_all_addresses(self):
+        with self.subnet(gateway_ip='10.0.0.3',
+                         cidr='10.0.0.0/29') as subnet:
+            kwargs = {"fixed_ips": [{'subnet_id': subnet['subnet']['id']}] * 5}
+            net_id = subnet['subnet']['network_id']
+            res = self._create_port(self.fmt, net_id=net_id, **kwargs)
+            port = self.deserialize(self.fmt, res)
+            ips = [ip['ip_address'] for ip in port['port']['fixed_ips']]
+            self.assertEqual(['10.0.0.1', '10.0.0.2', '10.0.0.4', '10.0.0.5',
+                              '10.0.0.6'], sorted(ips))
+            res = self._create_port(self.fmt, net_id=net_id)
+            self.assertEqual(res.status_int, webob.exc.HTTPConflict.code)
+            self._delete('ports', port['port']['id'])
+
+    def test_allocate_after_random_conflicts(self):
+        with self.subnet() as subnet:
+            with mock.patch('random.randrange', return_value=0):
+                with contextlib.nested(self.port(subnet=subnet),
+                                       self.port(subnet=subnet)) as ports:
+                    ips = [port['port']['fixed_ips'][0]['ip_address']
+                           for port in ports]
+                    self.assertEqual(['10.0.0.2', '10.0.0.3'], ips)
+
+    def test_iter_pools_addresses(self):
+        pools = [netaddr.IPRange('10.0.0.2', '10.0.0.4'),
+                 netaddr.IPRange('10.0.0.8', '10.0.0.9')]
+        for start, expected in [(0, [2, 3, 4, 8, 9]),
+                                (1, [3, 4, 8, 9, 2]),
+                                (3, [8, 9, 2, 3, 4]),
+                                (4, [9, 2, 3, 4, 8])]:
+            addresses = ipam.RandomIpamDriver._iter_pools_addresses(pools,
+                                                                    start)
+            self.assertEqual(['10.0.0.%d' % i for i in expected],
+                             [str(address) for address in addresses])
+
+    def test_iter_pools_addresses_of_large_pool(self):
+        pools = [netaddr.IPRange('fe80::', 'fe80::ffff:ffff:ffff:ffff')]
+        addresses = ipam.RandomIpamDriver._iter_pools_addresses(pools,
+                                                                2 ** 63)
+        self.assertEqual('fe80::8000:0:0:0', str(next(addresses)))
+
+    def _conflicting_generate_ip(self, allocated):
+        # The first address picked is the one of another port, as if both
+        # ports had picked it concurrently
+        generate_ip = ipam.RandomIpamDriver.generate_ip
+        conflicts = [allocated]
+
+        def _generate_ip(driver, context, subnets):
+            if conflicts:
+                return conflicts.pop()
+            return generate_ip(driver, context, subnets)
+        return mock.patch.object(ipam.RandomIpamDriver, 'generate_ip',
+                                 autospec=True, side_effect=_generate_ip)
+
+    def test_create_port_retries_duplicate_allocations(self):
+        with self.subnet() as subnet:
+            with self.port(subnet=subnet) as port:
+                allocated = port['port']['fixed_ips'][0]
+                with self._conflicting_generate_ip(allocated) as generate_ip:
+                    with self.port(subnet=subnet) as port2:
+                        ips = port2['port']['fixed_ips']
+                        self.assertEqual(1, len(ips))
+                        self.assertNotEqual(allocated['ip_address'],
+                                            ips[0]['ip_address'])
+                self.assertEqual(2, generate_ip.call_count)
+
+    def test_create_ports_bulk_retries_duplicate_allocations(self):
+        with self.subnet() as subnet:
+            with self.port(subnet=subnet) as port:
+                allocated = port['port']['fixed_ips'][0]
+                with self._conflicting_generate_ip(allocated):
+                    res = self._create_port_bulk(
+                        self.fmt, 2, subnet['subnet']['network_id'],
+                        'test', True)
+                self.assertEqual(res.status_int, webob.exc.HTTPCreated.code)
+                ports = self.deserialize(self.fmt, res)['ports']
+                ips = [p['fixed_ips'][0]['ip_address'] for p in ports]
+                self.assertEqual(2, len(set(ips)))
+                self.assertNotIn(allocated['ip_address'], ips)
+                for p in ports:
+                    self._delete('ports', p['id'])
+
+    def test_retried_create_port_keeps_signature(self):
+        # The Cisco plugin inspects the arguments of create_port
+        plugin = NeutronManager.get_plugin()
+        for method in (plugin.create_port, plugin.create_port_bulk):
+            argspec = inspect.getargspec(method)
+            self.assertEqual(3, len(argspec.args))
+            self.assertIsNone(argspec.varargs)
+            self.assertIsNone(argspec.keywords)
+
+    def test_create_port_in_transaction_is_not_retried(self):
+        plugin = NeutronManager.get_plugin()
+        ctx = context.get_admin_context()
+        with self.subnet() as subnet:
+            with self.port(subnet=subnet) as port:
+                allocated = port['port']['fixed_ips'][0]
+                port_data = {'port': {
+                    'network_id': subnet['subnet']['network_id'],
+                    'tenant_id': subnet['subnet']['tenant_id'],
+                    'name': '', 'admin_state_up': True,
+                    'device_id': '', 'device_owner': '',
+                    'mac_address': ATTR_NOT_SPECIFIED,
+                    'fixed_ips': ATTR_NOT_SPECIFIED}}
+
+                def _create_port_in_transaction():
+                    with ctx.session.begin():
+                        plugin.create_port(ctx, port_data)
+                with self._conflicting_generate_ip(allocated) as generate_ip:
+                    self.assertRaises(db_exc.DBDuplicateEntry,
+                                      _create_port_in_transaction)
+                self.assertEqual(1, generate_ip.call_count)
+
+
+class TestListQueryCount(NeutronDbPluginV2TestCase):
+
+    def _list_query_count(self, resource, count):
+        dialect = db.get_session().get_bind().dialect
+        with contextlib.nested(
+            mock.patch.object(dialect, 'do_execute',
+                              wraps=dialect.do_execute),
+            mock.patch.object(dialect, 'do_execute_no_params',
+                              wraps=dialect.do_execute_no_params)
+        ) as (execute, execute_no_params):
+            res = self._list(resource)
+        self.assertEqual(count, len(res[resource]))
+        return execute.call_count + execute_no_params.call_count
+
+    def test_list_ports_query_count(self):
+        cfg.CONF.set_override('quota_port', -1, group='QUOTAS')
+        network = self._make_network(self.fmt, 'net1', True)
+        self._make_subnet(self.fmt, network, '10.0.0.1', '10.0.0.0/21')
+        net_id = network['network']['id']
+        self._create_port(self.fmt, net_id)
+        query_count = self._list_query_count('ports', 1)
+        res = self._create_port_bulk(self.fmt, 999, net_id, 'port', True)
+        self.assertEqual(res.status_int, webob.exc.HTTPCreated.code)
+        self.assertEqual(query_count, self._list_query_count('ports', 1000))
+
+    def test_list_networks_query_count(self):
+        network = self._make_network(self.fmt, 'net1', True)
+        self._make_subnet(self.fmt, network, '10.0.0.1', '10.0.0.0/24')
+        query_count = self._list_query_count('networks', 1)
+        for i in range(1, 5):
+            network = self._make_network(self.fmt, 'net1', True)
+            self._make_subnet(self.fmt, network, '10.0.%d.1' % i,
+                              '10.0.%d.0/24' % i)
+        self.assertEqual(query_count, self._list_query_count('networks', 5))
+
+    def test_list_subnets_query_count(self):
+        network = self._make_network(self.fmt, 'net1', True)
+        self._make_subnet(self.fmt, network, '10.0.0.1', '10.0.0.0/24',
+                          dns_nameservers=['1.2.3.4'],
+                          host_routes=[{'destination': '12.0.0.0/8',
+                                        'nexthop': '10.0.0.5'}])
+        query_count = self._list_query_count('subnets', 1)
+        for i in range(1, 5):
+            self._make_subnet(self.fmt, network, '10.0.%d.1' % i,
+                              '10.0.%d.0/24' % i,
+                              dns_nameservers=['1.2.3.4'],
+                              host_routes=[{'destination': '12.0.0.0/8',
+                                            'nexthop': '10.0.%d.5' % i}])
+        self.assertEqual(query_count, self._list_query_count('subnets', 5))
+
+
+class TestListFields(NeutronDbPluginV2TestCase):
+
+    def _list_statements(self, resource, query_params):
+        dialect = db.get_session().get_bind().dialect
+        with contextlib.nested(
+            mock.patch.object(dialect, 'do_execute',
+                              wraps=dialect.do_execute),
+            mock.patch.object(dialect, 'do_execute_no_params',
+                              wraps=dialect.do_execute_no_params)
+        ) as (execute, execute_no_params):
+            res = self._list(resource, query_params=query_params)
+        calls = execute.call_args_list + execute_no_params.call_args_list
+        statements = [call[0][1] for call in calls]
+        return res[resource], statements
+
+    def test_list_ports_with_fields(self):
+        with self.port() as port:
+            ports, statements = self._list_statements(
+                'ports', 'fields=id&fields=device_id')
+            self.assertEqual([{'id': port['port']['id'],
+                               'device_id': port['port']['device_id']}],
+                             ports)
+            self.assertFalse([s for s in statements if 'ipallocations' in s])
+
+    def test_list_ports_with_fixed_ips_field(self):
+        with self.port() as port:
+            ports, statements = self._list_statements(
+                'ports', 'fields=id&fields=fixed_ips')
+            self.assertEqual([{'id': port['port']['id'],
+                               'fixed_ips': port['port']['fixed_ips']}],
+                             ports)
+            self.assertTrue([s for s in statements if 'ipallocations' in s])
+
+    def test_list_networks_with_fields(self):
+        with self.subnet() as subnet:
+            networks, statements = self._list_statements('networks',
+                                                         'fields=id')
+            self.assertEqual([{'id': subnet['subnet']['network_id']}],
+                             networks)
+            self.assertFalse([s for s in statements if 'FROM subnets' in s])
+
+    def test_list_subnets_with_fields(self):
+        with self.subnet(dns_nameservers=['1.2.3.4']) as subnet:
+            subnets, statements = self._list_statements(
+                'subnets', 'fields=id&fields=cidr')
+            self.assertEqual([{'id': subnet['subnet']['id'],
+                               'cidr': subnet['subnet']['cidr']}],
+                             subnets)
+            self.assertFalse([s for s in statements
+                              if 'dnsnameservers' in s or
+                              'ipallocationpools' in s])
+
+    def test_dict_extend_functions_skipped_for_unrequested_fields(self):
+        plugin = NeutronManager.get_plugin()
+        func = mock.Mock()
+        with contextlib.nested(
+            mock.patch.dict(plugin._dict_extend_functions, {'fake': [func]}),
+            mock.patch.dict(plugin._dict_extend_attributes,
+                            {func: frozenset(['foo'])})):
+            plugin._apply_dict_extend_functions('fake', {}, None, ['id'])
+            self.assertFalse(func.called)
+            plugin._apply_dict_extend_functions('fake', {}, None,
+                                                ['id', 'foo'])
+            func.assert_called_once_with(plugin, {}, None)
+
+
 class DbModelTestCase(base.BaseTestCase):
     """DB model tests."""
     def test_repr(self):
@@ -49,6 +49,36 @@ class TestDhcpRpcCallackMixin(base.BaseTestCase):
 
         self.assertEqual(len(self.log.mock_calls), 1)
 
+    def _test_get_active_networks_info(self, **kwargs):
+        self.plugin.get_networks.return_value = [dict(id='a'), dict(id='b')]
+        self.plugin.get_subnets.return_value = [dict(id='s1', network_id='b')]
+        self.plugin.get_ports.return_value = [dict(id='p1', network_id='a'),
+                                              dict(id='p2', network_id='b')]
+
+        networks = self.callbacks.get_active_networks_info(
+            mock.Mock(), host='host', **kwargs)
+
+        self.assertEqual(networks,
+                         [dict(id='a', subnets=[],
+                               ports=[dict(id='p1', network_id='a')]),
+                          dict(id='b',
+                               subnets=[dict(id='s1', network_id='b')],
+                               ports=[dict(id='p2', network_id='b')])])
+        self.plugin.get_subnets.assert_called_once_with(
+            mock.ANY, filters=dict(network_id=mock.ANY, enable_dhcp=[True]))
+        filters = self.plugin.get_ports.call_args[1]['filters']
+        self.assertEqual(sorted(filters['network_id']), ['a', 'b'])
+
+    def test_get_active_networks_info(self):
+        self._test_get_active_networks_info()
+        self.plugin.get_networks.assert_called_once_with(
+            mock.ANY, filters=dict(admin_state_up=[True]))
+
+    def test_get_active_networks_info_of_networks(self):
+        self._test_get_active_networks_info(network_ids=['a', 'b'])
+        self.plugin.get_networks.assert_called_once_with(
+            mock.ANY, filters=dict(id=['a', 'b'], admin_state_up=[True]))
+
     def test_get_network_info(self):
         network_retval = dict(id='a')
 
@@ -34,6 +34,7 @@ from neutron.agent.linux import interface
 from neutron.common import constants
 from neutron.common import exceptions
 from neutron.openstack.common import jsonutils
+from neutron.openstack.common.rpc import common as rpc_common
 from neutron.tests import base
 
 
@@ -280,28 +281,35 @@ class TestDhcpAgent(base.BaseTestCase):
     def _test_sync_state_helper(self, known_networks, active_networks):
         with mock.patch('neutron.agent.dhcp_agent.DhcpPluginApi') as plug:
             mock_plugin = mock.Mock()
-            mock_plugin.get_active_networks_info.return_value = active_networks
+            mock_plugin.get_active_networks.return_value = active_networks
+            mock_plugin.get_active_networks_info.side_effect = (
+                lambda network_ids: [FakeModel(network_id)
+                                     for network_id in network_ids])
             plug.return_value = mock_plugin
 
             dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
 
             attrs_to_mock = dict(
                 [(a, mock.DEFAULT) for a in
-                 ['refresh_dhcp_helper', 'disable_dhcp_helper', 'cache']])
+                 ['configure_dhcp_for_network', 'disable_dhcp_helper',
+                  'cache']])
 
             with mock.patch.multiple(dhcp, **attrs_to_mock) as mocks:
                 mocks['cache'].get_network_ids.return_value = known_networks
                 dhcp.sync_state()
 
-                exp_refresh = [
-                    mock.call(net_id) for net_id in active_networks]
+                configure = mocks['configure_dhcp_for_network']
+                configured = [args[0].id
+                              for args, kwargs in configure.call_args_list]
+                self.assertEqual(configured, active_networks)
 
                 diff = set(known_networks) - set(active_networks)
                 exp_disable = [mock.call(net_id) for net_id in diff]
 
                 mocks['cache'].assert_has_calls([mock.call.get_network_ids()])
-                mocks['refresh_dhcp_helper'].assert_has_called(exp_refresh)
-                mocks['disable_dhcp_helper'].assert_has_called(exp_disable)
+                mocks['disable_dhcp_helper'].assert_has_calls(exp_disable)
+                self.assertFalse(dhcp.needs_resync)
+            return mock_plugin
 
     def test_sync_state_initial(self):
         self._test_sync_state_helper([], ['a'])
@@ -312,10 +320,34 @@ class TestDhcpAgent(base.BaseTestCase):
     def test_sync_state_disabled_net(self):
         self._test_sync_state_helper(['b'], ['a'])
 
+    def test_sync_state_pages(self):
+        cfg.CONF.set_override('sync_networks_per_request', 2)
+        plugin = self._test_sync_state_helper([], ['a', 'b', 'c'])
+        plugin.get_active_networks_info.assert_has_calls(
+            [mock.call(['a', 'b']), mock.call(['c'])])
+
+    def test_sync_state_without_pages(self):
+        cfg.CONF.set_override('sync_networks_per_request', 2)
+        with mock.patch('neutron.agent.dhcp_agent.DhcpPluginApi') as plug:
+            mock_plugin = mock.Mock()
+            mock_plugin.get_active_networks.return_value = ['a', 'b', 'c']
+            mock_plugin.get_active_networks_info.side_effect = [
+                None, [FakeModel('a'), FakeModel('b'), FakeModel('c')]]
+            plug.return_value = mock_plugin
+            dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+            with mock.patch.object(dhcp,
+                                   'configure_dhcp_for_network') as configure:
+                dhcp.sync_state()
+        mock_plugin.get_active_networks_info.assert_has_calls(
+            [mock.call(['a', 'b']), mock.call()])
+        self.assertEqual([args[0].id for args, kwargs in
+                          configure.call_args_list], ['a', 'b', 'c'])
+        self.assertFalse(dhcp.needs_resync)
+
     def test_sync_state_plugin_error(self):
         with mock.patch('neutron.agent.dhcp_agent.DhcpPluginApi') as plug:
             mock_plugin = mock.Mock()
-            mock_plugin.get_active_networks_info.side_effect = Exception
+            mock_plugin.get_active_networks.side_effect = Exception
             plug.return_value = mock_plugin
 
             with mock.patch.object(dhcp_agent.LOG, 'exception') as log:
@@ -754,26 +786,30 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
     def test_port_update_end(self):
         payload = dict(port=vars(fake_port2))
         self.cache.get_network_by_id.return_value = fake_network
-        self.dhcp.port_update_end(None, payload)
+        with mock.patch.object(self.dhcp,
+                               'schedule_reload_allocations') as reload:
+            self.dhcp.port_update_end(None, payload)
         self.cache.assert_has_calls(
             [mock.call.get_network_by_id(fake_port2.network_id),
              mock.call.put_port(mock.ANY)])
-        self.call_driver.assert_called_once_with('reload_allocations',
-                                                 fake_network)
+        reload.assert_called_once_with(fake_network.id)
+        self.assertFalse(self.call_driver.called)
 
     def test_port_delete_end(self):
         payload = dict(port_id=fake_port2.id)
         self.cache.get_network_by_id.return_value = fake_network
         self.cache.get_port_by_id.return_value = fake_port2
 
-        self.dhcp.port_delete_end(None, payload)
+        with mock.patch.object(self.dhcp,
+                               'schedule_reload_allocations') as reload:
+            self.dhcp.port_delete_end(None, payload)
 
         self.cache.assert_has_calls(
             [mock.call.get_port_by_id(fake_port2.id),
              mock.call.get_network_by_id(fake_network.id),
              mock.call.remove_port(fake_port2)])
-        self.call_driver.assert_called_once_with('reload_allocations',
-                                                 fake_network)
+        reload.assert_called_once_with(fake_network.id)
+        self.assertFalse(self.call_driver.called)
 
     def test_port_delete_end_unknown_port(self):
         payload = dict(port_id='unknown')
@@ -784,6 +820,71 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.cache.assert_has_calls([mock.call.get_port_by_id('unknown')])
         self.assertEqual(self.call_driver.call_count, 0)
 
+    def test_schedule_reload_allocations_coalesces_notifications(self):
+        with mock.patch('eventlet.spawn_after') as spawn_after:
+            self.dhcp.schedule_reload_allocations(fake_network.id)
+            self.dhcp.schedule_reload_allocations(fake_network.id)
+        spawn_after.assert_called_once_with(
+            cfg.CONF.reload_allocations_delay, self.dhcp.reload_pool.spawn_n,
+            self.dhcp._reload_allocations, fake_network.id)
+
+    def test_schedule_reload_allocations_of_networks(self):
+        with mock.patch('eventlet.spawn_after') as spawn_after:
+            self.dhcp.schedule_reload_allocations(fake_network.id)
+            self.dhcp.schedule_reload_allocations('other-net-id')
+        self.assertEqual(spawn_after.call_count, 2)
+
+    def test_reload_allocations(self):
+        cfg.CONF.set_override('reload_allocations_delay', 0)
+        self.cache.get_network_by_id.return_value = fake_network
+        self.dhcp.schedule_reload_allocations(fake_network.id)
+        self.dhcp.schedule_reload_allocations(fake_network.id)
+        eventlet.sleep(0)
+        self.dhcp.reload_pool.waitall()
+        self.cache.get_network_by_id.assert_called_once_with(fake_network.id)
+        self.call_driver.assert_called_once_with('reload_allocations',
+                                                 fake_network)
+        self.assertFalse(self.dhcp.pending_reloads)
+
+    def test_reload_allocations_of_removed_network(self):
+        self.cache.get_network_by_id.return_value = None
+        self.dhcp.pending_reloads.add(fake_network.id)
+        self.dhcp._reload_allocations(fake_network.id)
+        self.assertFalse(self.call_driver.called)
+        self.assertFalse(self.dhcp.pending_reloads)
+
+    def test_reload_allocations_waits_for_network_lock(self):
+        self.cache.get_network_by_id.return_value = fake_network
+        lock = self.dhcp._network_lock(fake_network.id)
+        with lock:
+            reload = eventlet.spawn(self.dhcp._reload_allocations,
+                                    fake_network.id)
+            eventlet.sleep(0)
+            self.assertFalse(self.call_driver.called)
+            # The network is disabled while the reload waits
+            self.cache.get_network_by_id.return_value = None
+        reload.wait()
+        self.assertFalse(self.call_driver.called)
+
+    def test_reload_allocations_of_other_network_is_not_blocked(self):
+        self.cache.get_network_by_id.return_value = fake_network
+        with self.dhcp._network_lock('other-net-id'):
+            self.dhcp._reload_allocations(fake_network.id)
+        self.call_driver.assert_called_once_with('reload_allocations',
+                                                 fake_network)
+
+    def test_disable_dhcp_helper_takes_network_lock(self):
+        self.cache.get_network_by_id.return_value = fake_network
+        lock = self.dhcp._network_lock(fake_network.id)
+
+        def call_driver(action, network):
+            self.assertTrue(lock.locked())
+            return True
+        self.call_driver.side_effect = call_driver
+        self.dhcp.disable_dhcp_helper(fake_network.id)
+        self.call_driver.assert_called_once_with('disable', fake_network)
+        self.assertFalse(lock.locked())
+
 
 class TestDhcpPluginApiProxy(base.BaseTestCase):
     def setUp(self):
@@ -825,6 +926,34 @@ class TestDhcpPluginApiProxy(base.BaseTestCase):
         self.make_msg.assert_called_once_with('get_active_networks_info',
                                               host='foo')
 
+    def test_get_active_networks_info_of_networks(self):
+        self.proxy.get_active_networks_info(['a', 'b'])
+        self.make_msg.assert_called_once_with('get_active_networks_info',
+                                              network_ids=['a', 'b'],
+                                              host='foo')
+        self.call.assert_called_once_with(mock.ANY, self.make_msg.return_value,
+                                          topic='foo', version='1.5')
+
+    def test_get_active_networks_info_of_networks_unsupported(self):
+        self.call.side_effect = rpc_common.RemoteError(
+            exc_type='UnsupportedRpcVersion')
+        self.assertIsNone(self.proxy.get_active_networks_info(['a']))
+        self.assertIsNone(self.proxy.get_active_networks_info(['b']))
+        self.assertEqual(self.call.call_count, 1)
+        self.assertFalse(self.proxy.networks_info_by_ids_supported)
+
+    def test_get_active_networks_info_of_networks_remote_error(self):
+        self.call.side_effect = rpc_common.RemoteError(exc_type='Exception')
+        self.assertRaises(rpc_common.RemoteError,
+                          self.proxy.get_active_networks_info, ['a'])
+        self.assertTrue(self.proxy.networks_info_by_ids_supported)
+
+    def test_get_active_networks(self):
+        self.call.return_value = ['a', 'b']
+        self.assertEqual(self.proxy.get_active_networks(), ['a', 'b'])
+        self.make_msg.assert_called_once_with('get_active_networks',
+                                              host='foo')
+
     def test_create_dhcp_port(self):
         port_body = (
             {'port':
@@ -983,6 +1112,35 @@ class TestNetworkCache(base.BaseTestCase):
         nc.put(fake_network)
         self.assertEqual(nc.get_port_by_id(fake_port1.id), fake_port1)
 
+    def test_put_port_replaces_port_with_same_mac(self):
+        fake_network = FakeModel('12345678-1234-5678-1234567890ab',
+                                 tenant_id='aaaaaaaa-aaaa-aaaa-aaaaaaaaaaaa',
+                                 subnets=[fake_subnet1],
+                                 ports=[fake_port1])
+        new_port = FakeModel('12345678-1234-aaaa-123456789001',
+                             mac_address=fake_port1.mac_address,
+                             network_id=fake_network.id)
+        nc = dhcp_agent.NetworkCache()
+        nc.put(fake_network)
+        nc.put_port(new_port)
+        self.assertEqual(fake_network.ports, [new_port])
+        self.assertEqual(nc.port_lookup, {new_port.id: fake_network.id})
+        self.assertIsNone(nc.get_port_by_id(fake_port1.id))
+
+    def test_remove_port_keeps_other_ports_indexed(self):
+        fake_network = FakeModel('12345678-1234-5678-1234567890ab',
+                                 tenant_id='aaaaaaaa-aaaa-aaaa-aaaaaaaaaaaa',
+                                 subnets=[fake_subnet1],
+                                 ports=[fake_port1, fake_port2])
+        nc = dhcp_agent.NetworkCache()
+        nc.put(fake_network)
+        nc.remove_port(fake_port1)
+        self.assertEqual(fake_network.ports, [fake_port2])
+        self.assertEqual(nc.get_port_by_id(fake_port2.id), fake_port2)
+        nc.put_port(fake_port1)
+        self.assertEqual(fake_network.ports, [fake_port2, fake_port1])
+        self.assertEqual(nc.get_port_by_id(fake_port1.id), fake_port1)
+
 
 class FakePort1:
     id = 'eeeeeeee-eeee-eeee-eeee-eeeeeeeeeeee'
@@ -0,0 +1,76 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright 2013 OpenStack Foundation.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron.agent.linux import ipset_manager
+from neutron.tests import base
+
+FAKE_SG_ID = '6f0e4f6c-0c8b-4bfa-9c2c-8a4ea2fc1a17'
+
+
+class IpsetManagerTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IpsetManagerTestCase, self).setUp()
+        self.execute = mock.Mock()
+        self.ipset = ipset_manager.IpsetManager(_execute=self.execute,
+                                                root_helper='sudo')
+        self.set_name = ipset_manager.get_set_name(FAKE_SG_ID, 'IPv4')
+
+    def _assert_restored(self, *lines):
+        self.execute.assert_called_once_with(
+            ['ipset', 'restore', '-exist'],
+            process_input='\n'.join(lines) + '\n',
+            root_helper='sudo')
+
+    def test_get_set_name_is_truncated(self):
+        self.assertEqual('NIPv46f0e4f6c-0c8b-4bfa-9c2c-8a', self.set_name)
+        self.assertEqual(ipset_manager.MAX_SET_NAME_LEN, len(self.set_name))
+
+    def test_set_members_creates_set(self):
+        name = self.ipset.set_members(FAKE_SG_ID, 'IPv6',
+                                      ['fe80::2', 'fe80::1'])
+        self._assert_restored('create %s hash:ip family inet6' % name,
+                              'flush %s' % name,
+                              'add %s fe80::1' % name,
+                              'add %s fe80::2' % name)
+
+    def test_set_members_only_sends_changes(self):
+        self.ipset.set_members(FAKE_SG_ID, 'IPv4', ['10.0.0.1', '10.0.0.2'])
+        self.execute.reset_mock()
+        self.ipset.set_members(FAKE_SG_ID, 'IPv4', ['10.0.0.2', '10.0.0.3'])
+        self._assert_restored('add %s 10.0.0.3' % self.set_name,
+                              'del %s 10.0.0.1' % self.set_name)
+
+    def test_set_members_without_changes(self):
+        self.ipset.set_members(FAKE_SG_ID, 'IPv4', ['10.0.0.1'])
+        self.execute.reset_mock()
+        self.ipset.set_members(FAKE_SG_ID, 'IPv4', ['10.0.0.1'])
+        self.assertFalse(self.execute.called)
+
+    def test_destroy(self):
+        self.ipset.set_members(FAKE_SG_ID, 'IPv4', [])
+        self.execute.reset_mock()
+        self.ipset.destroy(FAKE_SG_ID, 'IPv4')
+        self.execute.assert_called_once_with(['ipset', 'destroy',
+                                              self.set_name],
+                                             root_helper='sudo')
+        self.assertEqual({}, self.ipset.sets)
+
+    def test_destroy_unknown_set(self):
+        self.ipset.destroy(FAKE_SG_ID, 'IPv4')
+        self.assertFalse(self.execute.called)
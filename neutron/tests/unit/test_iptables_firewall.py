@@ -130,6 +130,35 @@ class IptablesFirewallTestCase(base.BaseTestCase):
         egress = None
         self._test_prepare_port_filter(rule, ingress, egress)
 
+    def test_filter_ipv4_ingress_remote_group(self):
+        self.firewall.update_security_group_members(
+            'fake_sgid', {'IPv4': ['10.0.0.2'], 'IPv6': []})
+        rule = {'ethertype': 'IPv4',
+                'direction': 'ingress',
+                'remote_group_id': 'fake_sgid'}
+        ingress = call.add_rule('ifake_dev',
+                                '-m set --match-set NIPv4fake_sgid src '
+                                '-j RETURN')
+        egress = None
+        self._test_prepare_port_filter(rule, ingress, egress)
+        self.utils_exec.assert_called_once_with(
+            ['ipset', 'restore', '-exist'],
+            process_input=('create NIPv4fake_sgid hash:ip family inet\n'
+                           'flush NIPv4fake_sgid\n'
+                           'add NIPv4fake_sgid 10.0.0.2\n'),
+            root_helper='sudo')
+
+    def test_filter_ipv4_ingress_expanded_remote_group(self):
+        prefix = FAKE_PREFIX['IPv4']
+        rule = {'ethertype': 'IPv4',
+                'direction': 'ingress',
+                'remote_group_id': 'fake_sgid',
+                'source_ip_prefix': prefix}
+        ingress = call.add_rule('ifake_dev', '-s %s -j RETURN' % prefix)
+        egress = None
+        self._test_prepare_port_filter(rule, ingress, egress)
+        self.assertFalse(self.utils_exec.called)
+
     def test_filter_ipv4_ingress_tcp(self):
         rule = {'ethertype': 'IPv4',
                 'direction': 'ingress',
@@ -914,6 +943,39 @@ class IptablesFirewallTestCase(base.BaseTestCase):
 
         self.v4filter_inst.assert_has_calls(calls)
 
+    def test_update_security_group_members_updates_used_ipset(self):
+        port = self._fake_port()
+        port['security_group_rules'] = [{'ethertype': 'IPv4',
+                                         'direction': 'egress',
+                                         'remote_group_id': 'fake_sgid'}]
+        self.firewall.prepare_port_filter(port)
+        self.utils_exec.reset_mock()
+        self.v4filter_inst.reset_mock()
+        self.firewall.update_security_group_members(
+            'fake_sgid', {'IPv4': ['10.0.0.2'], 'IPv6': ['fe80::2']})
+        # Only the set of the referenced ethertype exists
+        self.utils_exec.assert_called_once_with(
+            ['ipset', 'restore', '-exist'],
+            process_input='add NIPv4fake_sgid 10.0.0.2\n',
+            root_helper='sudo')
+        # The chains of the port are left untouched
+        self.assertFalse(self.v4filter_inst.method_calls)
+
+    def test_remove_port_filter_destroys_unused_ipset(self):
+        port = self._fake_port()
+        port['security_group_rules'] = [{'ethertype': 'IPv4',
+                                         'direction': 'egress',
+                                         'remote_group_id': 'fake_sgid'}]
+        with self.firewall.defer_apply():
+            self.firewall.prepare_port_filter(port)
+        self.assertIn(('fake_sgid', 'IPv4'), self.firewall.ipset.sets)
+        self.utils_exec.reset_mock()
+        with self.firewall.defer_apply():
+            self.firewall.remove_port_filter(port)
+        self.utils_exec.assert_called_once_with(
+            ['ipset', 'destroy', 'NIPv4fake_sgid'], root_helper='sudo')
+        self.assertEqual({}, self.firewall.ipset.sets)
+
     def test_remove_unknown_port(self):
         port = self._fake_port()
         self.firewall.remove_port_filter(port)
@@ -265,6 +265,45 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
         self.iptables.apply()
         self.mox.VerifyAll()
 
+    def test_modify_rules_preserves_counters_and_drops_duplicates(self):
+        current_lines = ('# Generated by iptables-save\n'
+                         '*filter\n'
+                         ':INPUT ACCEPT [10:100]\n'
+                         ':neutron-filter-top - [0:0]\n'
+                         ':%(bn)s-INPUT - [0:0]\n'
+                         ':%(bn)s-stale - [0:0]\n'
+                         '[7:70] -A INPUT -j %(bn)s-INPUT\n'
+                         '[3:30] -A %(bn)s-INPUT -s 1.2.3.4 -j DROP\n'
+                         '[4:40] -A %(bn)s-stale -j DROP\n'
+                         '[1:1] -A foreign -j ACCEPT\n'
+                         '[2:2] -A foreign -j ACCEPT\n'
+                         'COMMIT\n'
+                         '# Completed by iptables-save' % IPTABLES_ARG)
+        expected = ('# Generated by iptables-save\n'
+                    '*filter\n'
+                    ':INPUT ACCEPT [10:100]\n'
+                    ':neutron-filter-top - [0:0]\n'
+                    ':%(bn)s-FORWARD - [0:0]\n'
+                    ':%(bn)s-INPUT - [0:0]\n'
+                    ':%(bn)s-local - [0:0]\n'
+                    ':%(bn)s-OUTPUT - [0:0]\n'
+                    '[0:0] -A FORWARD -j neutron-filter-top\n'
+                    '[0:0] -A OUTPUT -j neutron-filter-top\n'
+                    '[0:0] -A neutron-filter-top -j %(bn)s-local\n'
+                    '[7:70] -A INPUT -j %(bn)s-INPUT\n'
+                    '[0:0] -A OUTPUT -j %(bn)s-OUTPUT\n'
+                    '[0:0] -A FORWARD -j %(bn)s-FORWARD\n'
+                    '[3:30] -A %(bn)s-INPUT -s 1.2.3.4 -j DROP\n'
+                    '[2:2] -A foreign -j ACCEPT\n'
+                    'COMMIT\n'
+                    '# Completed by iptables-save' % IPTABLES_ARG)
+
+        table = self.iptables.ipv4['filter']
+        table.add_rule('INPUT', '-s 1.2.3.4 -j DROP')
+        new_lines = self.iptables._modify_rules(current_lines.split('\n'),
+                                                table, 'filter')
+        self.assertEqual(expected.split('\n'), new_lines)
+
     def test_add_rule_to_a_nonexistent_chain(self):
         self.assertRaises(LookupError, self.iptables.ipv4['filter'].add_rule,
                           'nonexistent', '-j DROP')
@@ -297,3 +336,110 @@ class IptablesManagerStateLessTestCase(base.BaseTestCase):
 
     def test_nat_not_found(self):
         self.assertFalse('nat' in self.iptables.ipv4)
+
+
+class IptablesManagerIncrementalTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IptablesManagerIncrementalTestCase, self).setUp()
+        self.mox = mox.Mox()
+        self.root_helper = 'sudo'
+        self.iptables = (iptables_manager.
+                         IptablesManager(root_helper=self.root_helper,
+                                         incremental_apply=True))
+        self.mox.StubOutWithMock(self.iptables, "execute")
+        self.addCleanup(self.mox.UnsetStubs)
+
+    def _expect_full_apply(self):
+        self.iptables.execute(['iptables-save', '-c'],
+                              root_helper=self.root_helper).AndReturn('')
+        self.iptables.execute(['iptables-restore', '-c'],
+                              process_input=mox.IgnoreArg(),
+                              root_helper=self.root_helper).AndReturn(None)
+
+    def _expect_incremental_apply(self, process_input):
+        process_input = process_input % IPTABLES_ARG
+        return self.iptables.execute(['iptables-restore', '--noflush'],
+                                     process_input=process_input,
+                                     root_helper=self.root_helper)
+
+    def test_apply_without_changes_is_skipped(self):
+        self._expect_full_apply()
+        self.mox.ReplayAll()
+
+        self.iptables.apply()
+        self.iptables.apply()
+        self.mox.VerifyAll()
+
+    def test_add_and_remove_wrapped_chain(self):
+        self._expect_full_apply()
+        self._expect_incremental_apply(
+            '*filter\n'
+            ':%(bn)s-filter - [0:0]\n'
+            '-F %(bn)s-INPUT\n'
+            '-A %(bn)s-filter -j DROP\n'
+            '-A %(bn)s-INPUT -s 0/0 -d 192.168.0.2 -j %(bn)s-filter\n'
+            'COMMIT').AndReturn(None)
+        self._expect_incremental_apply(
+            '*filter\n'
+            '-F %(bn)s-INPUT\n'
+            '-F %(bn)s-filter\n'
+            '-X %(bn)s-filter\n'
+            'COMMIT').AndReturn(None)
+        self.mox.ReplayAll()
+
+        self.iptables.apply()
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.iptables.ipv4['filter'].add_rule('filter', '-j DROP')
+        self.iptables.ipv4['filter'].add_rule('INPUT',
+                                              '-s 0/0 -d 192.168.0.2 -j'
+                                              ' $filter')
+        self.iptables.apply()
+
+        self.iptables.ipv4['filter'].remove_chain('filter')
+        self.iptables.apply()
+        self.mox.VerifyAll()
+
+    def test_recreated_chain_is_only_flushed(self):
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.iptables.ipv4['filter'].add_rule('filter', '-j DROP')
+        self._expect_full_apply()
+        self._expect_incremental_apply(
+            '*filter\n'
+            '-F %(bn)s-filter\n'
+            '-A %(bn)s-filter -j ACCEPT\n'
+            'COMMIT').AndReturn(None)
+        self.mox.ReplayAll()
+
+        self.iptables.apply()
+        self.iptables.ipv4['filter'].remove_chain('filter')
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.iptables.ipv4['filter'].add_rule('filter', '-j ACCEPT')
+        self.iptables.apply()
+        self.mox.VerifyAll()
+
+    def test_unwrapped_change_triggers_full_apply(self):
+        self._expect_full_apply()
+        self._expect_full_apply()
+        self.mox.ReplayAll()
+
+        self.iptables.apply()
+        self.iptables.ipv4['filter'].add_rule('FORWARD', '-j DROP',
+                                              wrap=False)
+        self.iptables.apply()
+        self.mox.VerifyAll()
+
+    def test_failed_incremental_apply_falls_back_to_full_apply(self):
+        self._expect_full_apply()
+        self._expect_incremental_apply(
+            '*filter\n'
+            '-F %(bn)s-local\n'
+            '-A %(bn)s-local -j DROP\n'
+            'COMMIT').AndRaise(RuntimeError())
+        self._expect_full_apply()
+        self.mox.ReplayAll()
+
+        self.iptables.apply()
+        self.iptables.ipv4['filter'].add_rule('local', '-j DROP')
+        self.iptables.apply()
+        self.mox.VerifyAll()
@@ -16,6 +16,7 @@
 #    under the License.
 
 import copy
+import time
 
 import mock
 from oslo.config import cfg
@@ -25,6 +26,8 @@ from neutron.agent import l3_agent
 from neutron.agent.linux import interface
 from neutron.common import config as base_config
 from neutron.common import constants as l3_constants
+from neutron.openstack.common import context
+from neutron.openstack.common.rpc import common as rpc_common
 from neutron.openstack.common import uuidutils
 from neutron.tests import base
 
@@ -498,40 +501,130 @@ class TestBasicRouterOperations(base.BaseTestCase):
         self.assertEqual(len(nat_rules_delta), 1)
         self._verify_snat_rules(nat_rules_delta, router, negate=True)
 
+    def _make_floating_ip(self, address, port_id=None):
+        return {'id': _uuid(),
+                'floating_ip_address': address,
+                'fixed_ip_address': '35.4.0.10',
+                'port_id': port_id or _uuid()}
+
+    def test_process_router_unchanged_executes_nothing(self):
+        self.conf.set_override('iptables_incremental_apply', True)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = self._prepare_router_data(num_internal_ports=2)
+        router[l3_constants.FLOATINGIP_KEY] = [
+            self._make_floating_ip('19.4.4.10')]
+        agent._router_added(router['id'], router)
+        ri = agent.router_info[router['id']]
+        self.assertTrue(ri.iptables_manager.incremental_apply)
+        agent.process_router(ri)
+        self.utils_exec.reset_mock()
+        self.mock_ip.reset_mock()
+        self.mock_driver.reset_mock()
+
+        ri.router = copy.deepcopy(router)
+        agent.process_router(ri)
+        self.assertFalse(self.utils_exec.called)
+        self.assertFalse(self.mock_ip.mock_calls)
+        self.assertFalse(self.mock_driver.mock_calls)
+
+    def test_process_router_snat_rules_not_rebuilt(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = self._prepare_router_data()
+        ri = l3_agent.RouterInfo(router['id'], self.conf.root_helper,
+                                 self.conf.use_namespaces, router=router)
+        agent.process_router(ri)
+        ri.iptables_manager.ipv4['nat'].mark_applied()
+        ri.router = copy.deepcopy(router)
+        agent.process_router(ri)
+        self.assertFalse(ri.iptables_manager.ipv4['nat'].dirty_chains)
+
+    def test_process_router_floating_ips_list_addresses_once(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = self._prepare_router_data()
+        router[l3_constants.FLOATINGIP_KEY] = [
+            self._make_floating_ip('19.4.4.10'),
+            self._make_floating_ip('19.4.4.11')]
+        ri = l3_agent.RouterInfo(router['id'], self.conf.root_helper,
+                                 self.conf.use_namespaces, router=router)
+        with mock.patch('neutron.agent.linux.ip_lib.IPDevice') as device:
+            device.return_value.addr.list.return_value = [
+                {'cidr': '19.4.4.11/32'}]
+            agent.process_router(ri)
+        self.assertEqual(device.return_value.addr.list.call_count, 1)
+        device.return_value.addr.add.assert_called_once_with(
+            4, '19.4.4.10/32', mock.ANY)
+        self.assertEqual(len(ri.floating_ips), 2)
+
+    def test_process_router_floating_ip_disassociated(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = self._prepare_router_data()
+        fip = self._make_floating_ip('19.4.4.10')
+        router[l3_constants.FLOATINGIP_KEY] = [fip]
+        ri = l3_agent.RouterInfo(router['id'], self.conf.root_helper,
+                                 self.conf.use_namespaces, router=router)
+        agent.process_router(ri)
+        router = copy.deepcopy(router)
+        router[l3_constants.FLOATINGIP_KEY][0]['port_id'] = None
+        ri.router = router
+        with mock.patch.object(agent, 'floating_ip_removed') as removed:
+            agent.process_router(ri)
+        removed.assert_called_once_with(ri, ri.ex_gw_port, '19.4.4.10',
+                                        '35.4.0.10')
+        self.assertFalse(ri.floating_ips)
+
     def testRoutersWithAdminStateDown(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         self.plugin_api.get_external_network_id.return_value = None
 
-        routers = [
-            {'id': _uuid(),
-             'admin_state_up': False,
-             'external_gateway_info': {}}]
-        agent._process_routers(routers)
-        self.assertNotIn(routers[0]['id'], agent.router_info)
+        router = {'id': _uuid(),
+                  'admin_state_up': False,
+                  'external_gateway_info': {}}
+        agent._process_router_update(l3_agent.RouterUpdate(
+            router['id'], l3_agent.PRIORITY_RPC, router=router))
+        self.assertNotIn(router['id'], agent.router_info)
+
+    def _queued_updates(self, agent):
+        updates = []
+        while len(agent._queue):
+            update = agent._queue.get()
+            agent._queue.task_done(update.router_id)
+            updates.append(update)
+        return updates
 
     def test_router_deleted(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         agent.router_deleted(None, FAKE_ID)
-        # verify that will set fullsync
-        self.assertTrue(FAKE_ID in agent.removed_routers)
+        update = agent._queue.get()
+        self.assertEqual(update.router_id, FAKE_ID)
+        self.assertEqual(update.action, l3_agent.DELETE_ROUTER)
+        self.assertEqual(update.priority, l3_agent.PRIORITY_RPC)
 
     def test_routers_updated(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         agent.routers_updated(None, [FAKE_ID])
-        # verify that will set fullsync
-        self.assertTrue(FAKE_ID in agent.updated_routers)
+        update = agent._queue.get()
+        self.assertEqual(update.router_id, FAKE_ID)
+        self.assertEqual(update.action, l3_agent.UPDATE_ROUTER)
+        self.assertIsNone(update.router)
+
+    def test_routers_updated_dicts(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.routers_updated(None, [{'id': FAKE_ID}])
+        self.assertEqual(agent._queue.get().router_id, FAKE_ID)
 
     def test_removed_from_agent(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         agent.router_removed_from_agent(None, {'router_id': FAKE_ID})
-        # verify that will set fullsync
-        self.assertTrue(FAKE_ID in agent.removed_routers)
+        update = agent._queue.get()
+        self.assertEqual(update.router_id, FAKE_ID)
+        self.assertEqual(update.action, l3_agent.DELETE_ROUTER)
 
     def test_added_to_agent(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         agent.router_added_to_agent(None, [FAKE_ID])
-        # verify that will set fullsync
-        self.assertTrue(FAKE_ID in agent.updated_routers)
+        update = agent._queue.get()
+        self.assertEqual(update.router_id, FAKE_ID)
+        self.assertEqual(update.action, l3_agent.UPDATE_ROUTER)
 
     def test_process_router_delete(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
@@ -548,8 +641,201 @@ class TestBasicRouterOperations(base.BaseTestCase):
             'gw_port': ex_gw_port}
         agent._router_added(router['id'], router)
         agent.router_deleted(None, router['id'])
-        agent._process_router_delete()
-        self.assertFalse(list(agent.removed_routers))
+        agent._process_router_update(agent._queue.get())
+        self.assertNotIn(router['id'], agent.router_info)
+        self.assertFalse(len(agent._queue))
+
+    def _make_router(self, router_id=None):
+        return {'id': router_id or _uuid(),
+                'admin_state_up': True,
+                'external_gateway_info': {},
+                'routes': []}
+
+    def test_process_router_update_fetches_router(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = self._make_router()
+        self.plugin_api.get_routers.return_value = [router]
+        with mock.patch.object(agent, 'process_router') as process:
+            agent._process_router_update(l3_agent.RouterUpdate(
+                router['id'], l3_agent.PRIORITY_RPC))
+        self.plugin_api.get_routers.assert_called_once_with(
+            agent.context, [router['id']])
+        ri = agent.router_info[router['id']]
+        self.assertEqual(ri.router, router)
+        process.assert_called_once_with(ri)
+
+    def test_process_router_update_removes_unreturned_router(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = self._make_router()
+        agent._router_added(router['id'], router)
+        self.plugin_api.get_routers.return_value = []
+        with mock.patch.object(agent, '_router_removed') as removed:
+            agent._process_router_update(l3_agent.RouterUpdate(
+                router['id'], l3_agent.PRIORITY_RPC))
+        removed.assert_called_once_with(router['id'])
+
+    def test_process_router_update_removal_skips_outdated_data(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = self._make_router()
+        fetched = time.time() - 1
+        with mock.patch.object(agent, 'process_router'):
+            agent._process_router_update(l3_agent.RouterUpdate(
+                router['id'], l3_agent.PRIORITY_RPC, router=router))
+            agent._process_router_update(l3_agent.RouterUpdate(
+                router['id'], l3_agent.PRIORITY_RPC,
+                action=l3_agent.DELETE_ROUTER))
+            # Data fetched by a full sync before the router was removed
+            agent._process_router_update(l3_agent.RouterUpdate(
+                router['id'], l3_agent.PRIORITY_SYNC_ROUTERS_TASK,
+                router=self._make_router(router['id']), timestamp=fetched))
+        self.assertNotIn(router['id'], agent.router_info)
+
+    def test_removed_router_timestamp_expires(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router_id = _uuid()
+        with mock.patch('time.time', return_value=1000):
+            agent._process_router_update(l3_agent.RouterUpdate(
+                router_id, l3_agent.PRIORITY_RPC,
+                action=l3_agent.DELETE_ROUTER))
+        self.assertIn(router_id, agent._router_timestamps)
+        with mock.patch('time.time', return_value=1000 +
+                        l3_agent.REMOVED_ROUTER_TIMESTAMP_AGE - 1):
+            agent._expire_removed_routers()
+        self.assertIn(router_id, agent._router_timestamps)
+        with mock.patch('time.time', return_value=1001 +
+                        l3_agent.REMOVED_ROUTER_TIMESTAMP_AGE):
+            agent._expire_removed_routers()
+        self.assertNotIn(router_id, agent._router_timestamps)
+        self.assertNotIn(router_id, agent._removed_routers)
+
+    def test_process_router_update_skips_outdated_data(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = self._make_router()
+        self.plugin_api.get_routers.return_value = [router]
+        with mock.patch.object(agent, 'process_router') as process:
+            agent._process_router_update(l3_agent.RouterUpdate(
+                router['id'], l3_agent.PRIORITY_RPC))
+            # Data fetched by a full sync before the update was processed
+            agent._process_router_update(l3_agent.RouterUpdate(
+                router['id'], l3_agent.PRIORITY_SYNC_ROUTERS_TASK,
+                router=self._make_router(router['id']), timestamp=1))
+        self.assertEqual(process.call_count, 1)
+        self.assertIs(agent.router_info[router['id']].router, router)
+
+    def test_process_router_update_external_network_replaced(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = self._make_router()
+        router['external_gateway_info'] = {'network_id': 'new-ext-net'}
+        self.plugin_api.get_external_network_id.side_effect = [
+            'old-ext-net', 'new-ext-net']
+        with mock.patch.object(agent, 'process_router'):
+            agent._process_router_update(l3_agent.RouterUpdate(
+                router['id'], l3_agent.PRIORITY_RPC, router=router))
+        self.assertIn(router['id'], agent.router_info)
+        self.assertEqual(agent.target_ex_net_id, 'new-ext-net')
+
+    def test_process_router_updates_failure_sets_fullsync(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.fullsync = False
+        agent.routers_updated(None, [FAKE_ID])
+        with mock.patch.object(agent._queue, 'get',
+                               side_effect=[agent._queue.get(),
+                                            SystemExit]):
+            self.plugin_api.get_routers.side_effect = Exception()
+            self.assertRaises(SystemExit, agent._process_router_updates)
+        self.assertTrue(agent.fullsync)
+        self.assertNotIn(FAKE_ID, agent._queue._in_progress)
+
+    def test_process_router_updates_fetches_queued_routers(self):
+        self.conf.set_override('sync_routers_per_request', 2)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        routers = dict((router['id'], router) for router in
+                       [self._make_router() for i in range(3)])
+        agent.routers_updated(None, list(routers))
+        get = agent._queue.get
+
+        def get_or_exit():
+            if not len(agent._queue):
+                raise SystemExit()
+            return get()
+
+        self.plugin_api.get_routers.side_effect = (
+            lambda context, router_ids: [routers[router_id]
+                                         for router_id in router_ids])
+        with mock.patch.object(agent, 'process_router'):
+            with mock.patch.object(agent._queue, 'get',
+                                   side_effect=get_or_exit):
+                self.assertRaises(SystemExit, agent._process_router_updates)
+        fetched = [call[0][1] for call in
+                   self.plugin_api.get_routers.call_args_list]
+        self.assertEqual([len(router_ids) for router_ids in fetched], [2, 1])
+        self.assertEqual(set(fetched[0] + fetched[1]), set(routers))
+        self.assertEqual(set(agent.router_info), set(routers))
+        self.assertFalse(agent._queue._in_progress)
+
+    def test_sync_routers_task_chunks(self):
+        self.conf.set_override('sync_routers_per_request', 2)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        stale = self._make_router()
+        agent._router_added(stale['id'], stale)
+        routers = [self._make_router() for i in range(3)]
+        router_ids = [router['id'] for router in routers]
+        deleted_id = _uuid()
+        self.plugin_api.get_router_ids.return_value = router_ids + [
+            deleted_id]
+        self.plugin_api.get_routers.side_effect = [routers[:2],
+                                                   routers[2:]]
+        agent._sync_routers_task(agent.context)
+
+        self.assertFalse(agent.fullsync)
+        self.assertEqual(self.plugin_api.get_routers.call_args_list,
+                         [mock.call(agent.context, router_ids[:2]),
+                          mock.call(agent.context,
+                                    [router_ids[2], deleted_id])])
+        updates = dict((update.router_id, update)
+                       for update in self._queued_updates(agent))
+        self.assertEqual(len(updates), 5)
+        for router in routers:
+            self.assertEqual(updates[router['id']].router, router)
+            self.assertEqual(updates[router['id']].priority,
+                             l3_agent.PRIORITY_SYNC_ROUTERS_TASK)
+        self.assertEqual(updates[stale['id']].action,
+                         l3_agent.DELETE_ROUTER)
+        self.assertEqual(updates[deleted_id].action, l3_agent.DELETE_ROUTER)
+
+    def test_sync_routers_task_without_router_ids(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        stale = self._make_router()
+        agent._router_added(stale['id'], stale)
+        router = self._make_router()
+        self.plugin_api.get_router_ids.return_value = None
+        self.plugin_api.get_routers.return_value = [router]
+        agent._sync_routers_task(agent.context)
+
+        self.assertFalse(agent.fullsync)
+        self.plugin_api.get_routers.assert_called_once_with(agent.context)
+        updates = dict((update.router_id, update)
+                       for update in self._queued_updates(agent))
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(updates[router['id']].router, router)
+        self.assertEqual(updates[stale['id']].action,
+                         l3_agent.DELETE_ROUTER)
+
+    def test_sync_routers_task_failure(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.plugin_api.get_router_ids.side_effect = Exception()
+        agent._sync_routers_task(agent.context)
+        self.assertTrue(agent.fullsync)
+
+    def test_sync_routers_task_no_namespaces(self):
+        self.conf.set_override('use_namespaces', False)
+        self.conf.set_override('router_id', FAKE_ID)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.plugin_api.get_routers.return_value = []
+        agent._sync_routers_task(agent.context)
+        self.assertFalse(self.plugin_api.get_router_ids.called)
+        self.plugin_api.get_routers.assert_called_once_with(
+            agent.context, [FAKE_ID])
 
     def testDestroyNamespace(self):
 
@@ -702,3 +988,125 @@ class TestL3AgentEventHandler(base.BaseTestCase):
                 ])
         finally:
             self.external_process_p.start()
+
+
+class TestL3PluginApi(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestL3PluginApi, self).setUp()
+        self.api = l3_agent.L3PluginApi('fake_topic', HOSTNAME)
+        self.ctxt = context.RequestContext('fake_user', 'fake_project')
+
+    def test_get_router_ids_version(self):
+        with mock.patch('neutron.openstack.common.rpc.call',
+                        return_value=[FAKE_ID]) as rpc_call:
+            self.assertEqual(self.api.get_router_ids(self.ctxt), [FAKE_ID])
+        msg = rpc_call.call_args[0][2]
+        self.assertEqual(msg['method'], 'get_router_ids')
+        self.assertEqual(msg['version'], '1.4')
+
+    def test_get_router_ids_unsupported(self):
+        error = rpc_common.RemoteError(exc_type='UnsupportedRpcVersion')
+        with mock.patch('neutron.openstack.common.rpc.call',
+                        side_effect=error) as rpc_call:
+            self.assertIsNone(self.api.get_router_ids(self.ctxt))
+            self.assertIsNone(self.api.get_router_ids(self.ctxt))
+        self.assertEqual(rpc_call.call_count, 1)
+        self.assertFalse(self.api.router_ids_supported)
+
+    def test_get_router_ids_raises_remote_errors(self):
+        error = rpc_common.RemoteError(exc_type='Exception')
+        with mock.patch('neutron.openstack.common.rpc.call',
+                        side_effect=error):
+            self.assertRaises(rpc_common.RemoteError,
+                              self.api.get_router_ids, self.ctxt)
+        self.assertTrue(self.api.router_ids_supported)
+
+
+class TestRouterUpdateQueue(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestRouterUpdateQueue, self).setUp()
+        self.queue = l3_agent.RouterUpdateQueue()
+
+    def _add(self, router_id, priority, **kwargs):
+        update = l3_agent.RouterUpdate(router_id, priority, **kwargs)
+        self.queue.add(update)
+        return update
+
+    def _get_all(self):
+        updates = []
+        while len(self.queue):
+            update = self.queue.get()
+            self.queue.task_done(update.router_id)
+            updates.append(update)
+        return updates
+
+    def test_priority_order(self):
+        self._add('r1', l3_agent.PRIORITY_SYNC_ROUTERS_TASK)
+        self._add('r2', l3_agent.PRIORITY_SYNC_ROUTERS_TASK)
+        self._add('r3', l3_agent.PRIORITY_RPC)
+        self.assertEqual([u.router_id for u in self._get_all()],
+                         ['r3', 'r1', 'r2'])
+
+    def test_deduplication(self):
+        self._add('r1', l3_agent.PRIORITY_SYNC_ROUTERS_TASK,
+                  router={'id': 'r1'})
+        self._add('r2', l3_agent.PRIORITY_SYNC_ROUTERS_TASK)
+        update = self._add('r1', l3_agent.PRIORITY_RPC,
+                           action=l3_agent.DELETE_ROUTER)
+        updates = self._get_all()
+        self.assertEqual([u.router_id for u in updates], ['r1', 'r2'])
+        self.assertIs(updates[0], update)
+
+    def test_deduplication_keeps_priority(self):
+        self._add('r1', l3_agent.PRIORITY_SYNC_ROUTERS_TASK)
+        self._add('r2', l3_agent.PRIORITY_RPC)
+        self._add('r2', l3_agent.PRIORITY_SYNC_ROUTERS_TASK)
+        updates = self._get_all()
+        self.assertEqual([u.router_id for u in updates], ['r2', 'r1'])
+        self.assertEqual(updates[0].priority, l3_agent.PRIORITY_RPC)
+
+    def test_sync_data_does_not_replace_pending_fetch(self):
+        self._add('r1', l3_agent.PRIORITY_RPC)
+        self._add('r1', l3_agent.PRIORITY_SYNC_ROUTERS_TASK,
+                  router={'id': 'r1'})
+        self.assertIsNone(self.queue.get().router)
+
+    def test_sync_delete_does_not_replace_pending_fetch(self):
+        self._add('r1', l3_agent.PRIORITY_RPC)
+        self._add('r1', l3_agent.PRIORITY_SYNC_ROUTERS_TASK,
+                  action=l3_agent.DELETE_ROUTER)
+        update = self.queue.get()
+        self.assertIsNone(update.router)
+        self.assertEqual(update.action, l3_agent.UPDATE_ROUTER)
+
+    def test_router_in_progress_is_held_back(self):
+        self._add('r1', l3_agent.PRIORITY_RPC)
+        self.assertEqual(self.queue.get().router_id, 'r1')
+        self._add('r1', l3_agent.PRIORITY_RPC)
+        self._add('r2', l3_agent.PRIORITY_SYNC_ROUTERS_TASK)
+        self.assertEqual(self.queue.get().router_id, 'r2')
+        self.assertEqual(len(self.queue), 1)
+        self.queue.task_done('r1')
+        self.assertEqual(self.queue.get().router_id, 'r1')
+
+    def test_get_to_fetch(self):
+        self._add('r1', l3_agent.PRIORITY_RPC)
+        self.assertEqual(self.queue.get().router_id, 'r1')
+        self._add('r1', l3_agent.PRIORITY_RPC)
+        self._add('r2', l3_agent.PRIORITY_SYNC_ROUTERS_TASK,
+                  router={'id': 'r2'})
+        self._add('r3', l3_agent.PRIORITY_RPC)
+        self._add('r4', l3_agent.PRIORITY_RPC)
+        self._add('r5', l3_agent.PRIORITY_RPC)
+        updates = self.queue.get_to_fetch(2)
+        self.assertEqual(len(updates), 2)
+        fetched = set(u.router_id for u in updates)
+        self.assertTrue(fetched < set(['r3', 'r4', 'r5']))
+        self.assertTrue(fetched <= self.queue._in_progress)
+        self.queue.task_done('r1')
+        for update in updates:
+            self.queue.task_done(update.router_id)
+        self.assertEqual(set(u.router_id for u in self._get_all()),
+                         set(['r1', 'r2', 'r3', 'r4', 'r5']) - fetched)
@@ -15,6 +15,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import os
 import socket
 
@@ -294,6 +295,23 @@ class TestDhcpLocalProcess(TestBase):
 
             self.assertEqual(lp.called, ['restart'])
 
+    def test_enable_already_active_with_current_config(self):
+        delegate = mock.Mock()
+        delegate.setup.return_value = 'tap0'
+        attrs_to_mock = dict(
+            [(a, mock.DEFAULT) for a in
+            ['active', 'interface_name', '_is_config_current']]
+        )
+        with mock.patch.multiple(LocalChild, **attrs_to_mock) as mocks:
+            mocks['active'].__get__ = mock.Mock(return_value=True)
+            mocks['interface_name'].__get__ = mock.Mock(return_value='tap0')
+            mocks['_is_config_current'].return_value = True
+            lp = LocalChild(self.conf, FakeV4Network(),
+                            device_delegate=delegate)
+            lp.enable()
+
+            self.assertEqual(lp.called, ['reload'])
+
     def test_enable(self):
         delegate = mock.Mock(return_value='tap0')
         attrs_to_mock = dict(
@@ -417,6 +435,11 @@ class TestDhcpLocalProcess(TestBase):
 
 
 class TestDnsmasq(TestBase):
+    def setUp(self):
+        super(TestDnsmasq, self).setUp()
+        dhcp.Dnsmasq._host_entries.clear()
+        self.addCleanup(dhcp.Dnsmasq._host_entries.clear)
+
     def _test_spawn(self, extra_options):
         def mock_get_conf_file_name(kind, ensure_conf_dir=False):
             return '/dhcp/cccccccc-cccc-cccc-cccc-cccccccccccc/%s' % kind
@@ -497,6 +520,28 @@ class TestDnsmasq(TestBase):
                           '--server=8.8.8.8',
                           '--domain=openstacklocal'])
 
+    def test_is_config_current(self):
+        attrs_to_mock = dict(
+            [(a, mock.DEFAULT) for a in
+            ['get_conf_file_name', 'interface_name',
+             '_get_value_from_conf_file']]
+        )
+        with mock.patch.multiple(dhcp.Dnsmasq, **attrs_to_mock) as mocks:
+            mocks['get_conf_file_name'].return_value = '/foo/config_hash'
+            mocks['interface_name'].__get__ = mock.Mock(return_value='tap0')
+            dm = dhcp.Dnsmasq(self.conf, FakeDualNetwork(),
+                              version=float(2.59))
+            dm.spawn_process()
+            config_hash = [args[1] for args, kwargs in self.safe.call_args_list
+                           if args[0] == '/foo/config_hash'][-1]
+            mocks['_get_value_from_conf_file'].return_value = config_hash
+            self.assertTrue(dm._is_config_current())
+            mocks['_get_value_from_conf_file'].assert_called_once_with(
+                'config_hash')
+
+            self.conf.set_override('dnsmasq_dns_server', '8.8.8.8')
+            self.assertFalse(dm._is_config_current())
+
     def test_output_opts_file(self):
         fake_v6 = 'gdca:3ba5:a17a:4ba3::1'
         fake_v6_cidr = 'gdca:3ba5:a17a:4ba3::/64'
@@ -663,6 +708,112 @@ tag:tag1,option:classless-static-route,%s,%s""".lstrip() % (fake_v6,
                                     mock.call(exp_opt_name, exp_opt_data)])
         self.execute.assert_called_once_with(exp_args, 'sudo')
 
+    def test_output_hosts_file_reuses_unchanged_entries(self):
+        network = FakeV4Network()
+        network.ports = [FakePort1(), FakePort3()]
+        with mock.patch.object(dhcp.Dnsmasq, 'get_conf_file_name') as conf_fn:
+            conf_fn.return_value = '/foo/host'
+            dm = dhcp.Dnsmasq(self.conf, network, version=float(2.59))
+            dm._output_hosts_file()
+            old_entries = dict(dm._host_entries[network.id])
+            network.ports[1] = FakePort3()
+            dm._output_hosts_file()
+        entries = dm._host_entries[network.id]
+        self.assertIs(old_entries[FakePort1.id], entries[FakePort1.id])
+        self.assertIsNot(old_entries[FakePort3.id], entries[FakePort3.id])
+        self.assertEqual(old_entries[FakePort3.id][1],
+                         entries[FakePort3.id][1])
+        self.assertEqual(self.safe.call_count, 2)
+
+    def _output_hosts_dir(self, network, existing_files=()):
+        self.conf.set_override('dnsmasq_use_hostsdir', True)
+        with contextlib.nested(
+            mock.patch.object(dhcp.Dnsmasq, 'get_conf_file_name',
+                              return_value='/foo/hosts'),
+            mock.patch('os.path.isdir', return_value=True),
+            mock.patch('os.listdir', return_value=existing_files),
+            mock.patch('os.remove')
+        ) as (conf_fn, isdir, listdir, remove):
+            dm = dhcp.Dnsmasq(self.conf, network, version=float(2.59))
+            self.assertEqual(dm._output_hosts_file(), '/foo/hosts')
+        return dm, remove
+
+    def test_output_hosts_dir(self):
+        network = FakeV4Network()
+        network.ports = [FakePort1(), FakePort3()]
+        dm, remove = self._output_hosts_dir(network, [FakePort1.id, 'stale'])
+        self.safe.assert_has_calls([
+            mock.call('/foo/hosts/%s' % FakePort1.id,
+                      '00:00:80:aa:bb:cc,192-168-0-2.openstacklocal,'
+                      '192.168.0.2\n'),
+            mock.call('/foo/hosts/%s' % FakePort3.id,
+                      '00:00:0f:aa:bb:cc,192-168-0-3.openstacklocal,'
+                      '192.168.0.3\n00:00:0f:aa:bb:cc,'
+                      'fdca-3ba5-a17a-4ba3--3.openstacklocal,'
+                      'fdca:3ba5:a17a:4ba3::3\n')], any_order=True)
+        remove.assert_called_once_with('/foo/hosts/stale')
+        self.assertTrue(dm._host_entries_replaced)
+
+    def test_output_hosts_dir_only_writes_added_ports(self):
+        network = FakeV4Network()
+        network.ports = [FakePort1()]
+        self._output_hosts_dir(network)
+        self.safe.reset_mock()
+        network.ports.append(FakePort3())
+        dm, remove = self._output_hosts_dir(network)
+        self.assertEqual(self.safe.call_count, 1)
+        self.assertFalse(remove.called)
+        self.assertFalse(dm._host_entries_replaced)
+
+    def test_output_hosts_dir_removes_deleted_ports(self):
+        network = FakeV4Network()
+        network.ports = [FakePort1(), FakePort3()]
+        self._output_hosts_dir(network)
+        self.safe.reset_mock()
+        del network.ports[1]
+        dm, remove = self._output_hosts_dir(network)
+        self.assertFalse(self.safe.called)
+        remove.assert_called_once_with('/foo/hosts/%s' % FakePort3.id)
+        self.assertTrue(dm._host_entries_replaced)
+
+    def _test_reload_allocations_hostsdir(self, host_entries_replaced,
+                                          old_opts='opts'):
+        self.conf.set_override('dnsmasq_use_hostsdir', True)
+        with contextlib.nested(
+            mock.patch.object(dhcp.Dnsmasq, '_output_hosts_file'),
+            mock.patch.object(dhcp.Dnsmasq, '_output_opts_file'),
+            mock.patch.object(dhcp.Dnsmasq, '_get_value_from_conf_file',
+                              side_effect=[old_opts, 'opts']),
+            mock.patch.object(dhcp.Dnsmasq, 'active'),
+            mock.patch.object(dhcp.Dnsmasq, 'pid')
+        ) as (hosts_file, opts_file, conf_value, active, pid):
+            active.__get__ = mock.Mock(return_value=True)
+            pid.__get__ = mock.Mock(return_value=5)
+            dm = dhcp.Dnsmasq(self.conf, FakeV4Network(), version=float(2.59))
+            dm._host_entries_replaced = host_entries_replaced
+            dm.reload_allocations()
+            self.assertTrue(hosts_file.called)
+            self.assertTrue(opts_file.called)
+
+    def test_reload_allocations_hostsdir_added_entries(self):
+        self._test_reload_allocations_hostsdir(False)
+        self.assertFalse(self.execute.called)
+
+    def test_reload_allocations_hostsdir_replaced_entries(self):
+        self._test_reload_allocations_hostsdir(True)
+        self.execute.assert_called_once_with(['kill', '-HUP', 5], 'sudo')
+
+    def test_reload_allocations_hostsdir_changed_opts(self):
+        self._test_reload_allocations_hostsdir(False, old_opts='old')
+        self.execute.assert_called_once_with(['kill', '-HUP', 5], 'sudo')
+
+    def test_remove_config_files_forgets_host_entries(self):
+        network = FakeV4Network()
+        dhcp.Dnsmasq._host_entries[network.id] = {}
+        with mock.patch('shutil.rmtree'):
+            dhcp.Dnsmasq(self.conf, network)._remove_config_files()
+        self.assertNotIn(network.id, dhcp.Dnsmasq._host_entries)
+
     def test_make_subnet_interface_ip_map(self):
         with mock.patch('neutron.agent.linux.ip_lib.IPDevice') as ip_dev:
             ip_dev.return_value.addr.list.return_value = [
@@ -778,7 +929,9 @@ tag:tag1,option:classless-static-route,%s,%s""".lstrip() % (fake_v6,
                 self.assertEquals(['aaaaaaaa-aaaa-aaaa-aaaa-aaaaaaaaaaaa'],
                                   result)
 
-    def _check_version(self, cmd_out, expected_value):
+    def _check_version(self, cmd_out, expected_value, use_hostsdir=False):
+        cfg.CONF.register_opts(dhcp.OPTS)
+        cfg.CONF.set_override('dnsmasq_use_hostsdir', use_hostsdir)
         with mock.patch('neutron.agent.linux.utils.execute') as cmd:
             cmd.return_value = cmd_out
             result = dhcp.Dnsmasq.check_version()
@@ -798,3 +951,12 @@ tag:tag1,option:classless-static-route,%s,%s""".lstrip() % (fake_v6,
 
     def test_check_version_failed_cmd_execution(self):
         self._check_version('Error while executing command', 0)
+
+    def test_check_hostsdir_version(self):
+        self._check_version('Dnsmasq version 2.73 Copyright (c)...',
+                            float(2.73), use_hostsdir=True)
+
+    def test_check_hostsdir_fail_version(self):
+        self.assertRaises(SystemExit, self._check_version,
+                          'Dnsmasq version 2.65 Copyright (c)...', None,
+                          use_hostsdir=True)
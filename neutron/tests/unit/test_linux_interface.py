@@ -88,7 +88,7 @@ class TestABCDriver(TestBase):
         ns = '12345678-1234-5678-90ab-ba0987654321'
         bc.init_l3('tap0', ['192.168.1.2/24'], namespace=ns)
         self.ip_dev.assert_has_calls(
-            [mock.call('tap0', 'sudo', namespace=ns),
+            [mock.call('tap0', 'sudo', namespace=ns, batch=mock.ANY),
              mock.call().addr.list(scope='global', filters=['permanent']),
              mock.call().addr.add(4, '192.168.1.2/24', '192.168.1.255'),
              mock.call().addr.delete(4, '172.16.77.240/24')])
@@ -139,15 +139,17 @@ class TestOVSInterfaceDriver(TestBase):
                      namespace=namespace)
             execute.assert_called_once_with(vsctl_cmd, 'sudo')
 
-        expected = [mock.call('sudo'),
-                    mock.call().device('tap0'),
-                    mock.call().device().link.set_address('aa:bb:cc:dd:ee:ff')]
+        expected = [mock.call('sudo', batch=mock.ANY),
+                    mock.call().device('tap0')]
+        if namespace:
+            expected.append(mock.call().ensure_namespace(namespace))
+        expected.append(
+            mock.call().device().link.set_address('aa:bb:cc:dd:ee:ff'))
         expected.extend(additional_expectation)
         if namespace:
-            expected.extend(
-                [mock.call().ensure_namespace(namespace),
-                 mock.call().ensure_namespace().add_device_to_namespace(
-                     mock.ANY)])
+            expected.append(
+                mock.call().ensure_namespace().add_device_to_namespace(
+                    mock.ANY))
         expected.extend([mock.call().device().link.set_up()])
 
         self.ip.assert_has_calls(expected)
@@ -171,6 +173,57 @@ class TestOVSInterfaceDriver(TestBase):
                                      mock.call().delete_port('tap0')])
 
 
+class TestOVSInterfaceDriverBatch(base.BaseTestCase):
+    def setUp(self):
+        super(TestOVSInterfaceDriverBatch, self).setUp()
+        self.conf = config.setup_conf()
+        self.conf.register_opts(interface.OPTS)
+        config.register_root_helper(self.conf)
+        self.execute_p = mock.patch.object(utils, 'execute')
+        self.execute = self.execute_p.start()
+        self.addCleanup(self.execute_p.stop)
+
+    def _ip_invocations(self):
+        return [c[0][0] for c in self.execute.call_args_list
+                if c[0][0][0] == 'ip']
+
+    def test_plug_with_ns(self):
+        ns = 'qrouter-1'
+
+        self.execute.return_value = ns
+        ovs = interface.OVSInterfaceDriver(self.conf)
+        with mock.patch.object(ip_lib, 'device_exists') as device_exists:
+            device_exists.side_effect = lambda name, *args, **kwargs: (
+                name == 'br-int')
+            ovs.plug('net-1', 'port-1234', 'tap0', 'aa:bb:cc:dd:ee:ff',
+                     namespace=ns)
+        self.assertEqual(self._ip_invocations()[-2:], [
+            ['ip', '-batch', '-'],
+            ['ip', 'netns', 'exec', ns, 'ip', '-batch', '-']])
+        self.assertEqual(self.execute.call_args_list[-2][1]['process_input'],
+                         'link set tap0 address aa:bb:cc:dd:ee:ff\n'
+                         'link set tap0 netns %s\n' % ns)
+        self.assertEqual(self.execute.call_args_list[-1][1]['process_input'],
+                         'link set tap0 up\n')
+
+    def test_init_l3(self):
+        self.execute.return_value = (
+            'inet 172.16.77.240/24 brd 172.16.77.255 scope global tap0')
+        ovs = interface.OVSInterfaceDriver(self.conf)
+        ovs.init_l3('tap0', ['192.168.1.2/24', '192.168.2.2/24'],
+                    namespace='ns')
+        self.assertEqual(self._ip_invocations(), [
+            ['ip', 'netns', 'exec', 'ns', 'ip', 'addr', 'show', 'tap0',
+             'permanent', 'scope', 'global'],
+            ['ip', 'netns', 'exec', 'ns', 'ip', '-4', '-batch', '-']])
+        self.assertEqual(self.execute.call_args_list[-1][1]['process_input'],
+                         'addr add 192.168.1.2/24 brd 192.168.1.255 scope '
+                         'global dev tap0\n'
+                         'addr add 192.168.2.2/24 brd 192.168.2.255 scope '
+                         'global dev tap0\n'
+                         'addr del 172.16.77.240/24 dev tap0\n')
+
+
 class TestOVSInterfaceDriverWithVeth(TestOVSInterfaceDriver):
 
     def setUp(self):
@@ -202,7 +255,7 @@ class TestOVSInterfaceDriverWithVeth(TestOVSInterfaceDriver):
         root_dev = mock.Mock()
         ns_dev = mock.Mock()
         self.ip().add_veth = mock.Mock(return_value=(root_dev, ns_dev))
-        expected = [mock.call('sudo'),
+        expected = [mock.call('sudo', batch=mock.ANY),
                     mock.call().add_veth('tap0', devname,
                                          namespace2=namespace)]
 
@@ -279,7 +332,7 @@ class TestBridgeInterfaceDriver(TestBase):
                 mac_address,
                 namespace=namespace)
 
-        ip_calls = [mock.call('sudo'),
+        ip_calls = [mock.call('sudo', batch=mock.ANY),
                     mock.call().add_veth('tap0', 'ns-0', namespace2=namespace)]
         ns_veth.assert_has_calls([mock.call.link.set_address(mac_address)])
         if mtu:
@@ -426,8 +479,11 @@ class TestIVSInterfaceDriver(TestBase):
         ns_dev = mock.Mock()
         self.ip().add_veth = mock.Mock(return_value=(root_dev, _ns_dev))
         self.ip().device = mock.Mock(return_value=(ns_dev))
-        expected = [mock.call('sudo'), mock.call().add_veth('tap0', devname),
-                    mock.call().device(devname)]
+        expected = [mock.call('sudo', batch=mock.ANY),
+                    mock.call().add_veth('tap0', devname)]
+        if namespace:
+            expected.append(mock.call().ensure_namespace(namespace))
+        expected.append(mock.call().device(devname))
 
         ivsctl_cmd = ['ivs-ctl', 'add-port', 'tap0']
 
@@ -446,10 +502,9 @@ class TestIVSInterfaceDriver(TestBase):
             ns_dev.assert_has_calls([mock.call.link.set_mtu(mtu)])
             root_dev.assert_has_calls([mock.call.link.set_mtu(mtu)])
         if namespace:
-            expected.extend(
-                [mock.call().ensure_namespace(namespace),
-                 mock.call().ensure_namespace().add_device_to_namespace(
-                     mock.ANY)])
+            expected.append(
+                mock.call().ensure_namespace().add_device_to_namespace(
+                    mock.ANY))
 
         self.ip.assert_has_calls(expected)
         root_dev.assert_has_calls([mock.call.link.set_up()])
@@ -150,6 +150,85 @@ class TestSubProcessBase(base.BaseTestCase):
                           [], 'link', ('list',))
 
 
+class TestIPBatch(base.BaseTestCase):
+    def setUp(self):
+        super(TestIPBatch, self).setUp()
+        self.execute_p = mock.patch('neutron.agent.linux.utils.execute')
+        self.execute = self.execute_p.start()
+        self.addCleanup(self.execute_p.stop)
+
+    def test_commands_share_invocation(self):
+        with ip_lib.IPBatch() as batch:
+            device = ip_lib.IPDevice('tap0', 'sudo', 'ns', batch=batch)
+            device.link.set_address('aa:bb:cc:dd:ee:ff')
+            device.link.set_up()
+            device.route.add_gateway('10.0.0.1')
+            self.assertFalse(self.execute.called)
+        self.execute.assert_called_once_with(
+            ['ip', 'netns', 'exec', 'ns', 'ip', '-batch', '-'],
+            process_input='link set tap0 address aa:bb:cc:dd:ee:ff\n'
+                          'link set tap0 up\n'
+                          'route replace default via 10.0.0.1 dev tap0\n',
+            root_helper='sudo')
+
+    def test_change_of_namespace_or_options(self):
+        with ip_lib.IPBatch() as batch:
+            ip = ip_lib.IPWrapper('sudo', batch=batch)
+            device = ip.device('tap0')
+            device.link.set_mtu(9000)
+            device.link.set_netns('ns')
+            device.addr.add(4, '10.0.0.2/24', '10.0.0.255')
+            device.addr.add(4, '10.0.1.2/24', '10.0.1.255')
+            device.link.set_up()
+        self.assertEqual(self.execute.call_args_list, [
+            mock.call(['ip', '-batch', '-'],
+                      process_input='link set tap0 mtu 9000\n'
+                                    'link set tap0 netns ns\n',
+                      root_helper='sudo'),
+            mock.call(['ip', 'netns', 'exec', 'ns', 'ip', '-4', '-batch',
+                       '-'],
+                      process_input='addr add 10.0.0.2/24 brd 10.0.0.255 '
+                                    'scope global dev tap0\n'
+                                    'addr add 10.0.1.2/24 brd 10.0.1.255 '
+                                    'scope global dev tap0\n',
+                      root_helper='sudo'),
+            mock.call(['ip', 'netns', 'exec', 'ns', 'ip', '-batch', '-'],
+                      process_input='link set tap0 up\n',
+                      root_helper='sudo')])
+
+    def test_read_submits_queued_commands(self):
+        self.execute.return_value = ''
+        with ip_lib.IPBatch() as batch:
+            device = ip_lib.IPDevice('tap0', 'sudo', 'ns', batch=batch)
+            device.link.set_up()
+            device.addr.list()
+            device.link.set_down()
+        self.assertEqual(self.execute.call_args_list, [
+            mock.call(['ip', 'netns', 'exec', 'ns', 'ip', '-batch', '-'],
+                      process_input='link set tap0 up\n',
+                      root_helper='sudo'),
+            mock.call(['ip', 'netns', 'exec', 'ns', 'ip', 'addr', 'show',
+                       'tap0'], root_helper='sudo'),
+            mock.call(['ip', 'netns', 'exec', 'ns', 'ip', '-batch', '-'],
+                      process_input='link set tap0 down\n',
+                      root_helper='sudo')])
+
+    def test_error_drops_queued_commands(self):
+        def plug():
+            with ip_lib.IPBatch() as batch:
+                device = ip_lib.IPDevice('tap0', 'sudo', batch=batch)
+                device.link.set_up()
+                raise RuntimeError()
+
+        self.assertRaises(RuntimeError, plug)
+        self.assertFalse(self.execute.called)
+
+    def test_no_root_helper(self):
+        batch = ip_lib.IPBatch()
+        device = ip_lib.IPDevice('tap0', batch=batch)
+        self.assertRaises(exceptions.SudoRequired, device.link.set_up)
+
+
 class TestIpWrapper(base.BaseTestCase):
     def setUp(self):
         super(TestIpWrapper, self).setUp()
@@ -230,7 +309,7 @@ class TestIpWrapper(base.BaseTestCase):
                 ip.ensure_namespace('ns')
                 self.execute.assert_has_calls(
                     [mock.call([], 'netns', ('add', 'ns'), 'sudo', None)])
-                ip_dev.assert_has_calls([mock.call('lo', 'sudo', 'ns'),
+                ip_dev.assert_has_calls([mock.call('lo', 'sudo', 'ns', None),
                                          mock.call().link.set_up()])
 
     def test_ensure_namespace_existing(self):
@@ -352,6 +431,7 @@ class TestIPCommandBase(base.BaseTestCase):
         self.ip = mock.Mock()
         self.ip.root_helper = 'sudo'
         self.ip.namespace = 'namespace'
+        self.ip.batch = None
         self.ip_cmd = ip_lib.IpCommandBase(self.ip)
         self.ip_cmd.COMMAND = 'foo'
 
@@ -373,6 +453,19 @@ class TestIPCommandBase(base.BaseTestCase):
         self.ip.assert_has_calls(
             [mock.call._as_root('o', 'foo', ('link', ), False)])
 
+    def test_as_root_batch(self):
+        self.ip.batch = mock.Mock()
+        self.ip_cmd._as_root('link', options='o')
+        self.ip.assert_has_calls([mock.call._queue('o', 'foo', ('link', ))])
+        self.assertFalse(self.ip._as_root.called)
+
+    def test_as_root_batch_root_namespace(self):
+        self.ip.batch = mock.Mock()
+        self.ip_cmd._as_root('link', use_root_namespace=True)
+        self.ip.assert_has_calls(
+            [mock.call._as_root([], 'foo', ('link', ), True)])
+        self.assertFalse(self.ip._queue.called)
+
 
 class TestIPDeviceCommandBase(base.BaseTestCase):
     def setUp(self):
@@ -394,6 +487,7 @@ class TestIPCmdBase(base.BaseTestCase):
         self.parent = mock.Mock()
         self.parent.name = 'eth0'
         self.parent.root_helper = 'sudo'
+        self.parent.batch = None
 
     def _assert_call(self, options, args):
         self.parent.assert_has_calls([
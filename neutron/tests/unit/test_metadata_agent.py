@@ -38,6 +38,9 @@ class FakeConf(object):
     nova_metadata_ip = '9.9.9.9'
     nova_metadata_port = 8775
     metadata_proxy_shared_secret = 'secret'
+    metadata_cache_ttl = 5
+    metadata_cache_size = 1000
+    nova_metadata_pool_size = 10
 
 
 class TestMetadataProxyHandler(base.BaseTestCase):
@@ -182,6 +185,47 @@ class TestMetadataProxyHandler(base.BaseTestCase):
             self._get_instance_id_helper(headers, ports, networks=['the_id'])
         )
 
+    def test_get_instance_id_cached(self):
+        headers = {'X-Neutron-Router-ID': 'the_id',
+                   'X-Forwarded-For': '192.168.1.1'}
+        list_ports = self.qclient.return_value.list_ports
+        list_ports.side_effect = [
+            {'ports': [{'network_id': 'net1'}]},
+            {'ports': [{'device_id': 'device_id'}]}]
+        req = mock.Mock(headers=headers)
+
+        self.assertEqual(self.handler._get_instance_id(req), 'device_id')
+        self.assertEqual(self.handler._get_instance_id(req), 'device_id')
+        self.assertEqual(list_ports.call_count, 2)
+        self.assertEqual(self.qclient.call_count, 1)
+        self.assertEqual(self.handler.instance_cache.hit_ratio, 0.5)
+
+    def test_get_instance_id_router_networks_cached(self):
+        headers = {'X-Neutron-Router-ID': 'the_id'}
+        list_ports = self.qclient.return_value.list_ports
+        list_ports.side_effect = [
+            {'ports': [{'network_id': 'net1'}]},
+            {'ports': [{'device_id': 'device1'}]},
+            {'ports': [{'device_id': 'device2'}]}]
+
+        for address, device_id in (('192.168.1.1', 'device1'),
+                                   ('192.168.1.2', 'device2')):
+            headers['X-Forwarded-For'] = address
+            req = mock.Mock(headers=dict(headers))
+            self.assertEqual(self.handler._get_instance_id(req), device_id)
+        self.assertEqual(list_ports.call_count, 3)
+
+    def test_get_instance_id_no_match_not_cached(self):
+        headers = {'X-Neutron-Network-ID': 'the_id',
+                   'X-Forwarded-For': '192.168.1.1'}
+        list_ports = self.qclient.return_value.list_ports
+        list_ports.side_effect = [{'ports': []},
+                                  {'ports': [{'device_id': 'device_id'}]}]
+        req = mock.Mock(headers=headers)
+
+        self.assertIsNone(self.handler._get_instance_id(req))
+        self.assertEqual(self.handler._get_instance_id(req), 'device_id')
+
     def _proxy_request_test_helper(self, response_code=200, method='GET'):
         hdrs = {'X-Forwarded-For': '8.8.8.8'}
         body = 'body'
@@ -210,6 +254,18 @@ class TestMetadataProxyHandler(base.BaseTestCase):
 
                 return retval
 
+    def test_proxy_request_reuses_http(self):
+        req = mock.Mock(path_info='/the_path', query_string='',
+                        headers={'X-Forwarded-For': '8.8.8.8'},
+                        method='GET', body='')
+        with mock.patch('httplib2.Http') as mock_http:
+            mock_http.return_value.request.return_value = (
+                mock.Mock(status=200), 'content')
+            self.handler._proxy_request('the_id', req)
+            self.handler._proxy_request('the_id', req)
+            mock_http.assert_called_once_with()
+            self.assertEqual(mock_http.return_value.request.call_count, 2)
+
     def test_proxy_request_post(self):
         self.assertEqual('content',
                          self._proxy_request_test_helper(method='POST'))
@@ -244,6 +300,54 @@ class TestMetadataProxyHandler(base.BaseTestCase):
         )
 
 
+class TestInstanceIdCache(base.BaseTestCase):
+    def setUp(self):
+        super(TestInstanceIdCache, self).setUp()
+        self.time_p = mock.patch('time.time')
+        self.time = self.time_p.start()
+        self.addCleanup(self.time_p.stop)
+        self.time.return_value = 100
+        self.cache = agent.InstanceIdCache(5, 2)
+
+    def test_get(self):
+        self.cache.set('key', 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertIsNone(self.cache.get('other'))
+        self.assertEqual(self.cache.hit_ratio, 0.5)
+
+    def test_get_expired(self):
+        self.cache.set('key', 'value')
+        self.time.return_value = 105
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(self.cache.hit_ratio, 0)
+
+    def test_set_evicts_expired(self):
+        self.cache.set('key1', 'value1')
+        self.time.return_value = 102
+        self.cache.set('key2', 'value2')
+        self.time.return_value = 105
+        self.cache.get('key2')
+        self.cache.set('key3', 'value3')
+        self.assertEqual(self.cache.get('key2'), 'value2')
+        self.assertEqual(self.cache.get('key3'), 'value3')
+
+    def test_set_evicts_least_recently_used(self):
+        self.cache.set('key1', 'value1')
+        self.time.return_value = 101
+        self.cache.set('key2', 'value2')
+        self.time.return_value = 102
+        self.cache.get('key1')
+        self.cache.set('key3', 'value3')
+        self.assertEqual(self.cache.get('key1'), 'value1')
+        self.assertIsNone(self.cache.get('key2'))
+        self.assertEqual(self.cache.get('key3'), 'value3')
+
+    def test_disabled(self):
+        cache = agent.InstanceIdCache(0, 2)
+        cache.set('key', 'value')
+        self.assertIsNone(cache.get('key'))
+
+
 class TestUnixDomainHttpProtocol(base.BaseTestCase):
     def test_init_empty_client(self):
         u = agent.UnixDomainHttpProtocol(mock.Mock(), '', mock.Mock())
@@ -273,12 +377,30 @@ class TestUnixDomainWSGIServer(base.BaseTestCase):
                     backlog=128
                 )]
             )
-            pool.spawn_n.assert_called_once_with(
+            pool.spawn.assert_called_once_with(
                 self.server._run,
                 mock_app,
                 self.eventlet.listen.return_value
             )
 
+    def test_start_workers(self):
+        mock_app = mock.Mock()
+        with mock.patch.object(agent.wsgi.common_service,
+                               'ProcessLauncher') as launcher:
+            self.server.start(mock_app, '/the/path', workers=4)
+            launcher.return_value.launch_service.assert_called_once_with(
+                mock.ANY, workers=4)
+            service = launcher.return_value.launch_service.call_args[0][0]
+            with mock.patch.object(self.server, 'pool') as pool:
+                service.start()
+                pool.spawn.assert_called_once_with(
+                    self.server._run,
+                    mock_app,
+                    self.eventlet.listen.return_value
+                )
+            self.server.wait()
+            launcher.return_value.wait.assert_called_once_with()
+
     def test_run(self):
         with mock.patch.object(agent, 'logging') as logging:
             self.server._run('app', 'sock')
@@ -361,9 +483,13 @@ class TestUnixDomainMetadataProxy(base.BaseTestCase):
                         isdir.assert_called_once_with('/the')
                         makedirs.assert_called_once_with('/the', 0o755)
                         server.assert_has_calls([
-                            mock.call('neutron-metadata-agent'),
-                            mock.call().start(handler.return_value,
-                                              '/the/path'),
+                            mock.call('neutron-metadata-agent',
+                                      threads=self.cfg.CONF.metadata_threads),
+                            mock.call().start(
+                                handler.return_value,
+                                '/the/path',
+                                workers=self.cfg.CONF.metadata_workers,
+                                backlog=self.cfg.CONF.metadata_backlog),
                             mock.call().wait()]
                         )
 
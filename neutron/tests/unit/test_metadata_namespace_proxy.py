@@ -120,6 +120,18 @@ class TestNetworkMetadataProxyHandler(base.BaseTestCase):
 
             self.assertEqual(retval, 'content')
 
+    def test_proxy_request_reuses_http(self):
+        self.handler.network_id = 'network_id'
+
+        with mock.patch('httplib2.Http') as mock_http:
+            mock_http.return_value.request.return_value = (
+                mock.Mock(status=200), 'content')
+            for i in range(2):
+                self.handler._proxy_request('192.168.1.1', 'GET',
+                                            '/latest/meta-data', '', '')
+            mock_http.assert_called_once_with()
+            self.assertEqual(mock_http.return_value.request.call_count, 2)
+
     def test_proxy_request_network_200(self):
         self.handler.network_id = 'network_id'
 
@@ -50,6 +50,17 @@ class TestNeutronContext(base.BaseTestCase):
         self.assertIsNotNone(cxt.session)
         self.assertFalse('session' in cxt_dict)
 
+    def testNeutronContextToPolicyValues(self):
+        cxt = context.Context('user_id', 'tenant_id')
+        values = cxt.to_policy_values()
+        self.assertEqual(cxt.to_dict(), values)
+        self.assertIs(values, cxt.to_policy_values())
+        self.assertFalse(values['is_admin'])
+        self.assertTrue(cxt.elevated().to_policy_values()['is_admin'])
+        cxt.tenant_id = 'other_tenant_id'
+        self.assertEqual('other_tenant_id',
+                         cxt.to_policy_values()['tenant_id'])
+
     def testNeutronContextAdminWithoutSessionToDict(self):
         cxt = context.get_admin_context_without_session()
         cxt_dict = cxt.to_dict()
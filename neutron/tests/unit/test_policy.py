@@ -384,6 +384,43 @@ class NeutronPolicyTestCase(base.BaseTestCase):
         self.assertRaises(exceptions.PolicyNotAuthorized, policy.enforce,
                           self.context, action, target, None)
 
+    def test_build_match_rule_cached(self):
+        action = "create_something"
+        target = {'tenant_id': 'fake', 'attr': {'sub_attr_1': 'x'}}
+        match_rule = policy._build_match_rule(action, target)
+        self.assertIs(match_rule, policy._build_match_rule(
+            action, {'tenant_id': 'other', 'attr': {'sub_attr_1': 'y'}}))
+        self.assertIsNot(match_rule, policy._build_match_rule(
+            action, {'tenant_id': 'fake', 'attr': {'sub_attr_2': 'x'}}))
+        self.assertIsNot(match_rule, policy._build_match_rule(
+            action, {'tenant_id': 'fake'}))
+
+    def test_enforce_admin_skips_target_checks(self):
+        self.rules['create_port:mac'] = common_policy.parse_rule(
+            "tenant_id:%(network:tenant_id)s or rule:context_is_admin")
+        action = "create_port:mac"
+        target = {'network_id': 'whatever', 'mac': 'whatever'}
+        with mock.patch.object(policy.OwnerCheck, '__call__') as owner_check:
+            result = policy.enforce(context.get_admin_context(),
+                                    action, target)
+        self.assertTrue(result)
+        self.assertFalse(owner_check.called)
+
+    def test_enforce_admin_denied_by_rule(self):
+        self.rules['create_network:shared'] = common_policy.parse_rule('!')
+        self._test_action_on_attr(context.get_admin_context(), 'create',
+                                  'shared', True,
+                                  exceptions.PolicyNotAuthorized)
+
+    def test_enforce_admin_with_target_check(self):
+        self.rules['update_network'] = common_policy.parse_rule(
+            "rule:context_is_admin and tenant_id:%(tenant_id)s")
+        admin_context = context.Context('admin', 'the_owner', is_admin=True)
+        self._test_action_on_attr(admin_context, 'update', 'name', 'x')
+        admin_context.tenant_id = 'somebody_else'
+        self._test_action_on_attr(admin_context, 'update', 'name', 'x',
+                                  exceptions.PolicyNotAuthorized)
+
     def test_enforce_regularuser_on_read(self):
         action = "get_network"
         target = {'shared': True, 'tenant_id': 'somebody_else'}
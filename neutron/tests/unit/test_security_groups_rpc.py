@@ -29,6 +29,7 @@ from neutron.agent import securitygroups_rpc as sg_rpc
 from neutron import context
 from neutron.db import securitygroups_rpc_base as sg_db_rpc
 from neutron.extensions import securitygroup as ext_sg
+from neutron.openstack.common.rpc import common as rpc_common
 from neutron.openstack.common.rpc import proxy
 from neutron.tests import base
 from neutron.tests.unit import test_extension_security_group as test_sg
@@ -208,8 +209,8 @@ class SGServerRpcCallBackMixinTestCase(test_sg.SecurityGroupDBTestCase):
                              'remote_group_id': sg2_id,
                              'security_group_id': sg1_id},
                             ]
-                self.assertEqual(port_rpc['security_group_rules'],
-                                 expected)
+                self.assertEqual(sorted(port_rpc['security_group_rules']),
+                                 sorted(expected))
                 self._delete('ports', port_id1)
                 self._delete('ports', port_id2)
 
@@ -388,8 +389,71 @@ class SGServerRpcCallBackMixinTestCase(test_sg.SecurityGroupDBTestCase):
                              'remote_group_id': sg2_id,
                              'security_group_id': sg1_id},
                             ]
-                self.assertEqual(port_rpc['security_group_rules'],
-                                 expected)
+                self.assertEqual(sorted(port_rpc['security_group_rules']),
+                                 sorted(expected))
+                self._delete('ports', port_id1)
+                self._delete('ports', port_id2)
+
+    def test_security_group_info_for_devices_ipv4_source_group(self):
+
+        with self.network() as n:
+            with nested(self.subnet(n),
+                        self.security_group(),
+                        self.security_group()) as (subnet_v4,
+                                                   sg1,
+                                                   sg2):
+                sg1_id = sg1['security_group']['id']
+                sg2_id = sg2['security_group']['id']
+                rule1 = self._build_security_group_rule(
+                    sg1_id,
+                    'ingress', 'tcp', '24',
+                    '25', remote_group_id=sg2['security_group']['id'])
+                rules = {
+                    'security_group_rules': [rule1['security_group_rule']]}
+                res = self._create_security_group_rule(self.fmt, rules)
+                self.deserialize(self.fmt, res)
+                self.assertEqual(res.status_int, 201)
+
+                res1 = self._create_port(
+                    self.fmt, n['network']['id'],
+                    security_groups=[sg1_id,
+                                     sg2_id])
+                ports_rest1 = self.deserialize(self.fmt, res1)
+                port_id1 = ports_rest1['port']['id']
+                self.rpc.devices = {port_id1: ports_rest1['port']}
+                devices = [port_id1, 'no_exist_device']
+
+                res2 = self._create_port(
+                    self.fmt, n['network']['id'],
+                    security_groups=[sg2_id])
+                ports_rest2 = self.deserialize(self.fmt, res2)
+                port_id2 = ports_rest2['port']['id']
+                ctx = context.get_admin_context()
+                sg_info = self.rpc.security_group_info_for_devices(
+                    ctx, devices=devices)
+                port_rpc = sg_info['devices'][port_id1]
+                expected = [{'direction': 'egress', 'ethertype': 'IPv4',
+                             'security_group_id': sg1_id},
+                            {'direction': 'egress', 'ethertype': 'IPv6',
+                             'security_group_id': sg1_id},
+                            {'direction': 'egress', 'ethertype': 'IPv4',
+                             'security_group_id': sg2_id},
+                            {'direction': 'egress', 'ethertype': 'IPv6',
+                             'security_group_id': sg2_id},
+                            {'direction': u'ingress',
+                             'protocol': u'tcp', 'ethertype': u'IPv4',
+                             'port_range_max': 25, 'port_range_min': 24,
+                             'remote_group_id': sg2_id,
+                             'security_group_id': sg1_id},
+                            ]
+                self.assertEqual(sorted(port_rpc['security_group_rules']),
+                                 sorted(expected))
+                self.assertEqual([sg2_id],
+                                 port_rpc['security_group_source_groups'])
+                member_ips = sg_info['sg_member_ips'][sg2_id]
+                self.assertEqual(['10.0.0.2', '10.0.0.3'],
+                                 sorted(member_ips['IPv4']))
+                self.assertEqual([], member_ips['IPv6'])
                 self._delete('ports', port_id1)
                 self._delete('ports', port_id2)
 
@@ -398,6 +462,57 @@ class SGServerRpcCallBackMixinTestCaseXML(SGServerRpcCallBackMixinTestCase):
     fmt = 'xml'
 
 
+class SecurityGroupCacheTestCase(base.BaseTestCase):
+    def setUp(self):
+        super(SecurityGroupCacheTestCase, self).setUp()
+        cfg.CONF.set_override('security_group_cache_ttl', 60)
+        self.addCleanup(cfg.CONF.reset)
+        self.cache = sg_db_rpc.SecurityGroupCache()
+        self.rpc = FakeSGCallback()
+        self.rpc_select = mock.patch.object(
+            self.rpc, '_select_rules_for_security_groups',
+            side_effect=lambda ctx, sg_ids: dict(
+                (sg_id, [{'security_group_id': sg_id}])
+                for sg_id in sg_ids)).start()
+        mock.patch.object(sg_db_rpc, 'sg_cache', self.cache).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_disabled_by_default(self):
+        cfg.CONF.clear_override('security_group_cache_ttl')
+        self.cache.set_rules({'sg1': []}, self.cache.generation)
+        self.assertEqual({}, self.cache.get_rules(['sg1']))
+        self.assertEqual(0, self.cache.misses)
+
+    def test_get_rules_hits_and_misses(self):
+        self.rpc._get_rules_for_security_groups(None, ['sg1'])
+        rules = self.rpc._get_rules_for_security_groups(None, ['sg1', 'sg2'])
+        self.assertEqual({'sg1': [{'security_group_id': 'sg1'}],
+                          'sg2': [{'security_group_id': 'sg2'}]}, rules)
+        self.assertEqual([mock.call(None, ['sg1']), mock.call(None, ['sg2'])],
+                         self.rpc_select.call_args_list)
+        self.assertEqual(1, self.cache.hits)
+        self.assertEqual(2, self.cache.misses)
+
+    def test_entries_expire(self):
+        with mock.patch('time.time', return_value=1000):
+            self.cache.set_rules({'sg1': []}, self.cache.generation)
+            self.assertEqual({'sg1': []}, self.cache.get_rules(['sg1']))
+        with mock.patch('time.time', return_value=1060):
+            self.assertEqual({}, self.cache.get_rules(['sg1']))
+
+    def test_invalidate_rules(self):
+        self.rpc._get_rules_for_security_groups(None, ['sg1'])
+        self.cache.invalidate_rules(['sg1'])
+        self.rpc._get_rules_for_security_groups(None, ['sg1'])
+        self.assertEqual(2, self.rpc_select.call_count)
+
+    def test_stale_values_are_not_cached(self):
+        generation = self.cache.generation
+        self.cache.invalidate_member_ips(['sg1'])
+        self.cache.set_member_ips({'sg1': ['10.0.0.1']}, generation)
+        self.assertEqual({}, self.cache.get_member_ips(['sg1']))
+
+
 class SGAgentRpcCallBackMixinTestCase(base.BaseTestCase):
     def setUp(self):
         super(SGAgentRpcCallBackMixinTestCase, self).setUp()
@@ -515,6 +630,71 @@ class SecurityGroupAgentRpcTestCase(base.BaseTestCase):
         self.firewall.assert_has_calls([])
 
 
+class SecurityGroupAgentIpsetRpcTestCase(base.BaseTestCase):
+    def setUp(self):
+        super(SecurityGroupAgentIpsetRpcTestCase, self).setUp()
+        self.agent = sg_rpc.SecurityGroupAgentRpcMixin()
+        self.agent.context = None
+        self.agent.use_ipset = True
+        self.firewall = mock.Mock()
+        firewall_object = firewall_base.FirewallDriver()
+        self.firewall.defer_apply.side_effect = firewall_object.defer_apply
+        self.agent.firewall = self.firewall
+        self.agent.plugin_rpc = mock.Mock()
+        self.fake_device = {'device': 'fake_device',
+                            'security_groups': ['fake_sgid1'],
+                            'security_group_source_groups': ['fake_sgid2'],
+                            'security_group_rules': [{'security_group_id':
+                                                      'fake_sgid1',
+                                                      'remote_group_id':
+                                                      'fake_sgid2'}]}
+        fake_devices = {'fake_device': self.fake_device}
+        self.firewall.ports = fake_devices
+        self.fake_members = {'IPv4': ['10.0.0.3'], 'IPv6': []}
+        self.agent.plugin_rpc.security_group_info_for_devices.return_value = {
+            'devices': fake_devices,
+            'sg_member_ips': {'fake_sgid2': self.fake_members}}
+
+    def test_prepare_devices_filter_updates_members(self):
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.firewall.assert_has_calls([
+            call.update_security_group_members('fake_sgid2',
+                                               self.fake_members),
+            call.defer_apply(),
+            call.prepare_port_filter(self.fake_device)])
+        self.assertFalse(
+            self.agent.plugin_rpc.security_group_rules_for_devices.called)
+
+    def test_security_groups_member_updated(self):
+        self.agent.refresh_firewall = mock.Mock()
+        self.agent.security_groups_member_updated(['fake_sgid2', 'fake_sgid3'])
+        self.firewall.update_security_group_members.assert_called_once_with(
+            'fake_sgid2', self.fake_members)
+        self.assertFalse(self.agent.refresh_firewall.called)
+
+    def test_security_groups_member_not_updated(self):
+        self.agent.security_groups_member_updated(['fake_sgid3', 'fake_sgid4'])
+        self.assertFalse(
+            self.agent.plugin_rpc.security_group_info_for_devices.called)
+
+    def test_fall_back_to_rules_for_devices(self):
+        rpc = self.agent.plugin_rpc
+        rpc.security_group_info_for_devices.side_effect = (
+            rpc_common.RemoteError('UnsupportedRpcVersion'))
+        self.agent.refresh_firewall = mock.Mock()
+        self.agent.security_groups_member_updated(['fake_sgid2'])
+        self.agent.refresh_firewall.assert_called_once_with(
+            [self.fake_device])
+        self.assertFalse(self.agent.use_ipset)
+
+    def test_security_group_info_error_is_raised(self):
+        rpc = self.agent.plugin_rpc
+        rpc.security_group_info_for_devices.side_effect = (
+            rpc_common.RemoteError('Exception'))
+        self.assertRaises(rpc_common.RemoteError,
+                          self.agent.prepare_devices_filter, ['fake_device'])
+
+
 class FakeSGRpcApi(agent_rpc.PluginApi,
                    sg_rpc.SecurityGroupServerRpcApiMixin):
     pass
@@ -537,6 +717,17 @@ class SecurityGroupServerRpcApiTestCase(base.BaseTestCase):
              version=sg_rpc.SG_RPC_VERSION,
              topic='fake_topic')])
 
+    def test_security_group_info_for_devices(self):
+        self.rpc.security_group_info_for_devices(None, ['fake_device'])
+        self.rpc.call.assert_has_calls(
+            [call(None,
+             {'args':
+                 {'devices': ['fake_device']},
+             'method': 'security_group_info_for_devices',
+             'namespace': None},
+             version=sg_rpc.SG_INFO_RPC_VERSION,
+             topic='fake_topic')])
+
 
 class FakeSGNotifierAPI(proxy.RpcProxy,
                         sg_rpc.SecurityGroupAgentRpcApiMixin):
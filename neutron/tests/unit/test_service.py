@@ -0,0 +1,66 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+
+import mock
+from oslo.config import cfg
+
+from neutron import service
+from neutron.tests import base
+
+
+class TestRunWsgi(base.BaseTestCase):
+
+    def _run_wsgi(self):
+        with contextlib.nested(
+            mock.patch.object(service.config, 'load_paste_app'),
+            mock.patch.object(service.db_api, 'dispose'),
+            mock.patch.object(service.rpc, 'cleanup'),
+            mock.patch.object(service.wsgi, 'Server'),
+            # The options are logged once the configuration is parsed
+            mock.patch.object(cfg.CONF, 'log_opt_values')
+        ) as (load_paste_app, dispose, cleanup, server, log_opt_values):
+            service._run_wsgi('neutron')
+            return {'dispose': dispose, 'cleanup': cleanup,
+                    'start': server.return_value.start}
+
+    def test_api_workers(self):
+        cfg.CONF.set_override('api_workers', 2)
+        mocks = self._run_wsgi()
+        mocks['start'].assert_called_once_with(
+            mock.ANY, cfg.CONF.bind_port, cfg.CONF.bind_host, workers=2)
+        mocks['dispose'].assert_called_once_with()
+        mocks['cleanup'].assert_called_once_with()
+
+    def test_without_api_workers(self):
+        mocks = self._run_wsgi()
+        mocks['start'].assert_called_once_with(
+            mock.ANY, cfg.CONF.bind_port, cfg.CONF.bind_host, workers=0)
+        self.assertFalse(mocks['dispose'].called)
+        self.assertFalse(mocks['cleanup'].called)
+
+    def test_api_workers_disable_security_group_cache(self):
+        cfg.CONF.set_override('api_workers', 2)
+        cfg.CONF.set_override('security_group_cache_ttl', 30)
+        self._run_wsgi()
+        self.assertEqual(0, cfg.CONF.security_group_cache_ttl)
+
+    def test_security_group_cache_without_api_workers(self):
+        cfg.CONF.set_override('security_group_cache_ttl', 30)
+        self._run_wsgi()
+        self.assertEqual(30, cfg.CONF.security_group_cache_ttl)
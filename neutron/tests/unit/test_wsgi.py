@@ -28,6 +28,7 @@ import webob.exc
 from neutron.api.v2 import attributes
 from neutron.common import constants
 from neutron.common import exceptions as exception
+from neutron.openstack.common import jsonutils
 from neutron.tests import base
 from neutron import wsgi
 
@@ -92,6 +93,17 @@ class TestWSGIServer(base.BaseTestCase):
                             mock_listen.return_value)
                     ])
 
+    def test_start_multiple_workers(self):
+        server = wsgi.Server("test_multiple_processes")
+        with mock.patch.object(wsgi.common_service,
+                               'ProcessLauncher') as launcher:
+            server.start(None, 0, host="127.0.0.1", workers=2)
+            launcher.return_value.launch_service.assert_called_once_with(
+                mock.ANY, workers=2)
+            server.stop()
+            server.wait()
+            launcher.return_value.wait.assert_called_once_with()
+
     def test_app(self):
         greetings = 'Hello, World!!!'
 
@@ -588,6 +600,45 @@ class JSONDictSerializerTest(base.BaseTestCase):
 
         self.assertEqual(result, expected_json)
 
+    def test_json_streamed_collection(self):
+        collection = wsgi.StreamedCollection(
+            'servers', range(3), lambda i: {'id': i},
+            extra={'servers_links': [{'rel': 'next'}]})
+        serializer = wsgi.JSONDictSerializer()
+        chunks = list(serializer.serialize_iter(collection))
+
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(jsonutils.loads(''.join(chunks)),
+                         {'servers': [{'id': 0}, {'id': 1}, {'id': 2}],
+                          'servers_links': [{'rel': 'next'}]})
+
+    def test_json_streamed_collection_in_chunks(self):
+        viewed = []
+        collection = wsgi.StreamedCollection(
+            'servers', range(5), lambda i: viewed.append(i) or i)
+        serializer = wsgi.JSONDictSerializer()
+        with mock.patch.object(wsgi, 'STREAM_CHUNK_SIZE', new=2):
+            chunks = serializer.serialize_iter(collection)
+            self.assertEqual(chunks.next(), '{"servers": [0, 1')
+            self.assertEqual(viewed, [0, 1])
+            self.assertEqual(''.join(chunks), ', 2, 3, 4]}')
+
+    def test_json_streamed_empty_collection(self):
+        collection = wsgi.StreamedCollection('servers', [], lambda i: i)
+        serializer = wsgi.JSONDictSerializer()
+        result = ''.join(serializer.serialize_iter(collection))
+
+        self.assertEqual(jsonutils.loads(result), {'servers': []})
+
+    def test_json_streamed_collection_serialize(self):
+        collection = wsgi.StreamedCollection('servers', [1, 2],
+                                             lambda i: {'id': i})
+        serializer = wsgi.JSONDictSerializer()
+        result = serializer.serialize(collection)
+
+        self.assertEqual(jsonutils.loads(result),
+                         {'servers': [{'id': 1}, {'id': 2}]})
+
 
 class TextDeserializerTest(base.BaseTestCase):
 
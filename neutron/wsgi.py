@@ -19,6 +19,7 @@
 Utility methods for working with WSGI servers
 """
 import errno
+import itertools
 import os
 import socket
 import ssl
@@ -39,6 +40,7 @@ from neutron.common import exceptions as exception
 from neutron import context
 from neutron.openstack.common import jsonutils
 from neutron.openstack.common import log as logging
+from neutron.openstack.common import service as common_service
 
 socket_opts = [
     cfg.IntOpt('backlog',
@@ -74,6 +76,9 @@ CONF.register_opts(socket_opts)
 
 LOG = logging.getLogger(__name__)
 
+# Number of collection items serialized into each chunk of a streamed body
+STREAM_CHUNK_SIZE = 100
+
 
 def run_server(application, port):
     """Run a WSGI server with the given application."""
@@ -81,6 +86,28 @@ def run_server(application, port):
     eventlet.wsgi.server(sock, application)
 
 
+class WorkerService(object):
+    """Wraps a worker to be handled by ProcessLauncher."""
+
+    def __init__(self, service, application):
+        self._service = service
+        self._application = application
+        self._server = None
+
+    def start(self):
+        self._server = self._service.pool.spawn(self._service._run,
+                                                self._application,
+                                                self._service._socket)
+
+    def wait(self):
+        self._service.pool.waitall()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.kill()
+            self._server = None
+
+
 class Server(object):
     """Server class to manage multiple WSGI sockets and applications."""
 
@@ -165,7 +192,7 @@ class Server(object):
 
         return sock
 
-    def start(self, application, port, host='0.0.0.0'):
+    def start(self, application, port, host='0.0.0.0', workers=0):
         """Run a WSGI server with the given application."""
         self._host = host
         self._port = port
@@ -174,7 +201,19 @@ class Server(object):
         self._socket = self._get_socket(self._host,
                                         self._port,
                                         backlog=backlog)
-        self._server = self.pool.spawn(self._run, application, self._socket)
+        self._launch(application, workers=workers)
+
+    def _launch(self, application, workers=0):
+        service = WorkerService(self, application)
+        if workers < 1:
+            # The server runs in the current process.
+            self._server = service
+            service.start()
+        else:
+            # The server runs in child processes sharing the listening
+            # socket, which are restarted if they die.
+            self._server = common_service.ProcessLauncher()
+            self._server.launch_service(service, workers=workers)
 
     @property
     def host(self):
@@ -185,12 +224,16 @@ class Server(object):
         return self._socket.getsockname()[1] if self._socket else self._port
 
     def stop(self):
-        self._server.kill()
+        if isinstance(self._server, WorkerService):
+            self._server.stop()
 
     def wait(self):
         """Wait until all servers have completed running."""
         try:
-            self.pool.waitall()
+            if isinstance(self._server, WorkerService):
+                self.pool.waitall()
+            else:
+                self._server.wait()
         except KeyboardInterrupt:
             pass
 
@@ -319,12 +362,42 @@ class ActionDispatcher(object):
         raise NotImplementedError()
 
 
+class StreamedCollection(object):
+    """A collection of items which are only rendered when serialized.
+
+    Controllers may return this instead of a dict when listing resources:
+    view is applied to each of the items while the response body is being
+    written, so serializers able to stream never hold the whole rendered
+    collection in memory.
+    """
+
+    def __init__(self, collection, items, view, extra=None):
+        self.collection = collection
+        self.items = items
+        self.view = view
+        self.extra = extra or {}
+
+    def __iter__(self):
+        return (self.view(item) for item in self.items)
+
+    def to_dict(self):
+        data = {self.collection: list(self)}
+        data.update(self.extra)
+        return data
+
+
 class DictSerializer(ActionDispatcher):
     """Default request body serialization."""
 
     def serialize(self, data, action='default'):
+        if isinstance(data, StreamedCollection):
+            data = data.to_dict()
         return self.dispatch(data, action=action)
 
+    def serialize_iter(self, data, action='default'):
+        """Return an iterable over the chunks of the serialized data."""
+        return [self.serialize(data, action)]
+
     def default(self, data):
         return ""
 
@@ -332,6 +405,31 @@ class DictSerializer(ActionDispatcher):
 class JSONDictSerializer(DictSerializer):
     """Default JSON request body serialization."""
 
+    def serialize_iter(self, data, action='default'):
+        if not isinstance(data, StreamedCollection):
+            return super(JSONDictSerializer, self).serialize_iter(data,
+                                                                  action)
+        return self._stream_collection(data)
+
+    def _stream_collection(self, data):
+        # The opening of the collection is sent with its first chunk, so
+        # that callers rendering the first chunk up front catch most errors
+        opening = '{%s: [' % self.default(data.collection)
+        items = iter(data)
+        separator = ''
+        while True:
+            chunk = list(itertools.islice(items, STREAM_CHUNK_SIZE))
+            if not chunk:
+                break
+            yield opening + separator + ', '.join(self.default(item)
+                                                  for item in chunk)
+            opening = ''
+            separator = ', '
+        yield opening + ']'
+        for key, value in data.extra.iteritems():
+            yield ', %s: %s' % (self.default(key), self.default(value))
+        yield '}'
+
     def default(self, data):
         def sanitizer(obj):
             return unicode(obj)
@@ -523,7 +621,10 @@ class ResponseSerializer(object):
 
     def serialize_body(self, response, data, content_type, action):
         response.headers['Content-Type'] = content_type
-        if data is not None:
+        if isinstance(data, StreamedCollection):
+            serializer = self.get_body_serializer(content_type)
+            response.app_iter = serializer.serialize_iter(data, action)
+        elif data is not None:
             serializer = self.get_body_serializer(content_type)
             response.body = serializer.serialize(data, action)
 
@@ -1030,7 +1131,8 @@ class Resource(Application):
                                   self._xmlns,
                                   self._fault_body_function)
 
-        if isinstance(action_result, dict) or action_result is None:
+        if (isinstance(action_result, (dict, StreamedCollection)) or
+                action_result is None):
             response = self.serializer.serialize(action_result,
                                                  accept,
                                                  action=action)
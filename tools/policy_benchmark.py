@@ -0,0 +1,81 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark of the policy checks of a network listing.
+
+Checks get_network and two of its attributes on each network of a list,
+as the API does when listing networks, for an admin and for the owner of
+the networks. Run from the top of the tree, which uses etc/policy.json:
+
+    python tools/policy_benchmark.py [number of networks] [repeats]
+"""
+
+import sys
+import time
+
+from oslo.config import cfg
+
+from neutron import context
+from neutron.openstack.common import uuidutils
+from neutron import policy
+
+
+ACTIONS = ['get_network',
+           'get_network:router:external',
+           'get_network:provider:network_type']
+
+
+def run(ctx, networks, repeats):
+    """Return the best time of checking all the networks, in seconds."""
+    best = None
+    for i in range(repeats):
+        start = time.time()
+        for network in networks:
+            for action in ACTIONS:
+                policy.check(ctx, action, network)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    cfg.CONF(args=[], project='neutron')
+    policy.init()
+
+    tenant_id = uuidutils.generate_uuid()
+    networks = [{'id': uuidutils.generate_uuid(),
+                 'tenant_id': tenant_id,
+                 'name': 'net%d' % i,
+                 'admin_state_up': True,
+                 'shared': False,
+                 'router:external': False,
+                 'status': 'ACTIVE'}
+                for i in range(count)]
+    contexts = [('admin', context.get_admin_context()),
+                ('owner', context.Context('user', tenant_id))]
+
+    checks = count * len(ACTIONS)
+    for name, ctx in contexts:
+        elapsed = run(ctx, networks, repeats)
+        print('%-6s %6d checks in %8.1f ms (%d checks/s)' %
+              (name, checks, elapsed * 1000, checks / elapsed))
+
+
+if __name__ == '__main__':
+    main()